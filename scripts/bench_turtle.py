@@ -12,6 +12,12 @@ compares how much that costs with the two possible strategies:
 It also asserts that replaying the patches reproduces exactly the document the
 full strategy produces, so the fast path is not quietly drawing something else.
 
+The program can be traced by either engine of the debugger:
+
+  settrace    json-tracer's JSONTracer, driven by sys.settrace
+  monitoring  papyros/tracing.py's MonitoringTracer, driven by sys.monitoring
+              (what Papyros does now, needs Python 3.12 or later)
+
 Numbers are CPython, not Pyodide/WASM: expect the real browser to be several
 times slower, and both strategies to be affected in the same way.
 
@@ -20,6 +26,7 @@ Usage:
     python3 scripts/bench_turtle.py --program square
     python3 scripts/bench_turtle.py --program my_turtle_program.py
     python3 scripts/bench_turtle.py --mode patch     # only the new strategy
+    python3 scripts/bench_turtle.py --mode patch --engine both
 
 Requires the Python worker bundle, so run `yarn setup` first.
 """
@@ -94,15 +101,15 @@ def load_worker_package():
 
 
 def load_papyros_modules():
-    """Load the turtle modules from src/ (not from the bundle, which may be stale).
+    """Load the turtle and tracing modules from src/ (not from the bundle, which may be stale).
 
     They live in the ``papyros`` package, whose ``__init__`` pulls in Pyodide, so
-    they are loaded into a stand-in package that only holds these two modules.
+    they are loaded into a stand-in package that only holds these modules.
     """
     package = types.ModuleType("papyros_turtle")
     package.__path__ = [os.path.join(WORKER, "papyros")]
     sys.modules["papyros_turtle"] = package
-    for name in ("turtle_svg", "turtle_hook"):
+    for name in ("turtle_svg", "turtle_hook", "monitoring", "tracing"):
         path = os.path.join(WORKER, "papyros", f"{name}.py")
         spec = importlib.util.spec_from_file_location(f"papyros_turtle.{name}", path)
         module = importlib.util.module_from_spec(spec)
@@ -139,11 +146,18 @@ def replay(patches):
     return open_ + "".join(fragments.get(i, "") for i in order) + close
 
 
-def run(source, mode, module_name="sandbox"):
-    """Trace ``source`` and snapshot the drawing after every frame."""
+def tracer_class(engine):
+    if engine == "monitoring":
+        return sys.modules["papyros_turtle.tracing"].MonitoringTracer
     from tracer import JSONTracer
 
+    return JSONTracer
+
+
+def run(source, mode, engine="settrace", module_name="sandbox"):
+    """Trace ``source`` with ``engine`` and snapshot the drawing after every frame."""
     turtle_hook = load_papyros_modules()
+    tracer = tracer_class(engine)
     hook = install_turtle(turtle_hook)
 
     snapshots = []      # what a frame contributed to the payload sent to the frontend
@@ -178,7 +192,7 @@ def run(source, mode, module_name="sandbox"):
         take_snapshot()
 
     start = time.perf_counter()
-    JSONTracer(frame_callback=frame_callback, module_name=module_name).runscript(source)
+    tracer(frame_callback=frame_callback, module_name=module_name).runscript(source)
     take_snapshot()  # the snapshot Papyros emits when the program ends
     total = time.perf_counter() - start
 
@@ -199,8 +213,8 @@ def run(source, mode, module_name="sandbox"):
     }
 
 
-def report(mode, result):
-    print(f"  {mode:<6}  {result['snapshot_time']:7.2f}s snapshotting"
+def report(mode, engine, result):
+    print(f"  {mode:<6}  {engine:<10}  {result['snapshot_time']:7.2f}s snapshotting"
           f"  {result['total'] - result['snapshot_time']:8.2f}s tracing"
           f"  {result['total']:8.2f}s total"
           f"  {result['snapshots']:6d} snapshots"
@@ -212,6 +226,7 @@ def main():
     parser.add_argument("--program", default="spiro",
                         help="spiro (default), square, or a path to a Python file")
     parser.add_argument("--mode", default="both", choices=("both", "full", "patch"))
+    parser.add_argument("--engine", default="settrace", choices=("both", "settrace", "monitoring"))
     args = parser.parse_args()
 
     if args.program in PROGRAMS:
@@ -222,22 +237,35 @@ def main():
 
     load_worker_package()
     modes = ("full", "patch") if args.mode == "both" else (args.mode,)
+    engines = ("settrace", "monitoring") if args.engine == "both" else (args.engine,)
+    if "monitoring" in engines and not hasattr(sys, "monitoring"):
+        sys.exit("the monitoring engine needs Python 3.12 or later")
 
     print(f"program: {args.program}")
     results = {}
-    for mode in modes:
-        results[mode] = run(source, mode)
-        report(mode, results[mode])
+    for engine in engines:
+        for mode in modes:
+            results[mode, engine] = run(source, mode, engine)
+            report(mode, engine, results[mode, engine])
 
-    first = results[modes[0]]
+    first = results[modes[0], engines[0]]
     print(f"\n{first['frames']} debug frames, final drawing {first['document'] / 1024:.0f} KiB of SVG")
     if len(modes) == 2:
-        full, patch = results["full"], results["patch"]
+        full, patch = results["full", engines[-1]], results["patch", engines[-1]]
         print(f"speedup: {full['snapshot_time'] / max(patch['snapshot_time'], 1e-9):.0f}x less time snapshotting, "
               f"{full['bytes'] / max(patch['bytes'], 1):.0f}x fewer bytes to the frontend")
         print("(patches reproduce svg-turtle's document exactly)")
-    print("\nNote: 'tracing' is everything json-tracer does per frame and is untouched by this\n"
-          "benchmark; for turtle programs it is dominated by the closure-discovery walk in\n"
+    if len(engines) == 2:
+        settrace, monitoring = results[modes[-1], "settrace"], results[modes[-1], "monitoring"]
+        if settrace["frames"] != monitoring["frames"]:
+            sys.exit(f"FAIL: the engines traced {settrace['frames']} and {monitoring['frames']} frames")
+        tracing = {engine: results[modes[-1], engine]["total"] - results[modes[-1], engine]["snapshot_time"]
+                   for engine in engines}
+        print(f"speedup: {tracing['settrace'] / max(tracing['monitoring'], 1e-9):.1f}x less time tracing "
+              f"with sys.monitoring")
+    print("\nNote: 'tracing' is everything the tracer does per frame. sys.settrace calls it for\n"
+          "every line of turtle and svg-turtle as well, sys.monitoring only for the program.\n"
+          "What is left is dominated by the closure-discovery walk in\n"
           "json_tracer.visit_all_locally_reachable_function_objs.")
 
 
@@ -4,7 +4,7 @@ import "./frontend/components/CodeRunner";
 import "./frontend/components/Debugger";
 import { Papyros, papyros } from "./frontend/state/Papyros";
 import { InputMode } from "./frontend/state/InputOutput";
-import { RunMode, WorkerDiagnostic } from "./backend/Backend";
+import { ProfileReport, RunMode, WorkerDiagnostic } from "./backend/Backend";
 import { ProgrammingLanguage } from "./ProgrammingLanguage";
 import { OutputType, FriendlyError, OutputEntry } from "./frontend/state/InputOutput";
 import { RunState } from "./frontend/state/Runner";
@@ -28,4 +28,4 @@ export {
     ServiceWorkerRegistrationError,
     ServiceWorkerInputError,
 };
-export type { FriendlyError, OutputEntry, WorkerDiagnostic };
+export type { FriendlyError, OutputEntry, ProfileReport, WorkerDiagnostic };
@@ -30,10 +30,74 @@ export interface WorkerDiagnostic {
     message: string;
 }
 
+/**
+ * Result of running a program against one of the inputs of a batch run
+ */
+export interface BatchCaseResult {
+    /**
+     * 0-based index of the input this is the result for
+     */
+    index: number;
+    stdout: string;
+    stderr: string;
+    /**
+     * The uncaught exception, in the shape of a FriendlyError, or null if there was none
+     */
+    exception: Record<string, string> | null;
+    /**
+     * Wall time of the run in seconds
+     */
+    time: number;
+    /**
+     * Number of lines of the program that were executed, null if the backend can't count them
+     */
+    steps: number | null;
+}
+
+/**
+ * Time spent in a function called while profiling a program
+ */
+export interface ProfileFunction {
+    name: string;
+    /**
+     * File the function is defined in, "~" for builtins
+     */
+    file: string;
+    line: number;
+    calls: number;
+    /**
+     * Seconds spent in the function itself
+     */
+    time: number;
+    /**
+     * Seconds spent in the function and everything it called
+     */
+    cumulative: number;
+}
+
+/**
+ * Result of running a program in the profile run mode
+ */
+export interface ProfileReport {
+    /**
+     * Wall time of the run in seconds
+     */
+    time: number;
+    /**
+     * The functions with the highest cumulative time, highest first
+     */
+    functions: Array<ProfileFunction>;
+    /**
+     * How often each line of the program ran and the seconds until the next line started
+     */
+    lines: Array<{ line: number; hits: number; time: number }>;
+}
+
 export enum RunMode {
     Run = "run",
     Debug = "debug",
     Doctest = "doctest",
+    Profile = "profile",
 }
 
 export abstract class Backend {
@@ -61,6 +125,7 @@ export abstract class Backend {
             // Empty, initialized in launch
         };
         this.runCode = this.expose()(this.runCode.bind(this));
+        this.runBatch = this.expose()(this.runBatch.bind(this));
         this.queue = {} as BackendEventQueue;
     }
 
@@ -107,9 +172,52 @@ export abstract class Backend {
      * @param {string} code The code to run
      * @param {string} mode The mode to run the code in
      * @param {number} maxSteps Upper bound on the number of debug frames a backend should produce, if it supports one
+     * @param {string} stdin Input lines known before running, to read before asking for input, if it supports it
+     * @param {number} clockSpeed How many times faster than real time sleeping passes, Infinity to not wait at all.
+     * Real time if undefined or not supported
+     * @param {number} timeLimit Seconds the program may run outside of debug mode, not counting waiting for input.
+     * Unlimited if undefined or not supported
+     * @param {number} stepLimit Lines the program may execute outside of debug mode, unlimited if undefined or not supported
      * @return {Promise<void>} Promise of execution
      */
-    public abstract runCode(extras: SyncExtras, code: string, mode?: string, maxSteps?: number): Promise<void>;
+    public abstract runCode(
+        extras: SyncExtras,
+        code: string,
+        mode?: string,
+        maxSteps?: number,
+        stdin?: string,
+        clockSpeed?: number,
+        timeLimit?: number,
+        stepLimit?: number,
+    ): Promise<void>;
+
+    /**
+     * Run the given code once for every input, without asking the user for input
+     * Each result is also published as a BatchCase event when it is ready
+     * @param {SyncExtras} extras Helper properties to run code
+     * @param {string} code The code to run
+     * @param {Array<string>} inputs The complete stdin of every run
+     * @param {number} clockSpeed How many times faster than real time sleeping passes, as for runCode
+     * @param {number} timeLimit Seconds every run may take, as for runCode
+     * @param {number} stepLimit Lines every run may execute, as for runCode
+     * @return {Promise<Array<BatchCaseResult>>} The result of every run, empty if batch runs are not supported
+     */
+    public runBatch(
+        // eslint-disable-next-line @typescript-eslint/no-unused-vars
+        extras: SyncExtras,
+        // eslint-disable-next-line @typescript-eslint/no-unused-vars
+        code: string,
+        // eslint-disable-next-line @typescript-eslint/no-unused-vars
+        inputs: Array<string>,
+        // eslint-disable-next-line @typescript-eslint/no-unused-vars
+        clockSpeed?: number,
+        // eslint-disable-next-line @typescript-eslint/no-unused-vars
+        timeLimit?: number,
+        // eslint-disable-next-line @typescript-eslint/no-unused-vars
+        stepLimit?: number,
+    ): Promise<Array<BatchCaseResult>> {
+        return Promise.resolve([]);
+    }
 
     /**
      * Generate linting suggestions for the given code
@@ -121,10 +229,77 @@ export abstract class Backend {
      * Provide files to be used by the backend
      * @param {Record<string, string>} inlineFiles Map of file names to their contents
      * @param {Record<string, string>} hrefFiles Map of file names to URLS with their contents
+     * @param {number} maxConcurrentFetches Upper bound on the number of URLs fetched at the same time
      * @return {Promise<void>} Resolves when the files are present in the backend
      */
+    public provideFiles(
+        // eslint-disable-next-line @typescript-eslint/no-unused-vars
+        inlineFiles: Record<string, string>,
+        // eslint-disable-next-line @typescript-eslint/no-unused-vars
+        hrefFiles: Record<string, string>,
+        // eslint-disable-next-line @typescript-eslint/no-unused-vars
+        maxConcurrentFetches?: number,
+    ): Promise<void> {
+        return Promise.resolve();
+    }
+
+    /**
+     * Publish a Files event listing every file in the backend filesystem,
+     * for when the receiver lost track of the changes it was sent
+     * @return {Promise<void>} Resolves when the event has been published
+     */
+    public resyncFiles(): Promise<void> {
+        return Promise.resolve();
+    }
+
+    /**
+     * Explain an uncaught exception of the last run, which is only sent with what is known right away
+     * @param {number} id The id of the exception, sent with it
+     * @return {Promise<Record<string, string>>} The info and why of the FriendlyError of the exception,
+     * empty if it can't be explained (anymore)
+     */
+    // eslint-disable-next-line @typescript-eslint/no-unused-vars
+    public explainError(id: number): Promise<Record<string, string>> {
+        return Promise.resolve({});
+    }
+
+    /**
+     * Fetch frames of the last debug run that were only sent as summaries
+     * @param {number} start Index of the first frame
+     * @param {number} end Index after the last frame
+     * @return {Promise<string | Uint8Array>} List of the frames, the first one complete and the others
+     * deltas on top of the frame before them, as JSON or in the binary encoding of FrameCodec
+     */
+    // eslint-disable-next-line @typescript-eslint/no-unused-vars
+    public getFrames(start: number, end: number): Promise<string | Uint8Array> {
+        return Promise.resolve("[]");
+    }
+
+    /**
+     * Capture the current files of the backend filesystem, to restore them later
+     * @return {Promise<number | undefined>} Id of the checkpoint, undefined if checkpoints are not supported
+     */
+    public checkpointWorkspace(): Promise<number | undefined> {
+        return Promise.resolve(undefined);
+    }
+
+    /**
+     * Restore the backend filesystem to a checkpoint, only rewriting the files that differ from it
+     * @param {number} checkpointId Id of the checkpoint, as returned by checkpointWorkspace
+     * @return {Promise<void>} Resolves when the files have been restored
+     */
+    // eslint-disable-next-line @typescript-eslint/no-unused-vars
+    public restoreWorkspace(checkpointId: number): Promise<void> {
+        return Promise.resolve();
+    }
+
+    /**
+     * Forget a checkpoint, freeing the memory it takes
+     * @param {number} checkpointId Id of the checkpoint, as returned by checkpointWorkspace
+     * @return {Promise<void>} Resolves when the checkpoint has been discarded
+     */
     // eslint-disable-next-line @typescript-eslint/no-unused-vars
-    public provideFiles(inlineFiles: Record<string, string>, hrefFiles: Record<string, string>): Promise<void> {
+    public discardCheckpoint(checkpointId: number): Promise<void> {
         return Promise.resolve();
     }
 
@@ -141,12 +316,12 @@ export abstract class Backend {
     /**
      * Update the content of a file in the backend filesystem
      * @param {string} name The name of the file to update
-     * @param {string} content The new content of the file; base64-encoded when binary is true
-     * @param {boolean} binary Whether the content is binary (base64-encoded) rather than plain text
+     * @param {string | Uint8Array} content The new content of the file; its bytes when binary is true
+     * @param {boolean} binary Whether the content is binary rather than plain text
      * @return {Promise<void>} Resolves when the file has been updated
      */
     // eslint-disable-next-line @typescript-eslint/no-unused-vars
-    public updateFile(name: string, content: string, binary: boolean): Promise<void> {
+    public updateFile(name: string, content: string | Uint8Array, binary: boolean): Promise<void> {
         return Promise.resolve();
     }
 
@@ -1,5 +1,6 @@
-import { Backend, RunMode, WorkerDiagnostic } from "../../Backend";
-import { BackendEvent } from "../../../communication/BackendEvent";
+import { BatchCaseResult, Backend, RunMode, WorkerDiagnostic } from "../../Backend";
+import { transfer } from "comlink";
+import { BackendEvent, BackendEventType } from "../../../communication/BackendEvent";
 import { loadPyodide, PyodideInterface } from "pyodide";
 import { PyProxy } from "pyodide/ffi";
 import { loadPyodideAndPackage } from "../../../sync/pyodide";
@@ -18,16 +19,93 @@ export class PythonWorker extends Backend {
      * Promise to asynchronously install imports needed by the code
      */
     private installPromise: Promise<void> | null;
+    /**
+     * Chunks of large files, streamed ahead of the Files event that lists them
+     */
+    private fileChunks: Map<string, Uint8Array[]>;
     constructor() {
         super();
         this.pyodide = {} as PyodideInterface;
         this.installPromise = null;
+        this.fileChunks = new Map();
     }
 
     private static convert(data: any): any {
         return data.toJs ? data.toJs({ dict_converter: Object.fromEntries }) : data;
     }
 
+    /**
+     * @param {any} changes The data of a Files event
+     * @return {Array<any>} The file entries it holds
+     */
+    private static fileEntries(changes: any): Array<any> {
+        return [changes.files, changes.added, changes.modified].flatMap((entries) => Object.values(entries ?? {}));
+    }
+
+    /**
+     * Give every file entry that was streamed in chunks its content
+     * @param {any} changes The data of a Files event
+     */
+    private assembleChunkedFiles(changes: any): void {
+        for (const [name, entry] of Object.entries<any>({ ...changes.files, ...changes.added, ...changes.modified })) {
+            if (!entry.chunked || entry.unchanged) {
+                // The frontend keeps its copy of a large file that did not change
+                continue;
+            }
+            const chunks = this.fileChunks.get(name) ?? [];
+            this.fileChunks.delete(name);
+            const content = new Uint8Array(chunks.reduce((size, chunk) => size + chunk.byteLength, 0));
+            let offset = 0;
+            for (const chunk of chunks) {
+                content.set(chunk, offset);
+                offset += chunk.byteLength;
+            }
+            // Same newline translation as the worker applies to small text files
+            entry.content = entry.binary ? content : new TextDecoder().decode(content).replace(/\r\n?/g, "\n");
+            delete entry.chunked;
+        }
+    }
+
+    private receiveFileChunk(chunk: { name: string; offset: number; content: Uint8Array }): void {
+        if (chunk.offset === 0) {
+            this.fileChunks.set(chunk.name, []);
+        }
+        this.fileChunks.get(chunk.name)?.push(chunk.content);
+    }
+
+    /**
+     * Publish an event from Python, transferring rather than copying the buffers of binary files and images
+     * @param {BackendEvent} e The converted event
+     * @return {any} The result of publishing it
+     */
+    private publish(e: BackendEvent): any {
+        let contents: Array<any>;
+        if (e.type === BackendEventType.Files) {
+            this.assembleChunkedFiles(e.data);
+            contents = PythonWorker.fileEntries(e.data).map((entry) => entry.content);
+        } else if (
+            e.type === BackendEventType.Frames &&
+            (e.data.files.length > 0 || e.data.frames instanceof Uint8Array)
+        ) {
+            // Frames in the binary encoding are a buffer of their own
+            contents = [e.data.frames];
+            for (const [, changes] of e.data.files) {
+                this.assembleChunkedFiles(changes);
+                contents.push(...PythonWorker.fileEntries(changes).map((entry) => entry.content));
+            }
+        } else if (e.type === BackendEventType.Output && e.data instanceof Uint8Array) {
+            // Images rendered by matplotlib are sent as raw bytes
+            contents = [e.data];
+        } else {
+            return this.onEvent(e);
+        }
+        const buffers = contents
+            // A view on part of a buffer, such as the Pyodide heap, must not be transferred
+            .filter((content) => content instanceof Uint8Array && content.byteLength === content.buffer.byteLength)
+            .map((content) => content.buffer);
+        return this.onEvent(transfer(e, buffers));
+    }
+
     private static async getPyodide(indexURL: string | undefined): Promise<PyodideInterface> {
         if (indexURL === undefined) {
             return await loadPyodideAndPackage({ url: pythonPackageUrl, format: ".tgz" });
@@ -43,11 +121,11 @@ export class PythonWorker extends Backend {
         this.papyros = this.pyodide.pyimport("papyros").Papyros.callKwargs({
             callback: (e: any) => {
                 const converted = PythonWorker.convert(e);
-                return this.onEvent(converted);
-            },
-            buffer_constructor: (cb: (e: BackendEvent) => void) => {
-                this.queue.setCallback(cb);
-                return this.queue;
+                if (converted.type === "file_chunk") {
+                    this.receiveFileChunk(converted.data);
+                    return;
+                }
+                return this.publish(converted);
             },
         });
         // preload micropip to allow installing packages
@@ -63,12 +141,14 @@ export class PythonWorker extends Backend {
      * buffer while it is still linting the real code), leaving its own imports
      * uninstalled and producing a spurious "unable to import X" lint error.
      * @param {string} code The code containing import statements
+     * @param {boolean} preflight Whether to also install what the workspace modules used by the code import
      */
-    private async installImports(code: string): Promise<void> {
+    private async installImports(code: string, preflight = false): Promise<void> {
         const install = (): Promise<void> | undefined =>
             this.papyros?.install_imports.callKwargs({
                 source_code: code,
                 ignore_missing: true,
+                preflight: preflight,
             });
         // Chain onto any in-flight install (ignoring its outcome) so this call's
         // imports are installed after it, without concurrent double-downloads.
@@ -81,23 +161,59 @@ export class PythonWorker extends Backend {
         if (this.papyros?.has_doctests(code)) {
             modes = [RunMode.Doctest, ...modes];
         }
-        modes = [RunMode.Debug, ...modes];
+        modes = [RunMode.Debug, ...modes, RunMode.Profile];
         return modes;
     }
 
-    public override async runCode(extras: SyncExtras, code: string, mode = "exec", maxSteps?: number): Promise<any> {
+    public override async runCode(
+        extras: SyncExtras,
+        code: string,
+        mode = "exec",
+        maxSteps?: number,
+        stdin?: string,
+        clockSpeed?: number,
+        timeLimit?: number,
+        stepLimit?: number,
+    ): Promise<any> {
         this.extras = extras;
         if (extras.interruptBuffer) {
             this.pyodide.setInterruptBuffer(extras.interruptBuffer);
         }
-        await this.installImports(code);
+        await this.installImports(code, true);
         return await this.papyros?.run_async.callKwargs({
             source_code: code,
             mode: mode,
             max_steps: maxSteps,
+            stdin: stdin,
+            clock_speed: clockSpeed,
+            time_limit: timeLimit,
+            step_limit: stepLimit,
         });
     }
 
+    public override async runBatch(
+        extras: SyncExtras,
+        code: string,
+        inputs: Array<string>,
+        clockSpeed?: number,
+        timeLimit?: number,
+        stepLimit?: number,
+    ): Promise<Array<BatchCaseResult>> {
+        this.extras = extras;
+        if (extras.interruptBuffer) {
+            this.pyodide.setInterruptBuffer(extras.interruptBuffer);
+        }
+        await this.installImports(code, true);
+        const results = await this.papyros?.run_batch.callKwargs({
+            source_code: code,
+            inputs: inputs,
+            clock_speed: clockSpeed,
+            time_limit: timeLimit,
+            step_limit: stepLimit,
+        });
+        return PythonWorker.convert(results ?? []);
+    }
+
     public override async lintCode(code: string): Promise<Array<WorkerDiagnostic>> {
         await this.installImports(code);
         return PythonWorker.convert(this.papyros?.lint(code) || []);
@@ -106,18 +222,45 @@ export class PythonWorker extends Backend {
     public override async provideFiles(
         inlineFiles: Record<string, string>,
         hrefFiles: Record<string, string>,
+        maxConcurrentFetches?: number,
     ): Promise<void> {
         await this.papyros?.provide_files.callKwargs({
             inline_files: JSON.stringify(inlineFiles),
             href_files: JSON.stringify(hrefFiles),
+            ...(maxConcurrentFetches === undefined ? {} : { max_concurrent_fetches: maxConcurrentFetches }),
         });
     }
 
+    public override async resyncFiles(): Promise<void> {
+        await this.papyros?.resync_files();
+    }
+
+    public override async explainError(id: number): Promise<Record<string, string>> {
+        return PythonWorker.convert((await this.papyros?.explain_traceback(id)) ?? {});
+    }
+
+    public override async getFrames(start: number, end: number): Promise<string | Uint8Array> {
+        const frames = PythonWorker.convert((await this.papyros?.get_frames(start, end)) ?? "[]");
+        return frames instanceof Uint8Array ? transfer(frames, [frames.buffer]) : frames;
+    }
+
+    public override async checkpointWorkspace(): Promise<number | undefined> {
+        return await this.papyros?.checkpoint_workspace();
+    }
+
+    public override async restoreWorkspace(checkpointId: number): Promise<void> {
+        await this.papyros?.restore_workspace(checkpointId);
+    }
+
+    public override async discardCheckpoint(checkpointId: number): Promise<void> {
+        await this.papyros?.discard_checkpoint(checkpointId);
+    }
+
     public override async deleteFile(name: string): Promise<void> {
         await this.papyros?.delete_file(name);
     }
 
-    public override async updateFile(name: string, content: string, binary: boolean): Promise<void> {
+    public override async updateFile(name: string, content: string | Uint8Array, binary: boolean): Promise<void> {
         await this.papyros?.update_file(name, content, binary);
     }
 
@@ -0,0 +1,119 @@
+import ast
+import doctest
+import hashlib
+from collections import OrderedDict
+
+import python_runner
+
+# Number of distinct sources whose analysis is kept
+MAX_ANALYSES = 16
+
+
+class SourceAnalysis:
+    """Everything Papyros derives from one source text, each computed at most once."""
+
+    def __init__(self, source_code):
+        self.source_code = source_code
+        self._parsed = False
+        self._tree = None
+        self._imports = None
+        self._examples = None
+        # (filename, mode, flags) -> code object
+        self._code = {}
+
+    @property
+    def tree(self):
+        """The ast of the source, None if it has a syntax error."""
+        if not self._parsed:
+            try:
+                self._tree = ast.parse(self.source_code)
+            except (SyntaxError, ValueError):
+                self._tree = None
+            self._parsed = True
+        return self._tree
+
+    @property
+    def imports(self):
+        """The sorted top-level modules the source imports, like pyodide.code.find_imports."""
+        if self._imports is None:
+            imports = set()
+            if self.tree is not None:
+                for node in ast.walk(self.tree):
+                    if isinstance(node, ast.Import):
+                        imports.update(alias.name.partition(".")[0] for alias in node.names)
+                    elif isinstance(node, ast.ImportFrom) and node.module is not None:
+                        imports.add(node.module.partition(".")[0])
+            self._imports = sorted(imports)
+        return self._imports
+
+    @property
+    def doctest_examples(self):
+        if self._examples is None:
+            try:
+                self._examples = doctest.DocTestParser().get_examples(self.source_code)
+            except ValueError:
+                self._examples = []
+        return self._examples
+
+    def compile(self, filename, mode, flags=0):
+        """Compile the source, raising SyntaxError like the builtin compile."""
+        key = (filename, mode, flags)
+        if key not in self._code:
+            self._code[key] = compile(self.source_code, filename, mode, flags=flags)
+        return self._code[key]
+
+
+class AnalysisCache:
+    """Bounded LRU cache of SourceAnalysis objects keyed by a digest of the source."""
+
+    def __init__(self, max_entries=MAX_ANALYSES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, source_code):
+        key = hashlib.blake2b(source_code.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        analysis = self._entries.get(key)
+        if analysis is None:
+            analysis = SourceAnalysis(source_code)
+            self._entries[key] = analysis
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        else:
+            self._entries.move_to_end(key)
+        return analysis
+
+
+class CachedCompileRunner(python_runner.Runner):
+    """Runner whose pre_run compiles through an AnalysisCache.
+
+    Placed after the patched runners of python_runner in the MRO, so their
+    pre_run still patches input and sleep before this one takes the place
+    of the pre_run of Runner, which it follows apart from the compile.
+    """
+
+    analyses = None
+
+    def pre_run(self, source_code, mode="exec", top_level_await=False):
+        compile_mode = mode
+        if mode == "single":
+            source_code += "\n"  # Allow compiling single-line compound statements
+        elif mode != "eval":
+            compile_mode = "exec"
+            self.reset()
+        self.output_buffer.reset()
+
+        self.set_source_code(source_code)
+
+        analysis = self.analyses.get(self.source_code)
+        try:
+            return analysis.compile(
+                self.filename,
+                compile_mode,
+                flags=top_level_await * ast.PyCF_ALLOW_TOP_LEVEL_AWAIT,
+            )
+        except SyntaxError as e:
+            if analysis.tree is not None and not analysis.tree.body:
+                # Code is only comments, which cannot be compiled in 'single' mode
+                return
+
+            self.output("syntax_error", **self.serialize_syntax_error(e))
@@ -0,0 +1,43 @@
+import time
+
+# Functions of the time module that report the virtual time while a clock is installed
+CLOCK_FUNCTIONS = ("time", "monotonic", "perf_counter")
+
+
+class VirtualClock:
+    """Clock for time.sleep that skips all or part of the waiting.
+
+    At speed 10, sleep(1) really waits 0.1 seconds; at an infinite speed it
+    does not wait at all. The skipped time is added to time.time,
+    time.monotonic and time.perf_counter, so the program still sees the full
+    duration pass.
+    """
+
+    def __init__(self, speed):
+        if not speed > 0:
+            raise ValueError(f"Clock speed must be positive, got {speed!r}")
+        self.speed = speed
+        # Seconds skipped by sleeping so far
+        self.offset = 0.0
+        self._originals = {}
+
+    def install(self):
+        for name in CLOCK_FUNCTIONS:
+            seconds = getattr(time, name)
+            nanoseconds = getattr(time, name + "_ns")
+            self._originals[name] = seconds
+            self._originals[name + "_ns"] = nanoseconds
+            setattr(time, name, lambda seconds=seconds: seconds() + self.offset)
+            setattr(time, name + "_ns",
+                    lambda nanoseconds=nanoseconds: nanoseconds() + int(self.offset * 1_000_000_000))
+
+    def uninstall(self):
+        for name, original in self._originals.items():
+            setattr(time, name, original)
+        self._originals = {}
+
+    def advance(self, seconds):
+        """Let seconds pass on the clock, return how many of them to really wait."""
+        wait = seconds / self.speed
+        self.offset += seconds - wait
+        return wait
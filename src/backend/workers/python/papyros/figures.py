@@ -0,0 +1,85 @@
+import hashlib
+import io
+import math
+
+# Resolution of rendered PNG figures, matplotlib's default
+FIGURE_DPI = 100
+# Upper bound on the number of pixels of a rendered PNG figure
+FIGURE_MAX_PIXELS = 1920 * 1080
+# Figures with at most this many drawn elements are sent as SVG, larger ones as PNG
+SVG_MAX_ELEMENTS = 2000
+
+
+class FigureRenderer:
+    """Render the open matplotlib figures for `pyplot.show`.
+
+    Only figures with content that changed since they were last shown are
+    rendered. Simple figures become SVG, which is small and sharp at every
+    zoom level. Figures with many elements or raster images become PNG,
+    as their SVG would be larger and slower to draw than the pixels.
+    """
+
+    def __init__(self, dpi=FIGURE_DPI, max_pixels=FIGURE_MAX_PIXELS, svg_max_elements=SVG_MAX_ELEMENTS):
+        self.dpi = dpi
+        self.max_pixels = max_pixels
+        self.svg_max_elements = svg_max_elements
+        # Figure number -> digest of its last rendered image
+        self._shown = {}
+
+    def reset(self):
+        self._shown = {}
+
+    def render(self, pyplot):
+        """Render the figures that changed, clearing them afterwards.
+
+        Returns a list of (image bytes, content type) tuples.
+        """
+        from matplotlib._pylab_helpers import Gcf
+
+        images = []
+        for manager in Gcf.get_all_fig_managers():
+            figure = manager.canvas.figure
+            number = manager.num
+            if not figure.stale and number in self._shown:
+                continue
+            if self._is_empty(figure):
+                continue
+            image = self._render_figure(figure)
+            digest = hashlib.blake2b(image[0], digest_size=16).digest()
+            if self._shown.get(number) != digest:
+                self._shown[number] = digest
+                images.append(image)
+            figure.clear()
+        return images
+
+    @staticmethod
+    def _is_empty(figure):
+        return not (figure.axes or figure.texts or figure.images or figure.lines
+                    or figure.patches or figure.artists or figure.legends)
+
+    def _element_count(self, figure):
+        count = len(figure.texts) + len(figure.patches) + len(figure.artists)
+        for axes in figure.axes:
+            if axes.images:
+                return math.inf
+            count += len(axes.patches) + len(axes.texts)
+            count += sum(len(line.get_xydata()) for line in axes.lines)
+            count += sum(max(len(collection.get_offsets()), len(collection.get_paths()))
+                         for collection in axes.collections)
+            if count > self.svg_max_elements:
+                break
+        return count + (math.inf if figure.images else 0)
+
+    def _render_figure(self, figure):
+        import matplotlib
+
+        buf = io.BytesIO()
+        if self._element_count(figure) <= self.svg_max_elements:
+            # A fixed salt and no date keep the SVG of an unchanged figure identical
+            with matplotlib.rc_context({"svg.hashsalt": "papyros"}):
+                figure.savefig(buf, format="svg", metadata={"Date": None})
+            return buf.getvalue(), "image/svg+xml"
+        width, height = figure.get_size_inches()
+        dpi = min(self.dpi, math.sqrt(self.max_pixels / (width * height)))
+        figure.savefig(buf, format="png", dpi=dpi)
+        return buf.getvalue(), "image/png"
@@ -0,0 +1,137 @@
+"""Binary encoding of debug frames, decoded by src/communication/FrameCodec.ts.
+
+Frames are encoded in a subset of MessagePack (https://msgpack.org): nil,
+booleans, integers, float 64, str, array and map. The names and reprs in
+the frames of a batch repeat a lot, so a string that occurs more than once
+is stored once, in a table in front of the frames, and referred to by its
+index in that table with an extension of type STRING_REF. The buffer is an
+array holding the table and the list of frames.
+"""
+
+from collections import Counter
+from struct import pack
+
+# MessagePack extension type of a reference to a string in the table
+STRING_REF = 0
+# Strings shorter than this are written out, a reference would not be shorter
+MIN_SHARED_LENGTH = 3
+
+
+def _count_strings(value, counts):
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, str):
+            counts[value] += 1
+        elif isinstance(value, dict):
+            counts.update(value.keys())
+            stack.extend(value.values())
+        elif isinstance(value, list):
+            stack.extend(value)
+
+
+def _encode_str(value, out):
+    data = value.encode("utf-8")
+    size = len(data)
+    if size < 32:
+        out.append(0xA0 | size)
+    elif size < 0x100:
+        out += pack(">BB", 0xD9, size)
+    elif size < 0x10000:
+        out += pack(">BH", 0xDA, size)
+    else:
+        out += pack(">BI", 0xDB, size)
+    out += data
+
+
+def _encode_int(value, out):
+    if 0 <= value < 0x80:
+        out.append(value)
+    elif -32 <= value < 0:
+        out.append(value & 0xFF)
+    elif value >= 0:
+        if value < 0x100:
+            out += pack(">BB", 0xCC, value)
+        elif value < 0x10000:
+            out += pack(">BH", 0xCD, value)
+        elif value < 0x100000000:
+            out += pack(">BI", 0xCE, value)
+        elif value < 0x10000000000000000:
+            out += pack(">BQ", 0xCF, value)
+        else:
+            raise OverflowError("Integer does not fit in 64 bits")
+    elif value >= -0x80:
+        out += pack(">Bb", 0xD0, value)
+    elif value >= -0x8000:
+        out += pack(">Bh", 0xD1, value)
+    elif value >= -0x80000000:
+        out += pack(">Bi", 0xD2, value)
+    elif value >= -0x8000000000000000:
+        out += pack(">Bq", 0xD3, value)
+    else:
+        raise OverflowError("Integer does not fit in 64 bits")
+
+
+def _encode_header(size, out, fix, small, large):
+    if size < 16:
+        out.append(fix | size)
+    elif size < 0x10000:
+        out += pack(">BH", small, size)
+    else:
+        out += pack(">BI", large, size)
+
+
+def _encode_ref(index, out):
+    if index < 0x100:
+        out += pack(">BbB", 0xD4, STRING_REF, index)
+    elif index < 0x10000:
+        out += pack(">BbH", 0xD5, STRING_REF, index)
+    else:
+        out += pack(">BbI", 0xD6, STRING_REF, index)
+
+
+def _encode(value, out, refs):
+    if isinstance(value, str):
+        index = refs.get(value)
+        if index is None:
+            _encode_str(value, out)
+        else:
+            _encode_ref(index, out)
+    elif isinstance(value, dict):
+        _encode_header(len(value), out, 0x80, 0xDE, 0xDF)
+        for key, item in value.items():
+            _encode(key, out, refs)
+            _encode(item, out, refs)
+    elif isinstance(value, list):
+        _encode_header(len(value), out, 0x90, 0xDC, 0xDD)
+        for item in value:
+            _encode(item, out, refs)
+    elif value is None:
+        out.append(0xC0)
+    elif value is True:
+        out.append(0xC3)
+    elif value is False:
+        out.append(0xC2)
+    elif isinstance(value, int):
+        _encode_int(value, out)
+    elif isinstance(value, float):
+        out += pack(">Bd", 0xCB, value)
+    else:
+        raise TypeError(f"Can not encode {type(value).__name__} in a frame")
+
+
+def encode_frames(frames):
+    """Return the binary encoding of a list of parsed frames.
+
+    Raises OverflowError for an integer that does not fit in 64 bits.
+    """
+    counts = Counter()
+    _count_strings(frames, counts)
+    # The most common strings get the shortest references
+    table = [string for string, count in counts.most_common() if count > 1 and len(string) >= MIN_SHARED_LENGTH]
+    refs = {string: index for index, string in enumerate(table)}
+    out = bytearray()
+    _encode_header(2, out, 0x90, 0xDC, 0xDD)
+    _encode(table, out, {})
+    _encode(frames, out, refs)
+    return bytes(out)
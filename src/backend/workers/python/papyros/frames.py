@@ -0,0 +1,58 @@
+from time import perf_counter
+
+# Number of debug frames that are sent together at most
+FRAME_BATCH_SIZE = 256
+# Seconds after which the frames collected so far are sent by the next frame
+FRAME_BATCH_TIME = 0.05
+# Number of frames at the start of a debug run that are sent as they are, later
+# ones are summarized and the frontend asks for them as needed
+STREAMED_FRAMES = 1000
+# Seconds between two looks at the files a debugged program opened for writing earlier
+WRITTEN_FILES_INTERVAL = 0.05
+
+
+class FrameBatch:
+    """Debug frames collected to cross into JavaScript as one "frames" event.
+
+    The file changes and turtle patch that precede a frame are kept with
+    the index of that frame in the batch, so the frontend can replay them in
+    the order in which separate events would have arrived. The batch is
+    sent once it holds max_size frames, once max_time passed since its
+    first frame, or when flush is called, which Papyros does before every
+    other event.
+    """
+
+    max_size = FRAME_BATCH_SIZE
+    max_time = FRAME_BATCH_TIME
+
+    def __init__(self, send):
+        self._send = send
+        self.sent = 0
+        self._reset()
+
+    def _reset(self):
+        self.frames = []
+        # Pairs of the index of a frame and what came right before it
+        self.files = []
+        self.turtle = []
+        self._start = 0.0
+
+    def add(self, frame, files=None, turtle=None):
+        index = len(self.frames)
+        if files is not None:
+            self.files.append([index, files])
+        if turtle is not None:
+            self.turtle.append([index, turtle])
+        self.frames.append(frame)
+        if not index:
+            self._start = perf_counter()
+        if len(self.frames) >= self.max_size or perf_counter() - self._start >= self.max_time:
+            self.flush()
+
+    def flush(self):
+        if not self.frames:
+            return
+        batch = dict(frames=self.frames, files=self.files, turtle=self.turtle)
+        self.sent += len(self.frames)
+        self._reset()
+        self._send(batch)
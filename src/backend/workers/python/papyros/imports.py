@@ -0,0 +1,82 @@
+import os
+import sys
+
+from .analysis import AnalysisCache
+
+
+class ImportResolver:
+    """Find every module a program needs before it runs.
+
+    Besides the imports of the program itself, the imports of the workspace
+    modules it uses are followed. Packages can import modules that their
+    metadata does not declare as dependency. Those only show up as a
+    ModuleNotFoundError while running, so they are remembered per package
+    and installed up front the next time that package is imported.
+    """
+
+    def __init__(self, workspace, main_module, analyses):
+        self.workspace = workspace
+        self.main_module = main_module
+        self.analyses = analyses
+        # Workspace modules get a cache of their own, so they never evict the program itself
+        self.module_analyses = AnalysisCache()
+        # Top-level package -> modules it needed that were not installed with it
+        self.hidden_dependencies = {}
+
+    def _local_files(self, module):
+        """Return the workspace .py files that make up a module, if any."""
+        path = os.path.join(self.workspace, module)
+        if os.path.isfile(path + ".py"):
+            return [path + ".py"]
+        if not os.path.isdir(path):
+            return []
+        files = []
+        for dirpath, _, filenames in os.walk(path):
+            files.extend(os.path.join(dirpath, f) for f in sorted(filenames) if f.endswith(".py"))
+        return files
+
+    def resolve(self, source_code):
+        """Return the top-level modules to install to run source_code."""
+        imports = []
+        seen = set()
+        pending = list(self.analyses.get(source_code).imports)
+        while pending:
+            module = pending.pop()
+            if module in seen:
+                continue
+            seen.add(module)
+            local_files = self._local_files(module)
+            for path in local_files:
+                try:
+                    with open(path, encoding="utf-8") as f:
+                        pending.extend(self.module_analyses.get(f.read()).imports)
+                except (OSError, UnicodeDecodeError):
+                    continue
+            if not local_files:
+                imports.append(module)
+                pending.extend(self.hidden_dependencies.get(module, ()))
+        return imports
+
+    def _is_user_module(self, name):
+        top_level = name.partition(".")[0]
+        if not top_level:
+            # The workspace itself, which any code without a module name would match
+            return False
+        return top_level == self.main_module or bool(self._local_files(top_level))
+
+    def learn(self, error):
+        """Remember which package needed the module a ModuleNotFoundError misses."""
+        missing = error.name.partition(".")[0]
+        tb = error.__traceback__
+        # The first package the program calls into is the one that did the import
+        in_program = False
+        while tb is not None:
+            name = tb.tb_frame.f_globals.get("__name__") or ""
+            package = name.partition(".")[0]
+            if self._is_user_module(name):
+                in_program = True
+            elif in_program and package and package not in sys.stdlib_module_names:
+                if package != missing:
+                    self.hidden_dependencies.setdefault(package, set()).add(missing)
+                return
+            tb = tb.tb_next
@@ -0,0 +1,44 @@
+import sys
+
+
+class MatplotlibImportHook:
+    """Import hook that lazily patches matplotlib to show figures in Papyros.
+
+    Installed in sys.meta_path. When user code imports `matplotlib.pyplot`
+    for the first time, this hook imports it and replaces `show` with a
+    function that sends the figures to Papyros. The patched module stays in
+    sys.modules, so the patch is only applied once per interpreter.
+
+    If user code never imports pyplot, matplotlib is never imported.
+    """
+
+    def __init__(self):
+        self.papyros = None
+        self._loading = False
+
+    def find_spec(self, name, path, target=None):
+        if name == 'matplotlib.pyplot' and not self._loading:
+            import importlib.util
+            return importlib.util.spec_from_loader(name, self)
+        return None
+
+    def create_module(self, spec):
+        return self._setup_pyplot()
+
+    def exec_module(self, module):
+        pass
+
+    def _setup_pyplot(self):
+        self._loading = True
+        try:
+            # workaround from https://github.com/pyodide/pyodide/issues/1518
+            import matplotlib.pyplot
+            pyplot = sys.modules['matplotlib.pyplot']
+
+            def show(*args, **kwargs):
+                self.papyros._show_matplotlib(pyplot)
+
+            pyplot.show = show
+            return pyplot
+        finally:
+            self._loading = False
@@ -0,0 +1,53 @@
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from time import perf_counter
+
+
+def _size(data):
+    if isinstance(data, (str, bytes, bytearray, memoryview)):
+        return len(data)
+    if isinstance(data, dict):
+        return sum(map(_size, data.values()))
+    if isinstance(data, (list, tuple)):
+        return sum(map(_size, data))
+    return 0
+
+
+class RunMetrics:
+    """Timings of the phases of one operation of Papyros and counts of what it did.
+
+    Phases can nest: the time of running a program includes the file and
+    turtle snapshots sent while it runs. A phase entered more than once,
+    e.g. by every frame of the debugger, adds up.
+    """
+
+    def __init__(self, operation):
+        self.operation = operation
+        # Phase name -> seconds spent in it
+        self.phases = defaultdict(float)
+        self.counts = Counter()
+
+    @contextmanager
+    def phase(self, name):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] += perf_counter() - start
+
+    def count(self, name, amount=1):
+        self.counts[name] += amount
+
+    def count_event(self, data):
+        """Count an event sent to the frontend and the size of its text or binary data.
+
+        The data of events such as files and file_chunk is a dict, for which
+        the text and binary values in it are counted, e.g. the contents of
+        the files. Text is counted a byte per character, to not encode it
+        only to measure it.
+        """
+        self.counts["events"] += 1
+        self.counts["bytes"] += _size(data)
+
+    def report(self):
+        return dict(operation=self.operation, phases=dict(self.phases), counts=dict(self.counts))
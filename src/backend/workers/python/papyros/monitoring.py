@@ -0,0 +1,224 @@
+import sys
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from time import perf_counter
+
+# sys.monitoring tool used to count steps, the one meant for coverage tools
+STEP_TOOL_ID = 1
+# sys.monitoring tool used by the debugger, the one meant for debuggers
+DEBUGGER_TOOL_ID = 0
+# Number of events between two looks at the clock of an ExecutionBudget
+BUDGET_CHECK_INTERVAL = 1000
+
+
+class CodeMonitor:
+    """Context manager receiving the sys.monitoring events of one file.
+
+    Code outside that file is disabled after its first event and runs at
+    full speed. Without sys.monitoring (Python < 3.12), or while the tool is
+    in use, nothing is monitored and active stays False.
+    """
+
+    tool_id = STEP_TOOL_ID
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.active = False
+        self._monitoring = getattr(sys, "monitoring", None)
+
+    def _callbacks(self):
+        """Return the callback of every event to monitor, subclasses add theirs."""
+        return {}
+
+    def _events(self):
+        """Return the events to turn on, all those with a callback unless overridden."""
+        events = 0
+        for event in self._callbacks():
+            events |= event
+        return events
+
+    def __enter__(self):
+        monitoring = self._monitoring
+        if monitoring is None or monitoring.get_tool(self.tool_id) is not None:
+            return self
+        self.active = True
+        monitoring.use_tool_id(self.tool_id, "papyros")
+        for event, callback in self._callbacks().items():
+            monitoring.register_callback(self.tool_id, event, callback)
+        monitoring.set_events(self.tool_id, self._events())
+        # Code disabled while monitoring an earlier run must be seen again
+        monitoring.restart_events()
+        return self
+
+    def __exit__(self, *exc_info):
+        monitoring = self._monitoring
+        if not self.active:
+            return False
+        monitoring.set_events(self.tool_id, 0)
+        for event in self._callbacks():
+            monitoring.register_callback(self.tool_id, event, None)
+        monitoring.free_tool_id(self.tool_id)
+        return False
+
+
+class StepCounter(CodeMonitor):
+    """Count the lines executed in one file, steps stays None if they can't be counted."""
+
+    def __init__(self, filename):
+        super().__init__(filename)
+        self.steps = None
+
+    def _callbacks(self):
+        return {self._monitoring.events.LINE: self._on_line}
+
+    def _on_line(self, code, line_number):
+        if code.co_filename != self.filename:
+            return self._monitoring.DISABLE
+        self.steps += 1
+
+    def __enter__(self):
+        super().__enter__()
+        if self.active:
+            self.steps = 0
+        return self
+
+
+class LineProfiler(CodeMonitor):
+    """Count how often each line of one file runs and how long it takes.
+
+    A line is charged the time until the next line of the file starts, so a
+    line that calls into other code includes the time spent there.
+    """
+
+    def __init__(self, filename):
+        super().__init__(filename)
+        # Line number -> number of times it started
+        self.hits = Counter()
+        # Line number -> seconds spent in it
+        self.times = defaultdict(float)
+        self._line = None
+        self._start = 0.0
+
+    def _callbacks(self):
+        return {self._monitoring.events.LINE: self._on_line}
+
+    def _on_line(self, code, line_number):
+        if code.co_filename != self.filename:
+            return self._monitoring.DISABLE
+        if self._line is not None:
+            self.times[self._line] += perf_counter() - self._start
+        self.hits[line_number] += 1
+        self._line = line_number
+        # Started last, to not charge the line for this callback
+        self._start = perf_counter()
+
+    def __exit__(self, *exc_info):
+        if self._line is not None:
+            self.times[self._line] += perf_counter() - self._start
+            self._line = None
+        return super().__exit__(*exc_info)
+
+
+class ExecutionBudgetExceeded(TimeoutError):
+    """Raised in a program that ran longer or executed more lines than it was allowed."""
+
+
+class ExecutionBudget(CodeMonitor):
+    """Stop a program once it runs too long or executes too many lines.
+
+    Jumps of the program are monitored, which happen once per loop
+    iteration: a program can only run long without jumping by recursing,
+    and that runs into the recursion limit. With max_steps, lines are
+    monitored as well, and a jump that did not reach a new line counts as a
+    step, as a one-line loop runs that line again. The clock is only read
+    every BUDGET_CHECK_INTERVAL events, and time spent in paused, such as
+    waiting for input, is not counted. The examples run by doctest are part
+    of the program.
+
+    An exception raised by a jump or line event escapes the try statements
+    of the program, so the ExecutionBudgetExceeded is raised by the next
+    instruction of the program instead. That way, the program can catch it,
+    and otherwise it ends the program like any other exception. Once
+    exceeded, it is raised again after every BUDGET_CHECK_INTERVAL events,
+    so handling it can not go on forever.
+    """
+
+    def __init__(self, filename, max_time=None, max_steps=None):
+        super().__init__(filename)
+        self.max_time = max_time
+        self.max_steps = max_steps
+        self.steps = 0
+        self._step_limit = max_steps
+        self._countdown = BUDGET_CHECK_INTERVAL
+        self._deadline = None
+        # Whether a line event came after the last jump
+        self._new_line = False
+        # Message of the exception for the next instruction to raise
+        self._exceeded = None
+
+    def _callbacks(self):
+        events = self._monitoring.events
+        return {events.JUMP: self._on_jump, events.LINE: self._on_line, events.INSTRUCTION: self._on_instruction}
+
+    def _events(self):
+        events = self._monitoring.events
+        return events.JUMP | events.LINE if self.max_steps is not None else events.JUMP
+
+    def _is_program(self, code):
+        return code.co_filename == self.filename or code.co_filename.startswith("<doctest ")
+
+    def _exceed(self, message):
+        self._exceeded = message
+        self._monitoring.set_events(self.tool_id, self._events() | self._monitoring.events.INSTRUCTION)
+
+    def _check(self):
+        """Look at the clock and the steps, called every BUDGET_CHECK_INTERVAL events and at every step."""
+        if self._step_limit is not None and self.steps > self._step_limit:
+            self._step_limit = self.steps + BUDGET_CHECK_INTERVAL
+            self._exceed(f"Program stopped after executing {self.max_steps} lines")
+        elif not self._countdown:
+            self._countdown = BUDGET_CHECK_INTERVAL
+            if self._deadline is not None and perf_counter() > self._deadline:
+                self._exceed(f"Program stopped after running for {self.max_time} seconds")
+
+    def _on_jump(self, code, offset, destination):
+        # Called for every loop iteration, so kept as lean as possible
+        if not self._is_program(code):
+            return self._monitoring.DISABLE
+        self._countdown -= 1
+        if self._step_limit is not None:
+            if not self._new_line:
+                self.steps += 1
+            self._new_line = False
+            self._check()
+        elif not self._countdown:
+            self._check()
+
+    def _on_line(self, code, line_number):
+        if not self._is_program(code):
+            return self._monitoring.DISABLE
+        self._new_line = True
+        self.steps += 1
+        self._countdown -= 1
+        self._check()
+
+    def _on_instruction(self, code, offset):
+        if not self._is_program(code):
+            return self._monitoring.DISABLE
+        self._monitoring.set_events(self.tool_id, self._events())
+        raise ExecutionBudgetExceeded(self._exceeded)
+
+    @contextmanager
+    def paused(self):
+        """Do not count the time spent in the with block."""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            if self._deadline is not None:
+                self._deadline += perf_counter() - start
+
+    def __enter__(self):
+        if self.max_time is not None:
+            self._deadline = perf_counter() + self.max_time
+        return super().__enter__()
@@ -0,0 +1,186 @@
+from collections import deque
+from time import monotonic
+
+from python_runner.output import OutputBuffer
+
+# Number of buffered characters that triggers a flush, and the most a single part holds
+FLUSH_LENGTH = 16 * 1024
+# Seconds after which buffered output is flushed by the next write
+FLUSH_TIME = 0.1
+# Characters of output a run may produce before only the tail of its output is kept.
+# The budget is in characters rather than UTF-8 bytes: it protects the page, which
+# holds and renders the output as JavaScript strings, and characters can be counted
+# without encoding every write.
+MAX_OUTPUT_LENGTH = 4 * 1024 * 1024
+# Characters of output per second a run may produce before only the tail of its output is kept
+MAX_OUTPUT_RATE = 1024 * 1024
+# Characters at the end of the output that are kept once the budget is exceeded
+TAIL_LENGTH = 16 * 1024
+# Types of output the budget applies to, others such as tracebacks and input always pass
+LIMITED_TYPES = ("output", "error", "stdout", "stderr")
+
+
+class OutputTail:
+    """Ring buffer keeping only the last characters of the output."""
+
+    def __init__(self, max_length):
+        self.max_length = max_length
+        self.parts = deque()
+        self.length = 0
+        self.dropped = 0
+
+    def add(self, output_type, text):
+        self.parts.append((output_type, text))
+        self.length += len(text)
+        while self.length > self.max_length:
+            first_type, first = self.parts[0]
+            excess = self.length - self.max_length
+            if len(first) <= excess:
+                self.parts.popleft()
+                excess = len(first)
+            else:
+                self.parts[0] = (first_type, first[excess:])
+            self.length -= excess
+            self.dropped += excess
+
+    def take(self):
+        """Return the number of dropped characters and the kept parts, and forget both."""
+        parts = []
+        for output_type, text in self.parts:
+            if parts and parts[-1]["type"] == output_type:
+                parts[-1]["text"] += text
+            else:
+                parts.append(dict(type=output_type, text=text))
+        dropped = self.dropped
+        self.parts.clear()
+        self.length = 0
+        self.dropped = 0
+        return dropped, parts
+
+
+class CoalescingOutputBuffer(OutputBuffer):
+    """Output buffer that merges writes before they cross into JavaScript.
+
+    Consecutive text parts of the same type are joined into one part and
+    flushed once enough text is buffered or enough time has passed. Every
+    other event of the runner flushes the buffer first, so output never
+    arrives after the input prompt, sleep or turtle drawing that followed it.
+    Parts with non-textual data, such as images, are kept as they are.
+
+    Once a run exceeds its output budget, in total or per second, only the
+    tail of its output is kept. The next event sends that tail, preceded by
+    a "truncated" part with the number of characters that were dropped.
+    When only the rate was exceeded, output is let through again after that,
+    as far as the rate allows.
+    """
+
+    flush_length = FLUSH_LENGTH
+    flush_time = FLUSH_TIME
+    max_length = MAX_OUTPUT_LENGTH
+    max_rate = MAX_OUTPUT_RATE
+    tail_length = TAIL_LENGTH
+
+    def __init__(self, flush):
+        self.begin()
+        super().__init__(flush)
+
+    def begin(self):
+        """Start a new run: reset the statistics and the output budget."""
+        self.writes = 0
+        self.crossings = 0
+        self.length = 0
+        self.window_start = monotonic()
+        self.window_length = 0
+        # Ring buffer for the output once the budget is exceeded
+        self.tail = None
+
+    def reset(self):
+        self.parts = []
+        # Texts of the last part, joined when flushing to not copy it on every write
+        self._chunks = []
+        self.size = 0
+        self.last_time = monotonic()
+
+    @property
+    def crossings_saved(self):
+        """Number of parts that were merged instead of crossing into JavaScript on their own."""
+        return self.writes - self.crossings
+
+    def _within_budget(self, text):
+        """Return the start of text that fits in the budget, switching to the tail if that is not all of it."""
+        now = monotonic()
+        if now - self.window_start >= 1:
+            self.window_start = now
+            self.window_length = 0
+        allowed = min(self.max_length - self.length, self.max_rate - self.window_length)
+        if len(text) > allowed:
+            self.tail = OutputTail(self.tail_length)
+            text = text[:max(allowed, 0)]
+        self.length += len(text)
+        self.window_length += len(text)
+        return text
+
+    def put(self, output_type, text, contentType=None, **extra):
+        self.writes += 1
+        textual = contentType is None or contentType.startswith("text/")
+        if textual:
+            if isinstance(text, bytes):
+                text = text.decode("utf8", "replace")
+            if not isinstance(text, str):
+                raise TypeError(f"Can only write str, not {type(text).__name__}")
+        if contentType is not None:
+            extra["contentType"] = contentType
+
+        if not textual:
+            self.flush(tail=True)
+            self.parts.append(dict(type=output_type, data=text, **extra))
+            self.flush()
+            return
+        if output_type not in LIMITED_TYPES:
+            # Keep the tail in front of tracebacks and input that came after it
+            self.flush(tail=True)
+        elif self.tail is not None:
+            self.tail.add(output_type, text)
+            return
+        else:
+            kept = self._within_budget(text)
+            if self.tail is not None:
+                self.tail.add(output_type, text[len(kept):])
+            text = kept
+
+        # A huge write is split, so no part holds much more than flush_length
+        for start in range(0, len(text), self.flush_length):
+            self._put_text(output_type, text[start:start + self.flush_length], contentType, extra)
+
+    def _put_text(self, output_type, text, contentType, extra):
+        last = self.parts[-1] if self.parts else None
+        if (last is not None and "text" in last and last["type"] == output_type
+                and last.get("contentType") == contentType):
+            self._chunks.append(text)
+        else:
+            # Whatever came before can not be merged with anything anymore
+            self.flush()
+            self.parts.append(dict(type=output_type, text="", **extra))
+            self._chunks.append(text)
+        self.size += len(text)
+        if self.should_flush():
+            self.flush()
+
+    def should_flush(self):
+        return self.size >= self.flush_length or monotonic() - self.last_time > self.flush_time
+
+    def flush(self, tail=False):
+        """Send the buffered parts, including the kept tail of the output if tail is set."""
+        if self._chunks:
+            self.parts[-1]["text"] = "".join(self._chunks)
+        if tail and self.tail is not None:
+            if self.tail.length:
+                dropped, tail_parts = self.tail.take()
+                if dropped:
+                    self.parts.append(dict(type="truncated", data=dropped))
+                self.parts.extend(tail_parts)
+            if self.length < self.max_length:
+                # Only the rate was exceeded, which the window of the next write checks again
+                self.tail = None
+        self.crossings += len(self.parts)
+        super().flush()
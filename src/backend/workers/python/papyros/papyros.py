@@ -1,63 +1,154 @@
-import builtins
-import functools
+import asyncio
+import gc
 import io
 import os
 import shutil
 import sys
 import json
 import base64
-import doctest
 import re
+import time
+import weakref
+from time import perf_counter
 import python_runner
-import friendly_traceback
 
-from friendly_traceback.core import FriendlyTraceback
+from collections import deque
 from collections.abc import Awaitable
-from contextlib import contextmanager, redirect_stdout, redirect_stderr
+from contextlib import contextmanager, nullcontext, redirect_stdout, redirect_stderr
 from pyodide_worker_runner import install_imports
-from pyodide.ffi import JsException, create_proxy
+from pyodide.ffi import JsException
 from .util import to_py
 from .turtle_hook import TurtleImportHook
+from .matplotlib_hook import MatplotlibImportHook
+from .figures import FIGURE_DPI, FIGURE_MAX_PIXELS, FigureRenderer
+from .imports import ImportResolver
+from .analysis import AnalysisCache, CachedCompileRunner
+from .workspace import FileJournal, WorkspaceCheckpoints, WorkspaceFiles
+from .monitoring import ExecutionBudget, StepCounter
+from .profiling import ProgramProfiler
+from .metrics import RunMetrics
+from .trace import TraceStore
+from .tracebacks import TracebackExplainer, summarize_traceback
+from .clock import VirtualClock
+from .frames import STREAMED_FRAMES, WRITTEN_FILES_INTERVAL, FrameBatch
+from .frame_codec import encode_frames
+from .output import MAX_OUTPUT_LENGTH, MAX_OUTPUT_RATE, CoalescingOutputBuffer
 from pyodide.http import pyfetch
 from types import ModuleType
 
 SYS_RECURSION_LIMIT = 500
 MODULE_NAME = "sandbox"
+# Number of href files provide_files downloads at the same time
+MAX_CONCURRENT_FETCHES = 6
+# Minimal time in seconds between two progress events of a download
+PROGRESS_INTERVAL = 0.1
+# Number of times a program is run again after installing a module it missed
+MAX_IMPORT_RETRIES = 3
 
 
-class Papyros(python_runner.PyodideRunner):
+class Papyros(python_runner.PyodideRunner, CachedCompileRunner):
+    # Merges output in Python, so only merged parts cross into JavaScript
+    OutputBufferClass = CoalescingOutputBuffer
+
     def __init__(
         self,
         *,
         source_code="",
         filename="/__main__.py",
         callback=None,
-        buffer_constructor=None,
-        limit=SYS_RECURSION_LIMIT
+        limit=SYS_RECURSION_LIMIT,
+        figure_dpi=FIGURE_DPI,
+        figure_max_pixels=FIGURE_MAX_PIXELS,
+        max_output_length=MAX_OUTPUT_LENGTH,
+        max_output_rate=MAX_OUTPUT_RATE,
+        binary_frames=False
     ):
         if callback is None:
             raise ValueError("Callback must not be None")
-        if buffer_constructor is not None:
-            self.OutputBufferClass = lambda f: buffer_constructor(create_proxy(f))
         super().__init__(source_code=source_code, filename=filename)
         self.workspace = "/home/pyodide/workspace"
         if os.path.exists(self.workspace):
             shutil.rmtree(self.workspace)
         os.makedirs(self.workspace)
         os.chdir(self.workspace)
-        self._tracked_files = set()
-        self._tracking_files = False
-        self._original_open = builtins.open
-        self._last_emitted_snapshot = None
+        # Writable file objects of the user that were still open at the last flush
+        self._open_files = weakref.WeakSet()
+        self._file_journal = FileJournal(self.workspace)
+        self._file_journal.install()
+        self._workspace_files = WorkspaceFiles(self.workspace)
+        self._checkpoints = WorkspaceCheckpoints(self._workspace_files)
+        # Parsed, compiled and analysed sources, shared by linting, installing and running
+        self.analyses = AnalysisCache()
+        self._import_resolver = ImportResolver(self.workspace, MODULE_NAME, self.analyses)
+        # Lines of stdin given up front, served before asking the frontend for input
+        self._stdin_lines = None
+        # Whether to ask the frontend for input once those lines run out, or to reach end of file
+        self._stdin_interactive = True
+        # Clock of the current run that fast-forwards time.sleep, None to really wait
+        self._clock = None
+        # Budget of the program that is running, None if it may run as long as it likes
+        self._budget = None
+        # Frames of the debugger that were not sent yet, None outside of debugging
+        self._frames = None
+        # Frames of the last debug run, for the frontend to ask for
+        self._trace = None
+        # Uncaught exceptions of the last run, for the frontend to ask the explanation of
+        self._tracebacks = TracebackExplainer()
+        # Whether debug frames are sent in the encoding of frame_codec instead of as JSON
+        self.binary_frames = binary_frames
+        # Timings of the run, lint or install that is going on, sent as a metrics event at its end
+        self._metrics = None
         self._turtle_hook = TurtleImportHook()
-        self._install_open_tracking()
+        self._matplotlib_hook = MatplotlibImportHook()
+        self._figure_renderer = FigureRenderer(dpi=figure_dpi, max_pixels=figure_max_pixels)
+        self.output_buffer.max_length = max_output_length
+        self.output_buffer.max_rate = max_output_rate
         self.limit = limit
         self.override_globals()
         self.set_event_callback(callback)
 
+    def callback(self, event_type, **data):
+        if self._frames is not None:
+            # The frames came first, so every event is a barrier for them
+            self._frames.flush()
+        if event_type != "output":
+            # Other events are barriers for the tail of truncated output as well
+            self.output_buffer.flush(tail=True)
+        if event_type == "input" and self._budget is not None:
+            # Waiting for the user does not use up the budget of the program
+            with self._budget.paused():
+                return super().callback(event_type, **data)
+        return super().callback(event_type, **data)
+
+    @contextmanager
+    def _measure(self, operation):
+        """Time operation and send its metrics at the end, or time it as a phase of the ongoing one."""
+        if self._metrics is not None:
+            with self._metrics.phase(operation):
+                yield
+            return
+        metrics = self._metrics = RunMetrics(operation)
+        try:
+            with metrics.phase("total"):
+                yield
+        finally:
+            self._metrics = None
+            if operation == "run":
+                metrics.count("crossings_saved", self.output_buffer.crossings_saved)
+            self.callback("metrics", data=metrics.report(), contentType="application/json")
+
+    def _phase(self, name):
+        return self._metrics.phase(name) if self._metrics is not None else nullcontext()
+
+    def _count(self, name, amount=1):
+        if self._metrics is not None:
+            self._metrics.count(name, amount)
+
     def set_event_callback(self, event_callback):
         def runner_callback(event_type, data):
             def cb(typ, dat, contentType=None, **kwargs):
+                if self._metrics is not None:
+                    self._metrics.count_event(dat)
                 return event_callback(dict(type=typ, data=dat, contentType=contentType or "text/plain", **kwargs))
 
             if event_type == "output":
@@ -69,6 +160,12 @@ class Papyros(python_runner.PyodideRunner):
                     data = part["text"] if "text" in part else part["data"]
                     if typ in ["stderr", "traceback", "syntax_error"]:
                         cb("error", data, contentType=part.get("contentType"))
+                    elif typ == "truncated":
+                        # Only the tail of the output was kept, this many characters were dropped
+                        cb("output-truncated", data, contentType="application/number")
+                    elif typ == "buffered_input":
+                        # Input served from stdin given up front, without asking the frontend
+                        cb("buffered-input", data)
                     elif typ in ["input", "input_prompt"]:
                         # Do not display values entered by user for input
                         continue
@@ -93,16 +190,25 @@ class Papyros(python_runner.PyodideRunner):
         self.override_matplotlib()
         self.override_turtle()
 
-    def _emit_turtle_snapshot(self):
+    def _turtle_patch(self):
+        """Return the turtle drawing's changes since the previous patch as JSON, None if there are none."""
         hook = self._turtle_hook
         if not hook.render or hook.svg_stream is None:
-            return
+            return None
         # Only the canvas items that changed since the previous snapshot are
         # rendered and sent; the frontend replays the patches. Re-rendering the
         # whole drawing here is what made debugging turtle programs quadratic.
-        patch = hook.svg_stream.patch()
+        with self._phase("turtle"):
+            patch = hook.svg_stream.patch()
+            if patch is None:
+                return None
+            self._count("turtle_items", len(patch.get("set", ())))
+            return json.dumps(patch)
+
+    def _emit_turtle_snapshot(self):
+        patch = self._turtle_patch()
         if patch is not None:
-            self.callback("turtle", data=json.dumps(patch), contentType="text/json")
+            self.callback("turtle", data=patch, contentType="text/json")
 
     def override_turtle(self):
         hook = self._turtle_hook
@@ -115,34 +221,39 @@ class Papyros(python_runner.PyodideRunner):
             sys.meta_path.insert(0, hook)
 
     def override_matplotlib(self):
-        try:
-            # workaround from https://github.com/pyodide/pyodide/issues/1518
-            import matplotlib.pyplot
-            import base64
-            from io import BytesIO
-
-            def show():
-                buf = BytesIO()
-                matplotlib.pyplot.savefig(buf, format="png")
-                buf.seek(0)
-                # encode to a base64 str
-                img = base64.b64encode(buf.read()).decode("utf-8")
-                matplotlib.pyplot.clf()
-                self.output("img", img, contentType="image/png;base64")
-
-            matplotlib.pyplot.show = show
-        except ModuleNotFoundError:
-            pass
+        hook = self._matplotlib_hook
+        hook.papyros = self
+        self._figure_renderer.reset()
+        # pyplot is only imported and patched once a program imports it
+        if hook not in sys.meta_path:
+            sys.meta_path.insert(0, hook)
 
-    async def install_imports(self, source_code, ignore_missing=True):
-        try:
-            await install_imports(source_code, self.import_callback)
-        except (ValueError, JsException):
-            # Notify of import failure
-            self.callback("loading", data=dict(status="failed", modules=[]), contentType="application/json")
-            # Occurs when trying to fetch PyPi files for misspelled imports
-            if not ignore_missing:
-                raise
+    def _show_matplotlib(self, pyplot):
+        for image, content_type in self._figure_renderer.render(pyplot):
+            # Raw bytes, the frontend shows them without decoding base64
+            self.output("img", image, contentType=content_type)
+
+    async def install_imports(self, source_code, ignore_missing=True, preflight=False):
+        """Install the packages imported by source_code, or by a list of module names.
+
+        With preflight, the imports of the workspace modules it uses and the
+        dependencies packages were seen to hide are installed as well,
+        so running the code does not need to stop for a missing module.
+        """
+        with self._measure("install"):
+            if preflight:
+                with self._without_file_tracking():
+                    source_code = self._import_resolver.resolve(source_code)
+            elif isinstance(source_code, str):
+                source_code = self.analyses.get(source_code).imports
+            try:
+                await install_imports(source_code, self.import_callback)
+            except (ValueError, JsException):
+                # Notify of import failure
+                self.callback("loading", data=dict(status="failed", modules=[]), contentType="application/json")
+                # Occurs when trying to fetch PyPi files for misspelled imports
+                if not ignore_missing:
+                    raise
 
     def import_callback(self, typ, modules):
         if typ in ["loading_one", "loaded_all"]:
@@ -154,75 +265,90 @@ class Papyros(python_runner.PyodideRunner):
         module_names = [mod["module"] for mod in modules]
         self.callback("loading", data=dict(status=status, modules=module_names), contentType="application/json")
 
-    def _install_open_tracking(self):
-        papyros = self
-
-        @functools.wraps(self._original_open)
-        def tracked_open(*args, **kwargs):
-            f = papyros._original_open(*args, **kwargs)
-            if papyros._tracking_files:
-                papyros._tracked_files.add(f)
-            return f
-
-        builtins.open = tracked_open
-
     @contextmanager
     def _without_file_tracking(self):
-        was_tracking = self._tracking_files
-        self._tracking_files = False
+        journal = self._file_journal
+        was_recording = journal.recording
+        journal.recording = False
         try:
             yield
         finally:
-            self._tracking_files = was_tracking
+            journal.recording = was_recording
 
-    def _flush_open_files(self):
-        closed = set()
-        for f in self._tracked_files:
-            if f.closed:
-                closed.add(f)
-            else:
-                try:
-                    f.flush()
-                except Exception:
-                    pass
-        self._tracked_files -= closed
+    def _find_open_files(self, thorough):
+        """Yield the writable file objects that are open, to flush them.
 
-    def _emit_created_files(self):
-        with self._without_file_tracking():
-            cwd = os.getcwd()
-            result = {}
+        The audit event of an open() fires before its file object exists, so the
+        objects are looked up afterwards: in the frames on the stack, which is
+        where a program that is still running holds its files, or when thorough
+        among every object tracked by the garbage collector.
+        """
+        if thorough:
+            candidates = gc.get_objects()
+        else:
+            candidates = []
+            frame = sys._getframe()
+            while frame is not None:
+                candidates.extend(frame.f_locals.values())
+                frame = frame.f_back
+        for obj in candidates:
+            if isinstance(obj, io.IOBase) and not obj.closed and obj.writable():
+                yield obj
+
+    def _flush_open_files(self, thorough=False):
+        journal = self._file_journal
+        if journal.take_opened() or (thorough and journal.written):
+            self._open_files.update(self._find_open_files(thorough))
+        for f in list(self._open_files):
+            try:
+                f.flush()
+            except Exception:
+                # Closed in the meantime
+                self._open_files.discard(f)
+
+    def _created_files(self):
+        """Return the changes to the workspace since the previous snapshot, None if there are none."""
+        with self._phase("files"), self._without_file_tracking():
             try:
-                for dirpath, dirnames, filenames in os.walk(cwd):
-                    for filename in filenames:
-                        try:
-                            path = os.path.join(dirpath, filename)
-                            size = os.path.getsize(path)
-                            if size > 1024 * 1024:
-                                continue
-                            key = os.path.relpath(path, cwd)
-                            try:
-                                with open(path, "r", encoding="utf-8") as f:
-                                    content = f.read()
-                                result[key] = {"content": content, "binary": False}
-                            except (UnicodeDecodeError, IOError):
-                                with open(path, "rb") as f:
-                                    content = base64.b64encode(f.read()).decode("ascii")
-                                result[key] = {"content": content, "binary": True}
-                        except Exception:
-                            continue
+                changes = self._workspace_files.snapshot(self._file_journal.collect())
             except Exception:
-                return
-            snapshot = json.dumps(result, sort_keys=True)
-            if snapshot == self._last_emitted_snapshot:
-                return
-            self._last_emitted_snapshot = snapshot
-            self.callback("files", data=snapshot, contentType="text/json")
+                return None
+            self._count("files_scanned", self._workspace_files.scanned)
+            if changes is None:
+                return None
+            # Large files go ahead of the event that lists them, one chunk at a
+            # time, so the worker never holds more than a chunk of them
+            for entries in (changes.get("files", {}), changes.get("added", {}), changes.get("modified", {})):
+                for key, entry in entries.items():
+                    if entry.get("chunked") and not entry.get("unchanged"):
+                        self._stream_file(key)
+            return changes
+
+    def _emit_created_files(self):
+        changes = self._created_files()
+        if changes is not None:
+            self.callback("files", data=changes, contentType="application/json")
+
+    def _stream_file(self, key):
+        try:
+            for offset, chunk in self._workspace_files.iter_chunks(key):
+                self.callback("file_chunk", data=dict(name=key, offset=offset, content=chunk),
+                              contentType="application/json")
+        except OSError:
+            # Removed in the meantime, the next snapshot will notice
+            pass
+
+    def resync_files(self):
+        """Send the frontend a full listing of the workspace instead of the next delta."""
+        self._workspace_files.request_resync()
+        self._emit_created_files()
 
     @contextmanager
     def _execute_context(self):
-        self._tracked_files.clear()
-        self._tracking_files = True
-        self._last_emitted_snapshot = None
+        self.output_buffer.begin()
+        self._open_files.clear()
+        self._file_journal.begin()
+        self._file_journal.recording = True
         with (
             redirect_stdout(python_runner.output.SysStream("output", self.output_buffer)),
             redirect_stderr(python_runner.output.SysStream("error", self.output_buffer)),
@@ -230,12 +356,16 @@ class Papyros(python_runner.PyodideRunner):
             try:
                 yield
             except BaseException as e:
-                self.output("traceback", **self.serialize_traceback(e))
-                self._flush_open_files()
+                with self._phase("traceback"):
+                    traceback = self.serialize_traceback(e)
+                self.output("traceback", **traceback)
+                self._flush_open_files(thorough=True)
                 self._emit_created_files()
                 self._emit_turtle_snapshot()
             finally:
-                self._tracking_files = False
+                self._file_journal.recording = False
+                self._stdin_lines = None
+                self._stop_clock()
         self.post_run()
 
     def pre_run(self, source_code, mode="exec", top_level_await=False):
@@ -249,121 +379,338 @@ if __name__ == "{MODULE_NAME}":
 """
         return super().pre_run(source_code, mode=mode, top_level_await=top_level_await)
 
-    async def run_async(self, source_code, mode="exec", top_level_await=True, max_steps=None):
-        with self._execute_context():
-            try:
-                code_obj = self.pre_run(source_code, mode=mode, top_level_await=top_level_await)
-                if code_obj:
-                    self.callback("start", data="RunCode", contentType="text/plain")
-                    if mode == "debug":
-                        from tracer import JSONTracer
-
-                        def frame_callback(frame):
-                            # Walking and re-reading the whole workspace on every
-                            # frame is wasteful for programs that never touch a
-                            # file. _tracked_files holds every file opened since
-                            # the last flush plus any still-open handle (a closed
-                            # file is only dropped by the flush below), so when it
-                            # is empty the workspace cannot have changed since the
-                            # previous frame. Files changed without builtins.open
-                            # (e.g. os.rename) still show up through the
-                            # end-of-run emission.
-                            workspace_may_have_changed = bool(self._tracked_files)
-                            self._flush_open_files()
-                            if workspace_may_have_changed or self._last_emitted_snapshot is None:
-                                self._emit_created_files()
-                            self._emit_turtle_snapshot()
-                            self.callback("frame", data=frame, contentType="application/json")
-
-                        tracer_kwargs = {"frame_callback": frame_callback, "module_name": MODULE_NAME,
-                                         "frame_format": "delta"}
-                        if max_steps is not None:
-                            tracer_kwargs["max_steps"] = max_steps
-                        result = JSONTracer(**tracer_kwargs).runscript(source_code)
+    async def run_async(self, source_code, mode="exec", top_level_await=True, max_steps=None, stdin=None,
+                        clock_speed=None, time_limit=None, step_limit=None):
+        """Run source_code, reading input from stdin before asking the frontend for more.
+
+        With a clock_speed, time.sleep waits that many times shorter, or not
+        at all when it is infinite, while the time functions keep up.
+        The "profile" mode sends a "profile" event with the functions and
+        lines the program spent its time in right before it ends.
+        Other modes than "debug" and "profile" stop the program with an
+        ExecutionBudgetExceeded once it runs longer than time_limit seconds,
+        not counting waiting for input, or executes more than step_limit lines.
+        """
+        with self._measure("run"):
+            return await self._run_async(source_code, mode, top_level_await, max_steps, stdin, clock_speed,
+                                         time_limit, step_limit)
+
+    async def _run_async(self, source_code, mode, top_level_await, max_steps, stdin, clock_speed,
+                         time_limit, step_limit):
+        # Dependencies are installed before running, see install_imports.
+        # A module that could not be foreseen costs running the program again.
+        retries = 0
+        # A trace and exceptions are only kept until the next run
+        self._trace = None
+        self._tracebacks.clear()
+        while True:
+            if stdin is not None:
+                self._buffer_stdin(stdin, interactive=True)
+            self._start_clock(clock_speed)
+            with self._execute_context():
+                try:
+                    with self._phase("compile"):
+                        code_obj = self.pre_run(source_code, mode=mode, top_level_await=top_level_await)
+                    if code_obj:
+                        self.callback("start", data="RunCode", contentType="text/plain")
+                        with self._phase("execute"):
+                            if mode == "debug":
+                                from .tracing import MonitoringTracer
+
+                                written_checked = 0.0
+
+                                def frame_callback(frame):
+                                    nonlocal written_checked
+                                    # Output of the previous step goes ahead of this frame,
+                                    # which sends the frames before it as well
+                                    self.output_buffer.flush(tail=True)
+                                    # The journal knows every workspace path the program
+                                    # may have changed, so a frame that touched no file
+                                    # costs nothing here and one that did only looks at
+                                    # those paths. Files that were opened for writing
+                                    # earlier can change without the journal noticing, they
+                                    # are only looked at every WRITTEN_FILES_INTERVAL.
+                                    self._flush_open_files()
+                                    journal = self._file_journal
+                                    files = None
+                                    if (journal.has_new_changes or self._workspace_files.needs_resync
+                                            or (journal.written and perf_counter() - written_checked
+                                                >= WRITTEN_FILES_INTERVAL)):
+                                        written_checked = perf_counter()
+                                        files = self._created_files()
+                                    index, parsed = self._trace.add(frame)
+                                    if index >= STREAMED_FRAMES:
+                                        parsed = self._trace.summary(index)
+                                        frame = json.dumps(parsed)
+                                    # Both sizes are counted, to compare the encodings
+                                    self._count("frame_json_bytes", len(frame))
+                                    # The binary encoding reuses the frame as it was parsed for the trace
+                                    self._frames.add(parsed if self.binary_frames else frame, files=files,
+                                                     turtle=self._turtle_patch())
+
+                                tracer_kwargs = {"frame_callback": frame_callback, "module_name": MODULE_NAME,
+                                                 "frame_format": "delta"}
+                                if max_steps is not None:
+                                    tracer_kwargs["max_steps"] = max_steps
+                                self._trace = TraceStore()
+                                self._frames = FrameBatch(self._send_frames)
+                                try:
+                                    result = MonitoringTracer(**tracer_kwargs).runscript(source_code)
+                                finally:
+                                    self._frames.flush()
+                                    self._count("frames", self._frames.sent)
+                                    self._frames = None
+                            else:
+                                if mode == "profile":
+                                    monitor = profiler = ProgramProfiler(self.filename)
+                                elif time_limit is not None or step_limit is not None:
+                                    monitor = self._budget = ExecutionBudget(self.filename, max_time=time_limit,
+                                                                             max_steps=step_limit)
+                                else:
+                                    monitor = nullcontext()
+                                try:
+                                    with monitor:
+                                        result = self.execute(code_obj, mode)
+                                        # The profile and budget cover the awaited program as well
+                                        while isinstance(result, Awaitable):
+                                            result = await result
+                                finally:
+                                    self._budget = None
+                                    if mode == "profile":
+                                        # A program that raised or was interrupted has its profile as well
+                                        self.callback("profile", data=profiler.report(),
+                                                      contentType="application/json")
+                        self._flush_open_files(thorough=True)
+                        self._emit_created_files()
+                        self._emit_turtle_snapshot()
+                        self.callback("end", data="CodeFinished", contentType="text/plain")
+                        return result
+                except ModuleNotFoundError as mnf:
+                    # Try to automatically install missing dependencies
+                    # As they sometimes might be hidden within libraries
+                    if mnf.name is None or retries >= MAX_IMPORT_RETRIES:
+                        raise
+                    self._count("retries")
+                    self._import_resolver.learn(mnf)
+                    try:
+                        await self.install_imports([mnf.name.partition(".")[0]], ignore_missing=False)
+                    except:
+                        # If the module is truly not findable, raise the error again
+                        raise mnf
+                    retries += 1
+                    continue
+                except BaseException as e:
+                    # Sometimes KeyboardInterrupt is caught by Pyodide and raised as a PythonError
+                    # with a js_error containing the reason
+                    js_error = str(getattr(e, "js_error", ""))
+                    if isinstance(e, KeyboardInterrupt) or "KeyboardInterrupt" in js_error:
+                        self._emit_turtle_snapshot()
+                        self.callback("interrupt", data="KeyboardInterrupt", contentType="text/plain")
                     else:
-                        result = self.execute(code_obj, mode)
-                    while isinstance(result, Awaitable):
-                        result = await result
-                    self._flush_open_files()
-                    self._emit_created_files()
-                    self._emit_turtle_snapshot()
-                    self.callback("end", data="CodeFinished", contentType="text/plain")
-                    return result
-            except ModuleNotFoundError as mnf:
-                # Try to automatically install missing dependencies
-                # As they sometimes might be hidden within libraries
+                        raise
+            return None
+
+    def _send_frames(self, batch):
+        """Send a batch of frames, which are JSON texts, or parsed frames with binary_frames."""
+        frames = batch["frames"]
+        last = len(self._trace) - 1
+        if last >= STREAMED_FRAMES:
+            # The latest frame in full, to show while the program waits for input
+            if self.binary_frames:
+                frames[-1] = self._trace.frames(last, last + 1, parsed=True)[0]
+            else:
+                frames[-1] = self._trace.frame(last)
+        if self.binary_frames:
+            with self._phase("encode_frames"):
                 try:
-                    await self.install_imports([mnf.name], ignore_missing=False)
-                except:
-                    # If the module is truly not findable, raise the error again
-                    raise mnf
-                return await self.run_async(source_code, mode=mode, top_level_await=top_level_await, max_steps=max_steps)
-            except BaseException as e:
-                # Sometimes KeyboardInterrupt is caught by Pyodide and raised as a PythonError
-                # with a js_error containing the reason
-                js_error = str(getattr(e, "js_error", ""))
-                if isinstance(e, KeyboardInterrupt) or "KeyboardInterrupt" in js_error:
-                    self._emit_turtle_snapshot()
-                    self.callback("interrupt", data="KeyboardInterrupt", contentType="text/plain")
-                else:
-                    raise
+                    batch["frames"] = encode_frames(frames)
+                except OverflowError:
+                    # An integer that JSON can hold but the binary encoding can't, sent as JSON
+                    batch["frames"] = frames = [json.dumps(frame) for frame in frames]
+        if isinstance(batch["frames"], bytes):
+            self._count("frame_bytes", len(batch["frames"]))
+        else:
+            self._count("frame_bytes", sum(map(len, frames)))
+        # Sent as is: the output in front of the frames was flushed by the frame that followed it
+        return self._callback("frames", dict(data=batch, contentType="application/json"))
+
+    def get_frames(self, start, end):
+        """Return the JSON text of the frames from start up to end of the last debug run.
+
+        The first frame is complete and the others are deltas on top of the
+        one before them. The list is empty if there is no such debug run.
+        With binary_frames, the list is returned in that encoding instead.
+        """
+        if self._trace is None:
+            return "[]"
+        if self.binary_frames:
+            frames = self._trace.frames(start, end, parsed=True)
+            try:
+                return encode_frames(frames)
+            except OverflowError:
+                return json.dumps(frames)
+        return self._trace.frames(start, end)
+
+    def _start_clock(self, speed):
+        self._stop_clock()
+        if speed is not None:
+            self._clock = VirtualClock(speed)
+            self._clock.install()
+
+    def _stop_clock(self):
+        if self._clock is not None:
+            self._clock.uninstall()
+            self._clock = None
+
+    def sleep(self, seconds):
+        clock = self._clock
+        if clock is not None and isinstance(seconds, (int, float)) and seconds >= 0:
+            seconds = clock.advance(seconds)
+            if not seconds:
+                # Nothing left to wait for, so the frontend need not know
+                return None
+        return super().sleep(seconds)
+
+    def _buffer_stdin(self, stdin, interactive):
+        lines = stdin.split("\n")
+        if lines[-1] == "":
+            lines.pop()
+        self._stdin_lines = deque(line + "\n" for line in lines)
+        self._stdin_interactive = interactive
+
+    def readline(self, n=-1, prompt=""):
+        if not self.line and n and self._stdin_lines:
+            self.line = self._stdin_lines.popleft()
+            if self._stdin_interactive:
+                # Lets the frontend know which lines were used, like the lines it answered itself
+                self.output("buffered_input", self.line)
+        elif not self.line and n and self._stdin_lines is not None and not self._stdin_interactive:
+            # End of the given input
+            return ""
+        return super().readline(n, prompt=prompt)
+
+    def input(self, prompt=""):
+        if (not self.line and self._stdin_lines is not None and not self._stdin_lines
+                and not self._stdin_interactive):
+            self.output("input_prompt", prompt)
+            raise EOFError("EOF when reading a line")
+        return super().input(prompt)
+
+    async def _run_batch_case(self, code_obj, index, stdin, clock_speed, time_limit, step_limit):
+        """Run a compiled program with stdin as its input, return what it did."""
+        self.reset()
+        self._buffer_stdin(stdin, interactive=False)
+        self._start_clock(clock_speed)
+        self._open_files.clear()
+        self._file_journal.begin()
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        exception = None
+        if time_limit is None and step_limit is None:
+            monitor = StepCounter(self.filename)
+        else:
+            # Every case gets the whole budget
+            monitor = ExecutionBudget(self.filename, max_time=time_limit, max_steps=step_limit)
+        start = perf_counter()
+        with redirect_stdout(stdout), redirect_stderr(stderr), monitor:
+            self._file_journal.recording = True
+            try:
+                result = self.execute(code_obj)
+                while isinstance(result, Awaitable):
+                    result = await result
+            except SystemExit as e:
+                if e.code not in (None, 0):
+                    exception = summarize_traceback(e, self.filename)
+            except Exception as e:
+                exception = summarize_traceback(e, self.filename)
+            finally:
+                self._file_journal.recording = False
+                self._stop_clock()
+        if not monitor.active or (step_limit is None and time_limit is not None):
+            # A budget without a step limit does not count the lines
+            steps = None
+        else:
+            steps = monitor.steps
+        return dict(
+            index=index,
+            stdout=stdout.getvalue(),
+            stderr=stderr.getvalue(),
+            exception=exception,
+            time=perf_counter() - start,
+            steps=steps,
+        )
+
+    async def run_batch(self, source_code, inputs, clock_speed=None, time_limit=None, step_limit=None):
+        """Run source_code once for every stdin text in inputs.
+
+        The code is compiled once and every case starts from a fresh module
+        and the workspace files as they were before the first case. Each
+        result is sent as a "batch-case" event and all of them are returned.
+        The clock_speed, time_limit and step_limit apply to every case on
+        its own, as in run_async.
+        """
+        with self._measure("batch"):
+            return await self._run_batch(source_code, inputs, clock_speed, time_limit, step_limit)
+
+    async def _run_batch(self, source_code, inputs, clock_speed, time_limit, step_limit):
+        code_obj = self.pre_run(source_code, mode="exec", top_level_await=True)
+        if not code_obj:
+            # The syntax error has been output
+            self.post_run()
+            return []
+        self.output_buffer.begin()
+        with self._without_file_tracking():
+            checkpoint = self._checkpoints.create()
+        results = []
+        try:
+            for index, stdin in enumerate(inputs):
+                case = await self._run_batch_case(code_obj, index, stdin, clock_speed, time_limit, step_limit)
+                if self._file_journal.has_changes:
+                    self._flush_open_files(thorough=True)
+                    with self._without_file_tracking():
+                        self._checkpoints.restore(checkpoint)
+                self.callback("batch-case", data=case, contentType="application/json")
+                results.append(case)
+        except BaseException as e:
+            # Sometimes KeyboardInterrupt is caught by Pyodide and raised as a PythonError
+            js_error = str(getattr(e, "js_error", ""))
+            if isinstance(e, KeyboardInterrupt) or "KeyboardInterrupt" in js_error:
+                self.callback("interrupt", data="KeyboardInterrupt", contentType="text/plain")
+            else:
+                raise
+        finally:
+            self._stdin_lines = None
+            self._stdin_interactive = True
+            self._checkpoints.discard(checkpoint)
+            self.post_run()
+        return results
 
     def serialize_syntax_error(self, exc):
         raise  # Rethrow to ensure FriendlyTraceback library is imported correctly
 
     def serialize_traceback(self, exc):
-        # Allow friendly_traceback to inspect the code
-        friendly_traceback.source_cache.cache.add(self.filename, self.source_code)
-
-        # Initialize traceback
-        fr = FriendlyTraceback(type(exc), exc, exc.__traceback__)
-        fr.assign_generic()
-        fr.assign_cause()
-        # Translate properties to FriendlyError interface
-        tb = fr.info.get("shortened_traceback", "")
-        info = fr.info.get("generic", "")
-        why = fr.info.get("cause", "")
-        if why.startswith("No information is known about this exception."):
-            why = ""
-        what = fr.info.get("message", "")
-
-        name = type(exc).__name__
-        user_start = 0
-        tb_lines = tb.split("\n")
-        # Find first line in traceback that involves code from the user
-        while user_start < len(tb_lines) and self.filename not in tb_lines[user_start]:
-            user_start += 1
-        # Find line containing Exception name, denoting end of location of issue
-        user_end = user_start + 1
-        while user_end < len(tb_lines) and name not in tb_lines[user_end]:
-            user_end += 1
-        where = "\n".join(tb_lines[user_start:user_end]) or ""
-        # Format for callback
-        return dict(
-            text=json.dumps(dict(
-                    name=name,
-                    traceback=tb,
-                    info=info,
-                    why=why,
-                    where=where,
-                    what=what
-                )),
-            contentType="text/json"
-        )
+        # Only what the traceback object tells right away, friendly_traceback
+        # explains the exception once the frontend asks with its id
+        error = summarize_traceback(exc, self.filename)
+        error["id"] = self._tracebacks.add(exc, self.filename, self.source_code)
+        return dict(text=json.dumps(error), contentType="text/json")
+
+    def explain_traceback(self, exception_id):
+        """Return the info and why of friendly_traceback for an uncaught exception of the last run.
+
+        The dict is empty if there is no such exception, e.g. because another run started.
+        """
+        with self._measure("explain"), self._without_file_tracking():
+            return self._tracebacks.explain(exception_id)
 
     def lint(self, code):
-        with self._without_file_tracking():
+        with self._measure("lint"), self._without_file_tracking():
             self.set_source_code(code)
             from .linting import lint
             return lint(code)
 
     def has_doctests(self, code):
-        parser = doctest.DocTestParser()
-        try:
-            tests = parser.get_examples(code)
-            return bool(tests)
-        except ValueError:
-            return False
+        return bool(self.analyses.get(code).doctest_examples)
 
     def _safe_path(self, name):
         base = os.path.realpath(self.workspace)
@@ -388,10 +735,32 @@ if __name__ == "{MODULE_NAME}":
             return
         self._cleanup_empty_dirs(os.path.dirname(dirpath))
 
+    def checkpoint_workspace(self):
+        """Capture the files in the workspace, return an id to restore them with."""
+        with self._without_file_tracking():
+            return self._checkpoints.create()
+
+    def restore_workspace(self, checkpoint_id):
+        """Restore the workspace to a checkpoint, only rewriting the files that differ."""
+        with self._without_file_tracking():
+            changed = self._checkpoints.restore(checkpoint_id)
+            for path in changed:
+                self._file_journal.mark(path)
+                self._cleanup_empty_dirs(os.path.dirname(path))
+            self._emit_created_files()
+
+    def discard_checkpoint(self, checkpoint_id):
+        self._checkpoints.discard(checkpoint_id)
+
+    def _acknowledge(self, *paths):
+        # The frontend made these changes itself, so they are not sent back to it
+        self._workspace_files.acknowledge([os.path.relpath(path, self.workspace) for path in paths])
+
     def delete_file(self, name):
         path = self._safe_path(name)
         os.remove(path)
         self._cleanup_empty_dirs(os.path.dirname(path))
+        self._acknowledge(path)
 
     def rename_file(self, old_name, new_name):
         with self._without_file_tracking():
@@ -399,37 +768,78 @@ if __name__ == "{MODULE_NAME}":
             new_path = self._safe_writable_path(new_name)
             os.rename(old_path, new_path)
             self._cleanup_empty_dirs(os.path.dirname(old_path))
+            self._acknowledge(old_path, new_path)
 
     def update_file(self, name, content, binary=False):
         with self._without_file_tracking():
             path = self._safe_writable_path(name)
             if binary:
+                if isinstance(content, str):
+                    # Base64, as sent before buffers were accepted
+                    data = base64.b64decode(content)
+                elif hasattr(content, "to_bytes"):
+                    # A JavaScript Uint8Array or ArrayBuffer
+                    data = content.to_bytes()
+                else:
+                    data = bytes(content)
                 with open(path, "wb") as f:
-                    f.write(base64.b64decode(content))
+                    f.write(data)
             else:
                 with open(path, "w", encoding="utf-8") as f:
                     f.write(content)
+            self._acknowledge(path)
 
-    async def provide_files(self, inline_files, href_files):
+    async def provide_files(self, inline_files, href_files, max_concurrent_fetches=MAX_CONCURRENT_FETCHES):
         with self._without_file_tracking():
             inline_files = json.loads(inline_files)
             for f in inline_files:
                 path = self._safe_writable_path(f)
                 with open(path, "w") as fd:
                     fd.write(inline_files[f])
+                self._file_journal.mark(path)
                 self.callback("loading", data=dict(status="loaded", modules=[f]), contentType="application/json")
 
+            # Fetch concurrently, so providing many files takes as long as the slowest one
+            semaphore = asyncio.Semaphore(max_concurrent_fetches)
+
+            async def provide_href_file(name, url):
+                path = self._safe_writable_path(name)
+                async with semaphore:
+                    await self._download(name, url, path)
+                self._file_journal.mark(path)
+                self.callback("loading", data=dict(status="loaded", modules=[name]), contentType="application/json")
+
             href_files = json.loads(href_files)
-            for f in href_files:
-                url = href_files[f]
-                path = self._safe_writable_path(f)
-                r = await pyfetch(url, stream=True)
-                with open(path, "wb") as fd:
-                    fd.write(await r.bytes())
-                self.callback("loading", data=dict(status="loaded", modules=[f]), contentType="application/json")
+            await asyncio.gather(*(provide_href_file(name, url) for name, url in href_files.items()))
 
             self._emit_created_files()
 
+    async def _download(self, name, url, path):
+        """Stream the body of url to path, reporting progress as it arrives."""
+        r = await pyfetch(url)
+        body = r.js_response.body
+        if body is None:
+            with open(path, "wb") as fd:
+                fd.write(await r.bytes())
+            return
+        total = int(r.headers.get("content-length", 0)) or None
+        loaded = 0
+        last_report = time.monotonic()
+        reader = body.getReader()
+        with open(path, "wb") as fd:
+            while True:
+                chunk = await reader.read()
+                if chunk.done:
+                    break
+                data = chunk.value.to_bytes()
+                fd.write(data)
+                loaded += len(data)
+                now = time.monotonic()
+                if now - last_report >= PROGRESS_INTERVAL:
+                    last_report = now
+                    self.callback("loading", data=dict(status="progress", modules=[name], loaded=loaded, total=total),
+                                  contentType="application/json")
+
     def reset(self):
         """
         overwritten from PyodideRunner to change the module name
@@ -0,0 +1,76 @@
+import cProfile
+import os
+import pstats
+from time import perf_counter
+
+import python_runner
+
+from .monitoring import LineProfiler
+
+# Number of functions listed in a profile, those with the highest cumulative time
+MAX_PROFILE_FUNCTIONS = 20
+# Directories of the code that runs the program, left out of its profile
+RUNNER_DIRECTORIES = (os.path.dirname(python_runner.__file__) + os.sep, os.path.dirname(__file__) + os.sep)
+
+
+class ProgramProfiler:
+    """Context manager profiling a program run by Papyros.
+
+    cProfile times every function the program calls, while a LineProfiler
+    counts and times the lines of the program itself. The report is what
+    the "profile" event sends to the frontend.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._functions = cProfile.Profile()
+        self._lines = LineProfiler(filename)
+        self._start = 0.0
+        self.time = 0.0
+
+    def __enter__(self):
+        self._lines.__enter__()
+        self._start = perf_counter()
+        self._functions.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._functions.disable()
+        self.time = perf_counter() - self._start
+        return self._lines.__exit__(*exc_info)
+
+    def _program_functions(self, stats):
+        """Return the functions of the program and those it called, leaving out those of the runner."""
+        callees = {}
+        for function, (*_, callers) in stats.items():
+            for caller in callers:
+                callees.setdefault(caller, []).append(function)
+        pending = [function for function in stats if function[0] == self.filename]
+        program = set(pending)
+        while pending:
+            for callee in callees.get(pending.pop(), ()):
+                if callee not in program and not callee[0].startswith(RUNNER_DIRECTORIES):
+                    program.add(callee)
+                    pending.append(callee)
+        return program
+
+    def report(self, max_functions=MAX_PROFILE_FUNCTIONS):
+        """Return the hot functions and the per-line statistics as a JSON-serializable dict."""
+        stats = pstats.Stats(self._functions).stats
+        functions = []
+        for filename, line, name in self._program_functions(stats):
+            _, calls, total, cumulative, _ = stats[filename, line, name]
+            functions.append(dict(
+                name=name,
+                file=filename,
+                line=line,
+                calls=calls,
+                time=total,
+                cumulative=cumulative,
+            ))
+        functions.sort(key=lambda f: f["cumulative"], reverse=True)
+        lines = [
+            dict(line=line, hits=hits, time=self._lines.times[line])
+            for line, hits in sorted(self._lines.hits.items())
+        ]
+        return dict(time=self.time, functions=functions[:max_functions], lines=lines)
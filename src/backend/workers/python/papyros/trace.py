@@ -0,0 +1,139 @@
+import json
+from array import array
+from bisect import bisect_right
+from sys import intern
+
+# Fewest frames between two keyframes of a TraceStore
+MIN_KEYFRAME_INTERVAL = 16
+# Most frames between two keyframes, so materializing a frame replays at most this many deltas
+MAX_KEYFRAME_INTERVAL = 512
+# Keys of a delta frame that describe how its globals and heap changed
+DELTA_KEYS = ("delta", "globals_set", "globals_del", "heap_set", "heap_del")
+
+
+class TraceStore:
+    """The frames of a debug run, kept in the worker so the frontend can ask for them as needed.
+
+    Frames are stored as the JSON text of the tracer's delta format, next to
+    arrays of their lines, events and functions, whose names are interned.
+    The globals and heap of the latest frame are kept up to date, and copied
+    as a keyframe once enough changed since the previous one: a keyframe
+    costs no more than the deltas it saves replaying. The copies are shallow,
+    so keyframes share the values that did not change.
+    """
+
+    def __init__(self):
+        self._deltas = []
+        self.lines = array("i")
+        self._events = array("I")
+        self._functions = array("I")
+        # Interned names and their index in names
+        self.names = []
+        self._name_ids = {}
+        self._globals = None
+        self._heap = None
+        # Frame indices of the keyframes, and the globals and heap after that frame
+        self._keyframe_indices = []
+        self._keyframes = []
+        # Changes applied since the last keyframe
+        self._changes = 0
+
+    def __len__(self):
+        return len(self._deltas)
+
+    def _name_id(self, name):
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            name_id = self._name_ids[name] = len(self.names)
+            self.names.append(intern(name))
+        return name_id
+
+    def add(self, text):
+        """Record the JSON text of the next frame, as produced by the tracer.
+
+        Return its index and the frame parsed from text, for callers that need it as well.
+        """
+        frame = json.loads(text)
+        index = len(self._deltas)
+        self._deltas.append(text)
+        self.lines.append(frame.get("line", 0))
+        self._events.append(self._name_id(frame.get("event", "")))
+        self._functions.append(self._name_id(frame.get("func_name", "")))
+        if frame.get("delta"):
+            self._changes += _apply(self._globals, self._heap, frame) + 1
+            if self._changes >= max(len(self._globals) + len(self._heap), MIN_KEYFRAME_INTERVAL) or (
+                index - self._keyframe_indices[-1] >= MAX_KEYFRAME_INTERVAL
+            ):
+                self._keep_keyframe(index)
+        elif "globals" in frame:
+            self._globals = {intern(name): value for name, value in frame["globals"].items()}
+            self._heap = {intern(key): value for key, value in frame["heap"].items()}
+            self._keep_keyframe(index)
+        return index, frame
+
+    def _keep_keyframe(self, index):
+        self._keyframe_indices.append(index)
+        self._keyframes.append((dict(self._globals), dict(self._heap)))
+        self._changes = 0
+
+    def summary(self, index):
+        """Return what the frontend needs of a frame to list it without its variables."""
+        return dict(
+            stub=True,
+            line=self.lines[index],
+            event=self.names[self._events[index]],
+            func_name=self.names[self._functions[index]],
+        )
+
+    def _full_frame(self, frame, globals_, heap):
+        frame = {key: value for key, value in frame.items() if key not in DELTA_KEYS}
+        frame["globals"] = globals_
+        frame["heap"] = heap
+        return frame
+
+    def frame(self, index):
+        """Return the JSON text of the frame at index in the full format."""
+        return self.frames(index, index + 1)[1:-1]
+
+    def frames(self, start, end, parsed=False):
+        """Return the JSON text of a list of the frames from start up to end.
+
+        The first frame is in the full format and the others are deltas on
+        top of the frame before them, as the frontend materializes them.
+        With parsed, the list itself is returned instead of its JSON text.
+        """
+        start = max(start, 0)
+        end = min(end, len(self._deltas))
+        if start >= end:
+            return [] if parsed else "[]"
+        if "globals" not in json.loads(self._deltas[start]) and not self._keyframe_indices:
+            # Nothing to apply a delta to, such as the uncaught exception of a program that did not start
+            if parsed:
+                return [json.loads(text) for text in self._deltas[start:end]]
+            return "[" + ",".join(self._deltas[start:end]) + "]"
+        keyframe = bisect_right(self._keyframe_indices, start) - 1
+        globals_, heap = self._keyframes[max(keyframe, 0)]
+        globals_, heap = dict(globals_), dict(heap)
+        for index in range(self._keyframe_indices[max(keyframe, 0)] + 1, start + 1):
+            frame = json.loads(self._deltas[index])
+            if frame.get("delta"):
+                _apply(globals_, heap, frame)
+        first = json.loads(self._deltas[start])
+        if first.get("delta") or "globals" in first:
+            first = self._full_frame(first, globals_, heap)
+        if parsed:
+            return [first, *(json.loads(text) for text in self._deltas[start + 1:end])]
+        return "[" + ",".join([json.dumps(first), *self._deltas[start + 1:end]]) + "]"
+
+
+def _apply(globals_, heap, delta):
+    """Apply the changes of a delta frame to globals_ and heap, return how many there were."""
+    for name in delta["globals_del"]:
+        globals_.pop(name, None)
+    for name, value in delta["globals_set"].items():
+        globals_[intern(name)] = value
+    for key in delta["heap_del"]:
+        heap.pop(key, None)
+    for key, value in delta["heap_set"].items():
+        heap[intern(key)] = value
+    return len(delta["globals_del"]) + len(delta["globals_set"]) + len(delta["heap_del"]) + len(delta["heap_set"])
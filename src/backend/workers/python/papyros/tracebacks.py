@@ -0,0 +1,175 @@
+import linecache
+import os
+import traceback
+from collections import OrderedDict
+
+import friendly_traceback
+import python_runner
+from friendly_traceback.core import FriendlyTraceback
+
+# Number of explanations of friendly_traceback that are kept
+MAX_EXPLANATIONS = 64
+# Number of times a repeated frame is shown, as in the tracebacks of Python
+RECURSIVE_CUTOFF = 3
+# Directories of the code that runs the user's code
+RUNNER_DIRECTORIES = (os.path.dirname(__file__) + os.sep, os.path.dirname(python_runner.__file__) + os.sep)
+
+
+class _Stack(traceback.StackSummary):
+    """StackSummary that only formats the frames it shows.
+
+    StackSummary formats every frame before leaving out those of a
+    recursion after the first RECURSIVE_CUTOFF, which are hundreds for a
+    RecursionError.
+    """
+
+    def format(self, **kwargs):
+        result = []
+        last = None
+        count = 0
+        for frame in self:
+            if (frame.filename, frame.lineno, frame.name) != last:
+                result.extend(self._repeated(count))
+                last = (frame.filename, frame.lineno, frame.name)
+                count = 0
+            count += 1
+            if count <= RECURSIVE_CUTOFF:
+                formatted = self.format_frame_summary(frame, **kwargs)
+                if formatted is not None:
+                    result.append(formatted)
+        result.extend(self._repeated(count))
+        return result
+
+    @staticmethod
+    def _repeated(count):
+        count -= RECURSIVE_CUTOFF
+        if count <= 0:
+            return []
+        return [f"  [Previous line repeated {count} more time{'s' if count > 1 else ''}]\n"]
+
+
+def _user_frames(stack, filename):
+    """Return the indices of the frames in stack that run the user's code."""
+    return [index for index, frame in enumerate(stack) if frame.filename == filename]
+
+
+def _trim(summary, filename):
+    """Leave out the frames of Papyros around the user's code, in the whole chain of exceptions.
+
+    These are the frames that run the user's code and those of Papyros
+    serving it, such as reading input, that the exception was raised in.
+    """
+    while summary is not None:
+        user = _user_frames(summary.stack, filename)
+        if user:
+            end = len(summary.stack)
+            while end - 1 > user[-1] and summary.stack[end - 1].filename.startswith(RUNNER_DIRECTORIES):
+                end -= 1
+            summary.stack = _Stack(summary.stack[user[0]:end])
+        elif getattr(summary, "filename", None) == filename:
+            # A SyntaxError of the user's code is raised by compiling it, the location is all there is
+            summary.stack = _Stack()
+        else:
+            summary.stack = _Stack(summary.stack)
+        summary = summary.__cause__ or (None if summary.__suppress_context__ else summary.__context__)
+
+
+def summarize_traceback(exc, filename):
+    """Return the name, message, location in filename and traceback of exc.
+
+    These only take the traceback object and the lines of the frames in it,
+    so they are there right away, however deep the stack is. The info and
+    why of friendly_traceback are left to TracebackExplainer.
+    """
+    name = type(exc).__name__
+    if isinstance(exc, SyntaxError):
+        message = exc.msg
+    else:
+        try:
+            message = str(exc)
+        except Exception:
+            message = ""
+    # Lines are looked up as frames are formatted, so only for those that are shown
+    summary = traceback.TracebackException.from_exception(exc, lookup_lines=False)
+    _trim(summary, filename)
+    stack = summary.stack
+    user = _user_frames(stack, filename)
+    if user:
+        # From the first line of the user's code to the last, as the lines after it are not theirs
+        where = "".join(_Stack(stack[:user[-1] + 1]).format())
+    elif isinstance(exc, SyntaxError) and exc.filename == filename:
+        # The line that did not compile, with a caret
+        where = "".join(summary.format_exception_only()).rsplit(f"{name}:", 1)[0]
+    else:
+        where = ""
+    return dict(
+        name=name,
+        traceback="".join(summary.format()),
+        where=where.rstrip("\n"),
+        what=f"{name}: {message}\n" if message else f"{name}\n",
+    )
+
+
+class TracebackExplainer:
+    """The exceptions of the last run, explained by friendly_traceback when the frontend asks.
+
+    The analysis of friendly_traceback can take longer than the program
+    itself, for a RecursionError or an exception deep in a library, so it
+    is only done for the exceptions someone looks at. Explanations are
+    kept in a bounded LRU cache by the type of the exception, its message
+    and the line of the user's code it came from, as the same mistake is
+    often made again after changing another part of the program.
+    """
+
+    def __init__(self, max_entries=MAX_EXPLANATIONS):
+        self.max_entries = max_entries
+        # Id -> the exception, the file and source code of the program it came from, and its key
+        self._exceptions = {}
+        self._explanations = OrderedDict()
+
+    def add(self, exc, filename, source_code):
+        """Keep exc until the next clear, return the id to explain it with."""
+        exception_id = len(self._exceptions)
+        self._exceptions[exception_id] = (exc, filename, source_code, self._key(exc, filename))
+        return exception_id
+
+    def clear(self):
+        self._exceptions.clear()
+
+    def _key(self, exc, filename):
+        # The innermost line of the user's code, with its text as the program may have changed since
+        location = None
+        tb = exc.__traceback__
+        while tb is not None:
+            if tb.tb_frame.f_code.co_filename == filename:
+                location = (tb.tb_lineno, linecache.getline(filename, tb.tb_lineno))
+            tb = tb.tb_next
+        if location is None and isinstance(exc, SyntaxError):
+            location = (exc.lineno, exc.offset, exc.text)
+        try:
+            message = str(exc)
+        except Exception:
+            message = ""
+        return type(exc), message, location
+
+    def explain(self, exception_id):
+        """Return the info and why of an exception that was added since the last clear, empty if it was not."""
+        if exception_id not in self._exceptions:
+            return {}
+        exc, filename, source_code, key = self._exceptions[exception_id]
+        explanation = self._explanations.get(key)
+        if explanation is None:
+            # Allow friendly_traceback to inspect the code
+            friendly_traceback.source_cache.cache.add(filename, source_code)
+            fr = FriendlyTraceback(type(exc), exc, exc.__traceback__)
+            fr.assign_generic()
+            fr.assign_cause()
+            why = fr.info.get("cause", "")
+            if why.startswith("No information is known about this exception."):
+                why = ""
+            explanation = self._explanations[key] = dict(info=fr.info.get("generic", ""), why=why)
+            if len(self._explanations) > self.max_entries:
+                self._explanations.popitem(last=False)
+        else:
+            self._explanations.move_to_end(key)
+        return explanation
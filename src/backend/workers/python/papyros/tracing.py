@@ -0,0 +1,117 @@
+import bdb
+import sys
+
+from tracer import JSONTracer
+
+from .monitoring import DEBUGGER_TOOL_ID, CodeMonitor
+
+
+class TracerEvents(CodeMonitor):
+    """Hand the sys.monitoring events of the user's code to a MonitoringTracer.
+
+    Events are translated to the calls bdb makes for the events of
+    sys.settrace, as CPython itself does to implement sys.settrace on top of
+    sys.monitoring. Code that is not the user's is disabled after its first
+    event, so libraries such as turtle run at full speed while tracing.
+    """
+
+    tool_id = DEBUGGER_TOOL_ID
+
+    def __init__(self, tracer):
+        super().__init__(filename=None)
+        self.tracer = tracer
+        # Code object -> offset of every instruction -> its line
+        self._lines = {}
+
+    def _callbacks(self):
+        events = self._monitoring.events
+        return {
+            events.PY_START: self._on_call,
+            events.PY_RESUME: self._on_call,
+            events.PY_THROW: self._on_throw,
+            events.LINE: self._on_line,
+            events.JUMP: self._on_jump,
+            events.PY_RETURN: self._on_return,
+            events.PY_YIELD: self._on_return,
+            events.PY_UNWIND: self._on_unwind,
+            events.RAISE: self._on_raise,
+        }
+
+    def _is_user_code(self, code):
+        return code in self.tracer.user_code_objects
+
+    def _call(self, frame):
+        if self.tracer.stop_here(frame):
+            self.tracer.user_call(frame, None)
+
+    def _on_call(self, code, offset):
+        if not self._is_user_code(code):
+            return self._monitoring.DISABLE
+        self._call(sys._getframe(1))
+
+    def _on_throw(self, code, offset, exception):
+        # Can not be disabled, like the other events that are not tied to a location
+        if self._is_user_code(code):
+            self._call(sys._getframe(1))
+
+    def _on_line(self, code, line_number):
+        if not self._is_user_code(code):
+            return self._monitoring.DISABLE
+        self.tracer.user_line(sys._getframe(1))
+
+    def _line_of(self, code, offset):
+        lines = self._lines.get(code)
+        if lines is None:
+            lines = self._lines[code] = {
+                instruction: line for start, end, line in code.co_lines() for instruction in range(start, end, 2)
+            }
+        return lines.get(offset)
+
+    def _on_jump(self, code, offset, destination):
+        # A jump back to the start of the same line, as in a one-line loop,
+        # is a line event for sys.settrace. Other jumps are covered by LINE.
+        if (not self._is_user_code(code) or destination > offset
+                or self._line_of(code, offset) != self._line_of(code, destination)):
+            return self._monitoring.DISABLE
+        self.tracer.user_line(sys._getframe(1))
+
+    def _on_return(self, code, offset, value):
+        if not self._is_user_code(code):
+            return self._monitoring.DISABLE
+        self.tracer.user_return(sys._getframe(1), value)
+
+    def _on_unwind(self, code, offset, exception):
+        if self._is_user_code(code):
+            self.tracer.user_return(sys._getframe(1), None)
+
+    def _on_raise(self, code, offset, exception):
+        if self._is_user_code(code):
+            self.tracer.user_exception(sys._getframe(1), (type(exception), exception, exception.__traceback__))
+
+
+class MonitoringTracer(JSONTracer):
+    """JSONTracer that is driven by sys.monitoring (PEP 669) instead of sys.settrace.
+
+    sys.settrace calls the tracer for every line of every function, including
+    those of libraries that it then leaves out of the trace. sys.monitoring
+    lets it turn off the events of such code, so only the user's code pays
+    for being traced. The frames are the same as those of JSONTracer.
+    Without sys.monitoring (Python < 3.12), or while another debugger uses
+    it, the program is traced with sys.settrace after all.
+    """
+
+    def run(self, cmd, globals=None, locals=None):
+        events = TracerEvents(self)
+        with events:
+            if not events.active:
+                return super().run(cmd, globals, locals)
+            self.reset()
+            # The frames of the program are below this one, as those of bdb are
+            # below its first call event
+            self.botframe = sys._getframe()
+            try:
+                exec(cmd, globals, locals)
+            except bdb.BdbQuit:
+                pass
+            finally:
+                self.quitting = True
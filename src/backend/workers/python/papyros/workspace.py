@@ -0,0 +1,456 @@
+import codecs
+import hashlib
+import os
+import sys
+from collections import OrderedDict
+from stat import S_ISREG
+# Bound before a VirtualClock can replace it, as the mtimes of files are not virtual
+from time import time_ns
+
+# Files larger than this are streamed to the frontend in chunks of this size
+CHUNK_SIZE = 1024 * 1024
+# Upper bound on the payloads kept in a FileCache, in characters or bytes
+MAX_CACHE_SIZE = 32 * 1024 * 1024
+# A file modified this recently can change again without its mtime changing
+RACY_WINDOW_NS = 1_000_000_000
+
+
+class FileCache:
+    """Remembers the digest and payload of files, so unchanged files are never read again.
+
+    Entries are keyed on the path and only valid for the st_size and
+    st_mtime_ns they were read with. The least recently used entries are
+    evicted once their payloads take up more than max_size.
+
+    Like git's "racily clean" index entries, a file that was modified within
+    RACY_WINDOW_NS of being read is not cached: a second write in the same
+    clock tick with the same size would otherwise go unnoticed.
+    """
+
+    def __init__(self, max_size=MAX_CACHE_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        # Key:   absolute path
+        # Value: (st_size, st_mtime_ns, digest, entry)
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def _entry_size(entry):
+        # A streamed file keeps no payload
+        return len(entry.get("content", ""))
+
+    def get(self, path, stat):
+        """Return the (digest, entry) of path if it has not changed since it was cached."""
+        cached = self._entries.get(path)
+        if cached is None:
+            return None
+        size, mtime_ns, digest, entry = cached
+        if size != stat.st_size or mtime_ns != stat.st_mtime_ns:
+            self.discard(path)
+            return None
+        self._entries.move_to_end(path)
+        return digest, entry
+
+    def put(self, path, stat, digest, entry):
+        self.discard(path)
+        entry_size = self._entry_size(entry)
+        if entry_size > self.max_size or time_ns() - stat.st_mtime_ns < RACY_WINDOW_NS:
+            return
+        self._entries[path] = (stat.st_size, stat.st_mtime_ns, digest, entry)
+        self.size += entry_size
+        while self.size > self.max_size:
+            _, (_, _, _, evicted) = self._entries.popitem(last=False)
+            self.size -= self._entry_size(evicted)
+
+    def discard(self, path):
+        cached = self._entries.pop(path, None)
+        if cached is not None:
+            self.size -= self._entry_size(cached[3])
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+
+class WorkspaceFiles:
+    """Keeps track of what the frontend knows about the workspace.
+
+    Every file is fingerprinted by its size, modification time and a digest of
+    its content. A snapshot compares the workspace against the fingerprints of
+    the files the frontend received last, so only the paths that were added,
+    modified or removed since then have to be sent. Only when the frontend
+    asks for a resync is the next snapshot a full listing.
+    """
+
+    def __init__(self, root, cache=None):
+        self.root = root
+        self.cache = cache if cache is not None else FileCache()
+        # Key:   path relative to the root
+        # Value: (st_size, st_mtime_ns, digest) as last sent to the frontend
+        self.fingerprints = {}
+        # The workspace starts out empty, like the files of the frontend
+        self.needs_resync = False
+        # Number of files the last snapshot looked at
+        self.scanned = 0
+
+    def request_resync(self):
+        """Make the next snapshot list the whole workspace."""
+        self.needs_resync = True
+
+    def acknowledge(self, keys):
+        """Take the files at keys as the frontend knows them, without sending them."""
+        if not self.needs_resync:
+            self.snapshot((keys, []))
+
+    def _read(self, path, stat):
+        """Return the (fingerprint, entry) of the file at path, reading it only if it changed.
+
+        The entry of a text file holds its content as str, that of a binary file
+        as bytes. A file larger than CHUNK_SIZE is only digested here, its entry
+        is marked as chunked and iter_chunks() reads its content.
+        """
+        cached = self.cache.get(path, stat)
+        if cached is not None:
+            digest, entry = cached
+            return (stat.st_size, stat.st_mtime_ns, digest), entry
+        if stat.st_size > CHUNK_SIZE:
+            digest, binary = self._digest_chunks(path)
+            entry = {"binary": binary, "chunked": True}
+        else:
+            with open(path, "rb") as f:
+                data = f.read()
+            digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+            try:
+                # Same newline translation as reading the file in text mode
+                content = data.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+                entry = {"content": content, "binary": False}
+            except UnicodeDecodeError:
+                entry = {"content": data, "binary": True}
+        self.cache.put(path, stat, digest, entry)
+        return (stat.st_size, stat.st_mtime_ns, digest), entry
+
+    @staticmethod
+    def _digest_chunks(path):
+        """Digest a large file one chunk at a time: (digest, whether it is binary)"""
+        digest = hashlib.blake2b(digest_size=16)
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        binary = False
+        with open(path, "rb") as f:
+            while chunk := f.read(CHUNK_SIZE):
+                digest.update(chunk)
+                if not binary:
+                    try:
+                        decoder.decode(chunk)
+                    except UnicodeDecodeError:
+                        binary = True
+        if not binary:
+            try:
+                decoder.decode(b"", final=True)
+            except UnicodeDecodeError:
+                binary = True
+        return digest.hexdigest(), binary
+
+    def iter_chunks(self, key):
+        """Yield (offset, bytes) for every chunk of the file at key."""
+        with open(os.path.join(self.root, key), "rb") as f:
+            offset = 0
+            while chunk := f.read(CHUNK_SIZE):
+                yield offset, chunk
+                offset += len(chunk)
+
+    def _fingerprint_file(self, key):
+        """Return the (fingerprint, entry) of the file at key, or None if it is no regular file."""
+        path = os.path.join(self.root, key)
+        stat = os.stat(path)
+        if not S_ISREG(stat.st_mode):
+            return None
+        return self._read(path, stat)
+
+    def scan(self, directory=""):
+        """Fingerprint every file under a directory of the workspace: {key: (fingerprint, entry)}"""
+        found = {}
+        for dirpath, dirnames, filenames in os.walk(os.path.join(self.root, directory)):
+            for filename in filenames:
+                key = os.path.relpath(os.path.join(dirpath, filename), self.root)
+                try:
+                    result = self._fingerprint_file(key)
+                except Exception:
+                    continue
+                if result is not None:
+                    found[key] = result
+        return found
+
+    def _scan_changed(self, paths, trees):
+        """Fingerprint only the given paths and directories.
+
+        Return the files found there and every key the frontend knows of that
+        they could have removed.
+        """
+        found = {}
+        candidates = set(paths) | set(trees)
+        for key in candidates:
+            try:
+                result = self._fingerprint_file(key)
+            except Exception:
+                continue
+            if result is not None:
+                found[key] = result
+        for tree in trees:
+            found.update(self.scan(tree))
+            prefix = tree + os.sep if tree else ""
+            candidates.update(key for key in self.fingerprints if key.startswith(prefix))
+        return found, candidates
+
+    def snapshot(self, changed=None):
+        """Return the changes since the previous snapshot, or None if there are none.
+
+        Without changed the whole workspace is scanned. Otherwise changed is a
+        (paths, trees) pair of keys, as collected by a FileJournal, and nothing
+        outside of them is looked at.
+
+        A full snapshot is {"full": True, "files": {path: entry}}, a delta is
+        {"full": False, "added": {path: entry}, "modified": {path: entry}, "removed": [path]}.
+        Only chunked files that were added or whose digest changed have to be
+        streamed: in a full snapshot, the others are marked as unchanged.
+        """
+        previous = self.fingerprints
+        if self.needs_resync or changed is None:
+            found = self.scan()
+            candidates = previous.keys()
+            self.fingerprints = {key: fingerprint for key, (fingerprint, _) in found.items()}
+        else:
+            found, candidates = self._scan_changed(*changed)
+            self.fingerprints = {**previous, **{key: fingerprint for key, (fingerprint, _) in found.items()}}
+        self.scanned = len(found)
+        if self.needs_resync:
+            self.needs_resync = False
+            files = {}
+            for key, (fingerprint, entry) in sorted(found.items()):
+                if entry.get("chunked") and key in previous and previous[key][2] == fingerprint[2]:
+                    # The frontend keeps its copy of a large file that did not change
+                    entry = {**entry, "unchanged": True}
+                files[key] = entry
+            return {"full": True, "files": files}
+
+        added = {}
+        modified = {}
+        for key, (fingerprint, entry) in found.items():
+            if key not in previous:
+                added[key] = entry
+            elif previous[key][2] != fingerprint[2]:
+                # Only the digest decides: touching a file without changing it is no change
+                modified[key] = entry
+        removed = sorted(key for key in candidates if key in previous and key not in found)
+        for key in removed:
+            del self.fingerprints[key]
+        if not added and not modified and not removed:
+            return None
+        return {"full": False, "added": added, "modified": modified, "removed": removed}
+
+
+class WorkspaceCheckpoints:
+    """In-memory copies of the workspace, to restore it to later.
+
+    Contents are stored once per digest and shared between checkpoints, so a
+    checkpoint only takes memory for the files no other checkpoint holds.
+    Restoring only rewrites the files whose digest differs from the checkpoint.
+    """
+
+    def __init__(self, files):
+        self.files = files
+        # Key:   digest
+        # Value: the content with that digest
+        self._blobs = {}
+        # Key:   checkpoint id
+        # Value: {key: digest} of every file in the workspace
+        self._checkpoints = {}
+        self._next_id = 1
+
+    def create(self):
+        """Capture the workspace and return the id of the checkpoint."""
+        listing = {}
+        for key, (fingerprint, _) in self.files.scan().items():
+            digest = fingerprint[2]
+            if digest not in self._blobs:
+                with open(os.path.join(self.files.root, key), "rb") as f:
+                    data = f.read()
+                # Digest what was read, in case the file changed since it was scanned
+                digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+                self._blobs[digest] = data
+            listing[key] = digest
+        checkpoint_id = self._next_id
+        self._next_id += 1
+        self._checkpoints[checkpoint_id] = listing
+        return checkpoint_id
+
+    def _listing(self, checkpoint_id):
+        try:
+            return self._checkpoints[checkpoint_id]
+        except KeyError:
+            raise ValueError(f"Unknown checkpoint: {checkpoint_id}") from None
+
+    def restore(self, checkpoint_id):
+        """Make the workspace equal to a checkpoint again.
+
+        Return the paths of the files that were written or removed for it.
+        """
+        listing = self._listing(checkpoint_id)
+        current = self.files.scan()
+        changed = []
+        for key in current:
+            if key not in listing:
+                path = os.path.join(self.files.root, key)
+                os.remove(path)
+                changed.append(path)
+        for key, digest in listing.items():
+            if key in current and current[key][0][2] == digest:
+                continue
+            path = os.path.join(self.files.root, key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(self._blobs[digest])
+            changed.append(path)
+        return changed
+
+    def discard(self, checkpoint_id):
+        """Forget a checkpoint, and the contents only it held."""
+        self._listing(checkpoint_id)
+        del self._checkpoints[checkpoint_id]
+        referenced = {digest for listing in self._checkpoints.values() for digest in listing.values()}
+        self._blobs = {digest: data for digest, data in self._blobs.items() if digest in referenced}
+
+
+# Flags of os.open() that can change a file
+WRITE_FLAGS = os.O_WRONLY | os.O_RDWR | os.O_APPEND | os.O_CREAT | os.O_TRUNC
+# The dir_fd in the audit events of os functions that were given none
+NO_DIR_FD = -1
+
+
+class FileJournal:
+    """Records which workspace paths may have changed, from audit events (PEP 578).
+
+    An audit hook sees every way of changing a file: builtins.open and io.open,
+    but also os.open, pathlib, os.rename, os.remove and the shutil functions,
+    none of which go through builtins.open. Only events while recording is set
+    and on paths inside the workspace are kept.
+
+    Paths that were opened for writing stay in the journal until the next call
+    to begin(), since they can keep changing through a handle that is still
+    open. Everything else is forgotten once it was collected.
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.recording = False
+        # keys opened for writing since begin()
+        self.written = set()
+        # keys and directory keys that changed since the last collect()
+        self.paths = set()
+        self.trees = set()
+        # whether a file was opened for writing since the last call to take_opened()
+        self._opened = False
+        self._handlers = {
+            "open": self._on_open,
+            "os.truncate": lambda args: self.mark(args[0]),
+            "os.remove": lambda args: self.mark(args[0], dir_fd=args[1]),
+            "os.link": lambda args: self.mark(args[1], dir_fd=args[3]),
+            "os.symlink": lambda args: self.mark(args[1], dir_fd=args[2]),
+            "os.rename": lambda args: self.mark_tree(args[0], args[1], dir_fd=max(args[2], args[3])),
+            "os.rmdir": lambda args: self.mark_tree(args[0], dir_fd=args[1]),
+            "os.mkdir": lambda args: self.mark_tree(args[0], dir_fd=args[2]),
+            "shutil.copyfile": lambda args: self.mark(args[1]),
+            "shutil.copytree": lambda args: self.mark_tree(args[1]),
+            "shutil.move": lambda args: self.mark_tree(args[0], args[1]),
+            "shutil.rmtree": lambda args: self.mark_tree(args[0]),
+            "shutil.unpack_archive": lambda args: self.mark_tree(args[1] or os.getcwd()),
+            "shutil.make_archive": lambda args: self.mark_tree(os.path.dirname(os.path.abspath(args[0]))),
+        }
+
+    def install(self):
+        # Audit hooks cannot be removed again, so install one per journal
+        sys.addaudithook(self._audit)
+
+    def _audit(self, event, args):
+        if not self.recording:
+            return
+        handler = self._handlers.get(event)
+        if handler is not None:
+            try:
+                handler(args)
+            except Exception:
+                # An exception here would abort the operation of the user
+                pass
+
+    def _on_open(self, args):
+        path, mode, flags = args
+        if mode is None:
+            # os.open() passes its flags instead of a mode
+            writing = bool(flags & WRITE_FLAGS)
+        else:
+            writing = any(c in mode for c in "wax+")
+        if writing:
+            key = self._key(path)
+            if key is not None:
+                self.written.add(key)
+                self.paths.add(key)
+                self._opened = True
+
+    def _key(self, path):
+        """Return path relative to the workspace, or None if it is not in there."""
+        if path is None or isinstance(path, int):
+            # A file descriptor, its path was recorded when it was opened
+            return None
+        path = os.path.abspath(os.fsdecode(path))
+        if path == self.root:
+            return ""
+        if not path.startswith(self.root + os.sep):
+            return None
+        return path[len(self.root) + 1:]
+
+    def mark(self, *paths, dir_fd=None):
+        if dir_fd not in (None, NO_DIR_FD):
+            # Relative to a directory descriptor, as used by shutil.rmtree,
+            # whose own event already covers these paths
+            return
+        for path in paths:
+            key = self._key(path)
+            if key is not None:
+                self.paths.add(key)
+
+    def mark_tree(self, *paths, dir_fd=None):
+        if dir_fd not in (None, NO_DIR_FD):
+            return
+        for path in paths:
+            key = self._key(path)
+            if key is not None:
+                self.trees.add(key)
+
+    def begin(self):
+        """Start a new run: forget the files it had opened for writing."""
+        self.written.clear()
+        self.paths.clear()
+        self.trees.clear()
+        self._opened = False
+
+    @property
+    def has_changes(self):
+        return bool(self.written or self.paths or self.trees)
+
+    @property
+    def has_new_changes(self):
+        """Whether a path changed since the last collect(), not counting writes through files opened before."""
+        return bool(self.paths or self.trees)
+
+    def take_opened(self):
+        """Return whether a file was opened for writing since the previous call."""
+        opened = self._opened
+        self._opened = False
+        return opened
+
+    def collect(self):
+        """Return the (paths, trees) that may have changed, and forget them."""
+        paths = self.paths | self.written
+        trees = self.trees
+        self.paths = set()
+        self.trees = set()
+        return paths, trees
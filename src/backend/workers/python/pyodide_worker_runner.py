@@ -1,6 +1,7 @@
 # Vendored from pyodide-worker-runner (https://github.com/alexmojaki/pyodide-worker-runner).
 # Copyright (c) 2022 Alex Hall. MIT licensed, see THIRD-PARTY-NOTICES.md.
 import importlib
+import importlib.util
 import sys
 from typing import Callable, Literal, Union, TypedDict
 
@@ -19,6 +20,45 @@ class InstallEntry(TypedDict):
     package: str
 
 
+# Import set -> the packages that were missing to import it.
+# Every install can change the answer, so installing clears all plans.
+_install_plans: dict[frozenset[str], list["InstallEntry"]] = {}
+MAX_INSTALL_PLANS = 128
+# Top-level modules known to be importable, cleared when installing
+_importable: set[str] = set()
+# The import set of the last install and the packages that failed to install for it.
+# Those are not tried again until the imports change, which forgets them.
+_failed_installs: tuple[frozenset[str], dict[str, Exception]] = (frozenset(), {})
+_to_package_name: dict[str, str] | None = None
+
+
+def _import_name_to_package_name() -> dict[str, str]:
+    global _to_package_name
+    if _to_package_name is None:
+        try:
+            _to_package_name = pyodide_js._module._import_name_to_package_name.to_py()
+        except AttributeError:
+            _to_package_name = pyodide_js._api._import_name_to_package_name.to_py()
+    return _to_package_name
+
+
+def is_importable(module: str) -> bool:
+    """
+    Whether the top-level package of module can be imported,
+    found without executing any of its code.
+    """
+    top_level = module.partition(".")[0]
+    if top_level in _importable or top_level in sys.modules:
+        return True
+    try:
+        found = importlib.util.find_spec(top_level) is not None
+    except (ImportError, ValueError):
+        found = False
+    if found:
+        _importable.add(top_level)
+    return found
+
+
 def find_imports_to_install(imports: list[str]) -> list[InstallEntry]:
     """
     Given a list of module names being imported, return a list of dicts
@@ -28,16 +68,11 @@ def find_imports_to_install(imports: list[str]) -> list[InstallEntry]:
       - module: the name of the module being imported
       - package: the name of the package that needs to be installed
     """
-    try:
-        to_package_name = pyodide_js._module._import_name_to_package_name.to_py()
-    except AttributeError:
-        to_package_name = pyodide_js._api._import_name_to_package_name.to_py()
+    to_package_name = _import_name_to_package_name()
 
     to_install: list[InstallEntry] = []
     for module in imports:
-        try:
-            importlib.import_module(module)
-        except ModuleNotFoundError:
+        if not is_importable(module):
             to_install.append(
                 dict(
                     module=module,
@@ -88,9 +123,23 @@ async def install_imports(
     else:
         imports: list[str] = source_code_or_imports
 
-    to_install = find_imports_to_install(imports)
-    if to_install:
-        message_callback("loading_all", to_install)
+    global _failed_installs
+    key = frozenset(imports)
+    if key in _install_plans:
+        # A missing module can have appeared since, e.g. as a file in the workspace
+        _install_plans[key] = [entry for entry in _install_plans[key] if not is_importable(entry["module"])]
+    else:
+        if len(_install_plans) >= MAX_INSTALL_PLANS:
+            _install_plans.clear()
+        _install_plans[key] = find_imports_to_install(imports)
+    to_install = _install_plans[key]
+    failed_before = _failed_installs[1] if _failed_installs[0] == key else {}
+    packages = list(dict.fromkeys(entry["package"] for entry in to_install))
+    failed = {package: failed_before[package] for package in packages if package in failed_before}
+    to_try = [package for package in packages if package not in failed]
+    if to_try:
+        entries = [entry for entry in to_install if entry["package"] in to_try]
+        message_callback("loading_all", entries)
         try:
             import micropip  # noqa
         except ModuleNotFoundError:
@@ -101,8 +150,34 @@ async def install_imports(
 
             message_callback("loaded_micropip", micropip_entry)
 
-        for entry in to_install:
+        for entry in entries:
             message_callback("loading_one", entry)
-            await micropip.install(entry["package"])
+        try:
+            # A single call resolves all packages together and downloads them concurrently
+            await micropip.install(to_try)
+        except Exception as e:
+            if len(to_try) == 1:
+                failed[to_try[0]] = e
+            else:
+                # The call installs nothing if one package can not be found,
+                # so find out which one that is and install the others
+                for package in to_try:
+                    try:
+                        await micropip.install(package)
+                    except Exception as e:
+                        failed[package] = e
+        finally:
+            if len(failed) < len(packages):
+                # Installing a package can make other modules importable
+                importlib.invalidate_caches()
+                _importable.clear()
+                _install_plans.clear()
+        installed = [entry for entry in entries if entry["package"] not in failed]
+        for entry in installed:
             message_callback("loaded_one", entry)
-        message_callback("loaded_all", to_install)
+        if not failed:
+            _install_plans[key] = []
+            message_callback("loaded_all", entries)
+    _failed_installs = (key, failed)
+    if failed:
+        raise next(iter(failed.values()))
@@ -11,10 +11,16 @@ export enum BackendEventType {
     Interrupt = "interrupt",
     Loading = "loading",
     Frame = "frame",
+    Frames = "frames",
     FrameChange = "frame-change",
     Stop = "stop",
     Files = "files",
     Turtle = "turtle",
+    BatchCase = "batch-case",
+    BufferedInput = "buffered-input",
+    OutputTruncated = "output-truncated",
+    Profile = "profile",
+    Metrics = "metrics",
 }
 
 /**
@@ -34,3 +40,23 @@ export interface BackendEvent {
      */
     contentType?: string;
 }
+
+/**
+ * Data of a Frames event: debug frames sent together, each with the file
+ * changes and turtle patch that preceded it, keyed by its index in frames
+ */
+export interface FrameBatch {
+    /**
+     * The data of the Frame events in the batch, or all of them in the binary
+     * encoding of FrameCodec
+     */
+    frames: string[] | Uint8Array;
+    /**
+     * The data of the Files events in the batch
+     */
+    files: Array<[number, any]>;
+    /**
+     * The data of the Turtle events in the batch
+     */
+    turtle: Array<[number, string]>;
+}
@@ -119,11 +119,4 @@ export class BackendEventQueue {
         this.queue = [];
         this.lastFlushTime = new Date().getTime();
     }
-
-    /**
-     * @param {Function} callback The event-consuming callback
-     */
-    public setCallback(callback: (e: BackendEvent) => void): void {
-        this.callback = callback;
-    }
 }
@@ -1,6 +1,7 @@
 import { Backend } from "../backend/Backend";
 import { ProgrammingLanguage } from "../ProgrammingLanguage";
-import { BackendEvent, BackendEventType } from "./BackendEvent";
+import { BackendEvent, BackendEventType, FrameBatch } from "./BackendEvent";
+import { decodeFrames } from "./FrameCodec";
 import { Channel } from "../sync/channel";
 import { SyncClient } from "../sync/SyncClient";
 /**
@@ -164,6 +165,11 @@ export abstract class BackendManager {
      * @param {BackendEvent} e The event to publish
      */
     public static publish(e: BackendEvent): void {
+        if (e.type === BackendEventType.Frames) {
+            // Subscribers see the events the batch stands for, in their original order
+            BackendManager.unbatchFrames(e.data).forEach((event) => BackendManager.publish(event));
+            return;
+        }
         if (e.type === BackendEventType.Start) {
             BackendManager.halted = false;
         }
@@ -175,6 +181,32 @@ export abstract class BackendManager {
         }
     }
 
+    /**
+     * @param {FrameBatch} batch The data of a Frames event
+     * @return {BackendEvent[]} The Files, Turtle and Frame events it holds, binary
+     * frames are decoded into the data of their Frame event
+     */
+    private static unbatchFrames(batch: FrameBatch): BackendEvent[] {
+        const files = new Map(batch.files);
+        const turtle = new Map(batch.turtle);
+        const frames: unknown[] = batch.frames instanceof Uint8Array ? decodeFrames(batch.frames) : batch.frames;
+        return frames.flatMap((frame, index) => {
+            const events: BackendEvent[] = [];
+            if (files.has(index)) {
+                events.push({ type: BackendEventType.Files, data: files.get(index), contentType: "application/json" });
+            }
+            if (turtle.has(index)) {
+                events.push({ type: BackendEventType.Turtle, data: turtle.get(index), contentType: "text/json" });
+            }
+            events.push({
+                type: BackendEventType.Frame,
+                data: frame,
+                contentType: typeof frame === "string" ? "application/json" : undefined,
+            });
+            return events;
+        });
+    }
+
     private static halt(): void {
         BackendManager.halted = true;
     }
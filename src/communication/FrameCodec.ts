@@ -0,0 +1,160 @@
+/**
+ * MessagePack extension type of a reference to a string in the table of a buffer
+ */
+const STRING_REF = 0;
+
+/**
+ * Reads the binary encoding of debug frames written by papyros/frame_codec.py:
+ * a subset of MessagePack, with repeated strings stored once in a table in
+ * front of the frames and referred to by their index in it
+ */
+class FrameDecoder {
+    private view: DataView;
+    private bytes: Uint8Array;
+    private offset: number;
+    private table: string[];
+    private static textDecoder = new TextDecoder();
+
+    /**
+     * @param {Uint8Array} bytes The encoded frames
+     */
+    constructor(bytes: Uint8Array) {
+        this.bytes = bytes;
+        this.view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+        this.offset = 0;
+        this.table = [];
+    }
+
+    /**
+     * @return {unknown[]} The frames in the buffer
+     */
+    public decode(): unknown[] {
+        // An array of the table and the frames, the table is read first so the frames can refer to it
+        if (this.uint(1) !== 0x92) {
+            throw new Error("Encoded frames must start with their string table");
+        }
+        this.table = this.read() as string[];
+        return this.read() as unknown[];
+    }
+
+    private next(size: number): number {
+        const offset = this.offset;
+        this.offset += size;
+        if (this.offset > this.bytes.byteLength) {
+            throw new Error("Unexpected end of encoded frames");
+        }
+        return offset;
+    }
+
+    private uint(size: 1 | 2 | 4): number {
+        const offset = this.next(size);
+        if (size === 1) {
+            return this.view.getUint8(offset);
+        }
+        return size === 2 ? this.view.getUint16(offset) : this.view.getUint32(offset);
+    }
+
+    private string(size: number): string {
+        const offset = this.next(size);
+        return FrameDecoder.textDecoder.decode(this.bytes.subarray(offset, offset + size));
+    }
+
+    private array(size: number): unknown[] {
+        const array = new Array(size);
+        for (let i = 0; i < size; i++) {
+            array[i] = this.read();
+        }
+        return array;
+    }
+
+    private map(size: number): Record<string, unknown> {
+        const map: Record<string, unknown> = {};
+        for (let i = 0; i < size; i++) {
+            const key = this.read() as string;
+            map[key] = this.read();
+        }
+        return map;
+    }
+
+    private reference(size: 1 | 2 | 4): string {
+        if (this.view.getInt8(this.next(1)) !== STRING_REF) {
+            throw new Error("Unknown extension in encoded frames");
+        }
+        const string = this.table[this.uint(size)];
+        if (string === undefined) {
+            throw new Error("Reference to a missing string in encoded frames");
+        }
+        return string;
+    }
+
+    private read(): unknown {
+        const type = this.uint(1);
+        if (type < 0x80) {
+            return type;
+        } else if (type >= 0xe0) {
+            return type - 0x100;
+        } else if (type < 0x90) {
+            return this.map(type & 0x0f);
+        } else if (type < 0xa0) {
+            return this.array(type & 0x0f);
+        } else if (type < 0xc0) {
+            return this.string(type & 0x1f);
+        }
+        switch (type) {
+            case 0xc0:
+                return null;
+            case 0xc2:
+                return false;
+            case 0xc3:
+                return true;
+            case 0xcb:
+                return this.view.getFloat64(this.next(8));
+            case 0xcc:
+                return this.uint(1);
+            case 0xcd:
+                return this.uint(2);
+            case 0xce:
+                return this.uint(4);
+            case 0xcf:
+                return Number(this.view.getBigUint64(this.next(8)));
+            case 0xd0:
+                return this.view.getInt8(this.next(1));
+            case 0xd1:
+                return this.view.getInt16(this.next(2));
+            case 0xd2:
+                return this.view.getInt32(this.next(4));
+            case 0xd3:
+                return Number(this.view.getBigInt64(this.next(8)));
+            case 0xd4:
+                return this.reference(1);
+            case 0xd5:
+                return this.reference(2);
+            case 0xd6:
+                return this.reference(4);
+            case 0xd9:
+                return this.string(this.uint(1));
+            case 0xda:
+                return this.string(this.uint(2));
+            case 0xdb:
+                return this.string(this.uint(4));
+            case 0xdc:
+                return this.array(this.uint(2));
+            case 0xdd:
+                return this.array(this.uint(4));
+            case 0xde:
+                return this.map(this.uint(2));
+            case 0xdf:
+                return this.map(this.uint(4));
+            default:
+                throw new Error(`Unknown type 0x${type.toString(16)} in encoded frames`);
+        }
+    }
+}
+
+/**
+ * @param {string | Uint8Array} data A list of debug frames, as JSON text or in the binary encoding
+ * @return {unknown[]} The parsed frames
+ */
+export function decodeFrames(data: string | Uint8Array): unknown[] {
+    return typeof data === "string" ? JSON.parse(data) : new FrameDecoder(data).decode();
+}
@@ -3,7 +3,7 @@ import { PapyrosElement } from "./PapyrosElement";
 import { css, CSSResult, html, PropertyValues, TemplateResult } from "lit";
 import { createRef, ref, Ref } from "lit/directives/ref.js";
 import { CODE_TAB } from "../state/InputOutput";
-import { arrayBufferToBase64, isTextMimeType } from "../../util/Util";
+import { isTextMimeType } from "../../util/Util";
 import "./code_runner/Code";
 import "./code_runner/RunState";
 import "./code_runner/ButtonLint";
@@ -141,7 +141,7 @@ export class CodeRunner extends PapyrosElement {
             reader.readAsText(file);
         } else {
             reader.onload = (): void => {
-                this.papyros.runner.upsertFile(file.name, arrayBufferToBase64(reader.result as ArrayBuffer), true);
+                this.papyros.runner.upsertFile(file.name, new Uint8Array(reader.result as ArrayBuffer), true);
             };
             reader.readAsArrayBuffer(file);
         }
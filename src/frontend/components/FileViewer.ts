@@ -61,8 +61,7 @@ export class FileViewer extends PapyrosElement {
 
     private downloadBinary(): void {
         if (!this.file) return;
-        const bytes = Uint8Array.from(atob(this.file.content), (c) => c.charCodeAt(0));
-        const blob = new Blob([bytes]);
+        const blob = new Blob([this.file.content as BlobPart]);
         const url = URL.createObjectURL(blob);
         const a = document.createElement("a");
         a.href = url;
@@ -101,7 +100,7 @@ export class FileViewer extends PapyrosElement {
         return html`
             <p-file-editor
                 ${ref(this.editorRef)}
-                .value=${this.file.content}
+                .value=${this.file.content as string}
                 .readonly=${readonly}
                 .theme=${this.papyros.constants.CodeMirrorTheme}
                 @change=${this.onEditorChange}
@@ -92,6 +92,28 @@ export class Output extends PapyrosElement {
     /** Replays the turtle patches; kept across renders so following a run stays incremental. */
     private turtleSvg = new TurtleSvgBuilder();
 
+    /** Object URLs of the images sent as raw bytes, revoked once their output is gone. */
+    private imageUrls = new Map<Uint8Array, string>();
+
+    private imageUrl(image: Uint8Array, mimeType: string): string {
+        let url = this.imageUrls.get(image);
+        if (url === undefined) {
+            url = URL.createObjectURL(new Blob([image as BlobPart], { type: mimeType }));
+            this.imageUrls.set(image, url);
+        }
+        return url;
+    }
+
+    private releaseImageUrls(): void {
+        const contents = new Set(this.papyros.io.output.map((o) => o.content));
+        this.imageUrls.forEach((url, image) => {
+            if (!contents.has(image)) {
+                URL.revokeObjectURL(url);
+                this.imageUrls.delete(image);
+            }
+        });
+    }
+
     private get maxOutputLength(): number {
         if (this.papyros.debugger.active && this.papyros.debugger.debugOutputs !== undefined) {
             return this.papyros.debugger.debugOutputs;
@@ -159,12 +181,16 @@ export class Output extends PapyrosElement {
                 ? []
                 : [html`<img class="turtle" src="data:image/svg+xml,${encodeURIComponent(svg)}"></img>`];
         }
+        this.releaseImageUrls();
         const outputsToRender: OutputEntry[] = this.outputs.filter((o) => o.type !== OutputType.turtle);
         return outputsToRender.map((o) => {
             if (o.type === OutputType.stdout) {
                 return html`${o.content}`;
             } else if (o.type === OutputType.img) {
                 const mimeType = o.contentType ?? "image/png";
+                if (o.content instanceof Uint8Array) {
+                    return html`<img src="${this.imageUrl(o.content, mimeType)}"></img>`;
+                }
                 return html`<img src="data:${mimeType},${o.content as string}"></img>`;
             } else if (o.type === OutputType.stderr) {
                 if (typeof o.content === "string") {
@@ -173,7 +199,12 @@ export class Output extends PapyrosElement {
                     const errorObject = o.content as FriendlyError;
                     const errorHTML = [
                         // an array to avoid unintentional spaces/newlines
-                        html`<md-icon title="${errorObject.info}">${this.papyros.constants.icons.help}</md-icon
+                        // the info and why are only asked for once the user looks at the info
+                        html`<md-icon
+                                title="${errorObject.info}"
+                                @mouseenter=${() => void this.papyros.io.explainError(errorObject)}
+                                @click=${() => void this.papyros.io.explainError(errorObject)}
+                                >${this.papyros.constants.icons.help}</md-icon
                             >${errorObject.name} traceback:`,
                         "\n",
                         html`<md-icon title="${errorObject.traceback}">${this.papyros.constants.icons.info}</md-icon>`,
@@ -1,10 +1,11 @@
 import { BackendManager } from "../../communication/BackendManager";
 import { BackendEventType } from "../../communication/BackendEvent";
+import { decodeFrames } from "../../communication/FrameCodec";
 import { Frame } from "@dodona/trace-component/dist/trace_types";
 import { State, stateProperty } from "@dodona/lit-state";
 import { Papyros } from "./Papyros";
-import { CODE_TAB, FileEntry, parseFileEntries } from "./InputOutput";
-import { materializeFrame } from "./DebuggerFrames";
+import { applyFileChanges, CODE_TAB, FileEntry, parseFileChanges } from "./InputOutput";
+import { isPlaceholderFrame, materializeFrame, placeholderFrame } from "./DebuggerFrames";
 export type FrameState = {
     line: number;
     outputs: number;
@@ -22,6 +23,15 @@ export class Debugger extends State {
      * interrupted, so a finished run is always fully visible.
      */
     private static readonly FLUSH_INTERVAL_MS = 50;
+    /**
+     * The backend only streams the start of a long trace in full, later
+     * frames arrive as placeholders. The frames around the active one are
+     * fetched when it gets near them, and frames further away than
+     * RETAINED_FRAMES become placeholders again, so the main thread only
+     * holds the part of the trace that is being looked at.
+     */
+    private static readonly FETCHED_FRAMES = 200;
+    private static readonly RETAINED_FRAMES = 1000;
 
     private papyros: Papyros;
     private pendingFrames: Frame[] = [];
@@ -29,6 +39,11 @@ export class Debugger extends State {
     private lastMaterializedFrame: Frame | undefined = undefined;
     private flushTimer: ReturnType<typeof setTimeout> | undefined = undefined;
     private runActive: boolean = false;
+    private loadingFrames: boolean = false;
+    /**
+     * Counts the resets, to drop frames fetched for an earlier run
+     */
+    private traceId: number = 0;
     @stateProperty
     private frameStates: FrameState[] = [];
     @stateProperty
@@ -37,6 +52,7 @@ export class Debugger extends State {
     public set activeFrame(value: number | undefined) {
         this._activeFrame = value;
         this.validateActiveTab();
+        void this.loadFrames();
     }
 
     @stateProperty
@@ -69,15 +85,24 @@ export class Debugger extends State {
         BackendManager.subscribe(BackendEventType.Start, () => {
             this.runActive = true;
             this.reset();
+            // The Files events of the run are deltas on top of the workspace as it starts
+            this.fileHistory = [this.papyros.io.files];
         });
         BackendManager.subscribe(BackendEventType.Files, (e) => {
             if (this._active) {
-                this.fileHistory = [...this.fileHistory, parseFileEntries(e.data, e.contentType)];
+                // Before the run started, the files are those of the frontend
+                const previous = this.fileHistory[this.fileHistory.length - 1] ?? this.papyros.io.files;
+                const files = applyFileChanges(previous, parseFileChanges(e.data, e.contentType));
+                if (files !== undefined) {
+                    this.fileHistory = [...this.fileHistory, files];
+                }
             }
         });
         BackendManager.subscribe(BackendEventType.Frame, (e) => {
             this.activeFrame ??= 0;
-            const frame = materializeFrame(this.lastMaterializedFrame, JSON.parse(e.data));
+            // Frames that arrived in the binary encoding were decoded by the BackendManager
+            const parsed: unknown = typeof e.data === "string" ? JSON.parse(e.data) : e.data;
+            const frame = materializeFrame(this.lastMaterializedFrame, parsed);
             this.lastMaterializedFrame = frame;
             this.pendingFrames.push(frame);
             this.pendingFrameStates.push({
@@ -104,6 +129,7 @@ export class Debugger extends State {
             BackendManager.subscribe(type, () => {
                 this.runActive = false;
                 this.flushFrames();
+                void this.loadFrames();
             });
         }
     }
@@ -122,7 +148,62 @@ export class Debugger extends State {
         this.pendingFrameStates = [];
     }
 
+    /**
+     * @return {[number, number] | undefined} The window of frames around the active one
+     * to fetch, undefined if they are all there
+     */
+    private missingFrames(): [number, number] | undefined {
+        if (this._activeFrame === undefined) {
+            return undefined;
+        }
+        const start = Math.max(0, this._activeFrame - Debugger.FETCHED_FRAMES / 2);
+        const end = Math.min(this.trace.length, this._activeFrame + Debugger.FETCHED_FRAMES / 2);
+        if (!this.trace.slice(start, end).some(isPlaceholderFrame)) {
+            return undefined;
+        }
+        return [start, end];
+    }
+
+    /**
+     * Fetch the frames around the active one that only arrived as placeholders,
+     * until they are all there: the active frame can move while fetching
+     */
+    private async loadFrames(): Promise<void> {
+        if (this.loadingFrames) {
+            return;
+        }
+        this.loadingFrames = true;
+        try {
+            const traceId = this.traceId;
+            let missing = this.missingFrames();
+            while (missing !== undefined) {
+                const [start, end] = missing;
+                const frames = decodeFrames(await this.papyros.runner.getFrames(start, end));
+                if (traceId !== this.traceId || frames.length === 0) {
+                    return;
+                }
+                const trace = [...this.trace];
+                let previous: Frame | undefined = undefined;
+                frames.forEach((parsed, offset) => {
+                    previous = materializeFrame(previous, parsed);
+                    trace[start + offset] = previous;
+                });
+                const center = this._activeFrame ?? start;
+                for (let i = 0; i < trace.length; i++) {
+                    if (Math.abs(i - center) > Debugger.RETAINED_FRAMES && !isPlaceholderFrame(trace[i])) {
+                        trace[i] = placeholderFrame(trace[i]);
+                    }
+                }
+                this.trace = trace;
+                missing = this.missingFrames();
+            }
+        } finally {
+            this.loadingFrames = false;
+        }
+    }
+
     public reset(): void {
+        this.traceId++;
         if (this.flushTimer !== undefined) {
             clearTimeout(this.flushTimer);
             this.flushTimer = undefined;
@@ -20,11 +20,51 @@ export type DeltaFrame = {
     [key: string]: unknown;
 };
 
+/**
+ * A frame the worker kept to itself, sent with only what is needed to list
+ * it. Its variables are fetched once the debugger gets near it.
+ */
+export type FrameSummary = {
+    stub: true;
+    line: number;
+    event: string;
+    func_name: string;
+};
+
+const placeholders = new WeakSet<Frame>();
+
+/**
+ * @param {Frame} frame A materialized frame
+ * @return {boolean} Whether it stands in for a frame whose variables still have to be fetched
+ */
+export function isPlaceholderFrame(frame: Frame): boolean {
+    return placeholders.has(frame);
+}
+
+/**
+ * @param {FrameSummary} summary What is known of the frame
+ * @return {Frame} A frame without variables that stands in for it
+ */
+export function placeholderFrame(summary: Pick<FrameSummary, "line" | "event" | "func_name">): Frame {
+    const frame = {
+        line: summary.line,
+        event: summary.event,
+        func_name: summary.func_name,
+        globals: {},
+        ordered_globals: [],
+        stack_to_render: [],
+        heap: {},
+    } as unknown as Frame;
+    placeholders.add(frame);
+    return frame;
+}
+
 /**
  * Turn a frame as received from the worker into a full Frame for the trace
  * component. Full frames (no `delta` marker) pass through unchanged. Delta
  * frames are applied on top of `previous`, reusing unchanged heap entries by
  * reference so the trace only grows by what actually changed between steps.
+ * Summaries become placeholders, which no delta frame follows.
  * @param {Frame | undefined} previous The last materialized frame, or
  * undefined at the start of a run
  * @param {unknown} parsed The frame as parsed from the worker's JSON
@@ -35,10 +75,13 @@ export function materializeFrame(previous: Frame | undefined, parsed: unknown):
         throw new PapyrosError("Received a frame that is not an object");
     }
     const raw = parsed as Record<string, unknown>;
+    if (raw.stub === true) {
+        return placeholderFrame(raw as FrameSummary);
+    }
     if (raw.delta !== true) {
         return raw as Frame;
     }
-    if (!previous || !("globals" in previous) || !("heap" in previous)) {
+    if (!previous || !("globals" in previous) || !("heap" in previous) || isPlaceholderFrame(previous)) {
         throw new PapyrosError("Received a delta frame with no full frame to apply it to");
     }
     const deltaFrame = raw as DeltaFrame;
@@ -35,6 +35,10 @@ export interface FriendlyError {
      * Where specifically in the source code the Error occurred
      */
     where?: string;
+    /**
+     * Id to ask the backend for the info and why of the Error, when it left them out
+     */
+    id?: number;
 }
 
 export enum OutputType {
@@ -46,7 +50,7 @@ export enum OutputType {
 
 export type OutputEntry = {
     type: OutputType;
-    content: string | FriendlyError | TurtlePatch;
+    content: string | Uint8Array | FriendlyError | TurtlePatch;
     contentType?: string;
 };
 
@@ -57,7 +61,10 @@ export enum InputMode {
 
 export interface FileEntry {
     name: string;
-    content: string;
+    /**
+     * The text of the file, or its bytes when binary is true
+     */
+    content: string | Uint8Array;
     binary: boolean;
 }
 
@@ -67,13 +74,58 @@ export const OUTPUT_TAB = "output";
 export const TURTLE_TAB = "turtle";
 export type OutputTab = typeof OUTPUT_TAB | typeof TURTLE_TAB;
 
-export function parseFileEntries(data: string, contentType?: string): FileEntry[] {
-    const parsed = parseData(data, contentType) as Record<string, { content: string; binary: boolean }>;
-    return Object.entries(parsed).map(([name, { content, binary }]) => ({ name, content, binary }));
+type FileContent = { content: string | Uint8Array; binary: boolean };
+
+/**
+ * Shape of the data of a Files event: either a full listing of the workspace,
+ * or only the files that were added, modified or removed since the previous event.
+ * A full listing does not send large files again that did not change, they are unchanged instead.
+ */
+export type FileChanges =
+    | { full: true; files: Record<string, FileContent | { unchanged: true; binary: boolean }> }
+    | { full: false; added: Record<string, FileContent>; modified: Record<string, FileContent>; removed: string[] };
+
+/**
+ * Apply the data of a Files event to a list of files
+ * @param {FileEntry[]} files The files before the event
+ * @param {FileChanges} changes The parsed data of the event
+ * @return {FileEntry[]} The files after the event, or undefined if it needs files that are not there to apply it to
+ */
+export function applyFileChanges(files: FileEntry[] | undefined, changes: FileChanges): FileEntry[] | undefined {
+    const toEntries = (record: Record<string, FileContent>): FileEntry[] =>
+        Object.entries(record).map(([name, { content, binary }]) => ({ name, content, binary }));
+    if (changes.full) {
+        const kept = new Map((files ?? []).map((f) => [f.name, f.content]));
+        const result: FileEntry[] = [];
+        for (const [name, entry] of Object.entries(changes.files)) {
+            const content = "unchanged" in entry ? kept.get(name) : entry.content;
+            if (content === undefined) {
+                return undefined;
+            }
+            result.push({ name, content, binary: entry.binary });
+        }
+        return result;
+    }
+    if (files === undefined) {
+        return undefined;
+    }
+    const removed = new Set(changes.removed);
+    const updated = { ...changes.added, ...changes.modified };
+    const result = files
+        .filter((f) => !removed.has(f.name))
+        .map((f) => (f.name in updated ? { name: f.name, ...updated[f.name] } : f));
+    const known = new Set(result.map((f) => f.name));
+    return [...result, ...toEntries(updated).filter((f) => !known.has(f.name))];
+}
+
+export function parseFileChanges(data: string, contentType?: string): FileChanges {
+    return parseData(data, contentType) as FileChanges;
 }
 
 export class InputOutput extends State {
     private papyros: Papyros;
+    /** The explanation asked for each logged error, kept as long as the error itself */
+    private explanations = new WeakMap<FriendlyError, Promise<void>>();
     @stateProperty
     inputs: string[] = [];
     @stateProperty
@@ -110,6 +162,16 @@ export class InputOutput extends State {
             this.clearInputs();
         }
     }
+    /**
+     * The complete lines of the batch input, handed to the backend up front so
+     * it only needs to ask for input once they run out
+     */
+    get bufferedStdin(): string | undefined {
+        if (this.inputMode !== InputMode.batch) {
+            return undefined;
+        }
+        return this.inputBuffer.slice(0, this.inputBuffer.lastIndexOf("\n") + 1);
+    }
     private get nextBufferedLine(): string | undefined {
         const bufferedLines = this.inputBuffer.split("\n").slice(0, -1);
         if (bufferedLines.length > this.inputs.length) {
@@ -138,6 +200,11 @@ export class InputOutput extends State {
             const data = parseData(e.data, e.contentType);
             this.logError(data);
         });
+        BackendManager.subscribe(BackendEventType.OutputTruncated, (e) => {
+            // The backend only kept the tail of the output that followed
+            const count = parseData(e.data, e.contentType);
+            this.logError(this.papyros.i18n.t("Papyros.output_truncated", { count }));
+        });
         BackendManager.subscribe(BackendEventType.Input, (e) => {
             if (this.nextBufferedLine !== undefined && this.inputMode === InputMode.batch) {
                 this.provideInput(this.nextBufferedLine);
@@ -147,6 +214,11 @@ export class InputOutput extends State {
             this.prompt = e.data || "";
             this.awaitingInput = true;
         });
+        BackendManager.subscribe(BackendEventType.BufferedInput, (e) => {
+            // The backend read these lines of bufferedStdin itself
+            const lines = (e.data as string).split("\n").slice(0, -1);
+            this.inputs = [...this.inputs, ...lines];
+        });
         BackendManager.subscribe(BackendEventType.End, () => {
             this.awaitingInput = false;
             // If the finished run produced no turtle output, drop the (stale) Turtle tab
@@ -156,7 +228,7 @@ export class InputOutput extends State {
             }
         });
         BackendManager.subscribe(BackendEventType.Files, (e) => {
-            this.files = parseFileEntries(e.data, e.contentType);
+            this.files = applyFileChanges(this.files, parseFileChanges(e.data, e.contentType)) ?? this.files;
         });
     }
 
@@ -175,7 +247,36 @@ export class InputOutput extends State {
         this.output = [...this.output, { type: OutputType.stderr, content: error }];
     }
 
-    public logImage(imageData: string, contentType: string = "image/png"): void {
+    /**
+     * Complete a logged error with the info and why the backend computes on request,
+     * asking the backend at most once per error
+     * @param {FriendlyError} error The error as it was logged
+     * @return {Promise<void>} Resolves once the error in the output is completed
+     */
+    public explainError(error: FriendlyError): Promise<void> {
+        if (error.id === undefined) {
+            return Promise.resolve();
+        }
+        let explaining = this.explanations.get(error);
+        if (explaining === undefined) {
+            explaining = this.completeError(error);
+            this.explanations.set(error, explaining);
+        }
+        return explaining;
+    }
+
+    private async completeError(error: FriendlyError): Promise<void> {
+        const explanation = await this.papyros.runner.explainError(error.id!);
+        if (Object.keys(explanation).length === 0) {
+            return;
+        }
+        // The completed error has no id left, so it is not explained again
+        const explained: FriendlyError = { ...error, ...explanation, id: undefined };
+        // Once a new run replaced the output, there is nothing left to complete
+        this.output = this.output.map((o) => (o.content === error ? { ...o, content: explained } : o));
+    }
+
+    public logImage(imageData: string | Uint8Array, contentType: string = "image/png"): void {
         this.output = [...this.output, { type: OutputType.img, content: imageData, contentType }];
     }
 
@@ -222,7 +323,7 @@ export class InputOutput extends State {
         this.files = this.files.filter((f) => f.name !== name);
     }
 
-    public addFile(name: string, content: string = "", binary: boolean = false): boolean {
+    public addFile(name: string, content: string | Uint8Array = "", binary: boolean = false): boolean {
         if (!isValidFileName(name) || this.files.some((f) => f.name === name)) {
             return false;
         }
@@ -231,7 +332,7 @@ export class InputOutput extends State {
         return true;
     }
 
-    public updateFileContent(name: string, content: string, binary: boolean): void {
+    public updateFileContent(name: string, content: string | Uint8Array, binary: boolean): void {
         this.files = this.files.map((f) => (f.name === name ? { ...f, content, binary } : f));
     }
 
@@ -251,7 +352,7 @@ export class InputOutput extends State {
         return true;
     }
 
-    public upsertFile(name: string, content: string, binary: boolean): void {
+    public upsertFile(name: string, content: string | Uint8Array, binary: boolean): void {
         if (!this.addFile(name, content, binary)) {
             this.updateFileContent(name, content, binary);
         }
@@ -1,9 +1,9 @@
 import { proxy } from "comlink";
 import { SyncClient } from "../../sync/SyncClient";
-import { Backend, RunMode, WorkerDiagnostic } from "../../backend/Backend";
+import { BatchCaseResult, Backend, ProfileReport, RunMode, WorkerDiagnostic } from "../../backend/Backend";
 import { BackendEvent, BackendEventType } from "../../communication/BackendEvent";
 import { BackendManager } from "../../communication/BackendManager";
-import { arrayBufferToBase64, isTextMimeType, isValidFileName, parseData } from "../../util/Util";
+import { isTextMimeType, isValidFileName, parseData } from "../../util/Util";
 import { State, stateProperty } from "@dodona/lit-state";
 import { Papyros } from "./Papyros";
 import { ProgrammingLanguage } from "../../ProgrammingLanguage";
@@ -31,7 +31,15 @@ export interface LoadingData {
     /**
      * The status of the import
      */
-    status: "loading" | "loaded" | "failed";
+    status: "loading" | "progress" | "loaded" | "failed";
+    /**
+     * Number of bytes received so far, for progress of a download
+     */
+    loaded?: number;
+    /**
+     * Total number of bytes of a download, if known
+     */
+    total?: number;
 }
 
 /**
@@ -92,6 +100,32 @@ export class Runner extends State {
      */
     @stateProperty
     public loadingPackages: Array<string> = [];
+    /**
+     * Fraction of the download that arrived, for packages whose size is known
+     */
+    private loadingProgress: Map<string, number> = new Map();
+    /**
+     * How many times faster than real time sleeping passes in a run, Infinity to not wait at all
+     * Undefined to sleep in real time
+     */
+    @stateProperty
+    public clockSpeed: number | undefined = undefined;
+    /**
+     * Seconds a run may take before it is stopped with a timeout, not counting waiting for input
+     * Undefined to not limit it. Runs in debug mode are limited by maxDebugFrames instead
+     */
+    @stateProperty
+    public timeLimit: number | undefined = undefined;
+    /**
+     * Lines a run may execute before it is stopped with a timeout, undefined to not limit it
+     */
+    @stateProperty
+    public stepLimit: number | undefined = undefined;
+    /**
+     * Hot spots of the last run in the profile run mode, undefined until it finishes
+     */
+    @stateProperty
+    public profile: ProfileReport | undefined = undefined;
     /**
      * Time at which the setState call occurred
      */
@@ -172,6 +206,9 @@ export class Runner extends State {
         BackendManager.subscribe(BackendEventType.End, (e) => this.onEnd(e));
         BackendManager.subscribe(BackendEventType.Error, () => this.onError());
         BackendManager.subscribe(BackendEventType.Stop, () => this.stop());
+        BackendManager.subscribe(BackendEventType.Profile, (e) => {
+            this.profile = parseData(e.data, e.contentType) as ProfileReport;
+        });
     }
 
     /**
@@ -229,6 +266,7 @@ export class Runner extends State {
      */
     public async start(mode?: RunMode): Promise<void> {
         this.papyros.debugger.active = mode === RunMode.Debug;
+        this.profile = undefined;
 
         // Setup pre-run
         this.setState(RunState.Loading);
@@ -249,6 +287,10 @@ export class Runner extends State {
                 this.effectiveCode,
                 mode,
                 this.papyros.constants.maxDebugFrames,
+                this.papyros.io.bufferedStdin,
+                this.clockSpeed,
+                this.timeLimit,
+                this.stepLimit,
             );
         } catch (error: any) {
             if (error.type === "InterruptError") {
@@ -282,6 +324,25 @@ export class Runner extends State {
         }
     }
 
+    /**
+     * Run the code in the editor once for every input, e.g. the test cases of an exercise
+     * The results are not shown in the output, they are returned and published as BatchCase events
+     * The timeLimit and stepLimit apply to every run on its own
+     * @param {Array<string>} inputs The complete stdin of every run
+     * @return {Promise<Array<BatchCaseResult>>} The result of every run
+     */
+    public async runBatch(inputs: Array<string>): Promise<Array<BatchCaseResult>> {
+        const backend = await this.backend;
+        return await backend.call(
+            backend.workerProxy.runBatch,
+            this.effectiveCode,
+            inputs,
+            this.clockSpeed,
+            this.timeLimit,
+            this.stepLimit,
+        );
+    }
+
     /**
      * Interrupt the currently running code
      * @return {Promise<void>} Returns when the code has been interrupted
@@ -321,7 +382,7 @@ export class Runner extends State {
         await backend.workerProxy.deleteFile(name);
     }
 
-    public async updateFile(name: string, content: string, binary: boolean): Promise<void> {
+    public async updateFile(name: string, content: string | Uint8Array, binary: boolean): Promise<void> {
         const backend = await this.backend;
         await backend.workerProxy.updateFile(name, content, binary);
     }
@@ -331,7 +392,66 @@ export class Runner extends State {
         await backend.workerProxy.renameFile(oldName, newName);
     }
 
-    public upsertFile(name: string, content: string, binary: boolean): void {
+    /**
+     * Ask the backend to send a full listing of its files instead of only the changes
+     * @return {Promise<void>} Resolves when the listing has been sent
+     */
+    public async resyncFiles(): Promise<void> {
+        const backend = await this.backend;
+        await backend.workerProxy.resyncFiles();
+    }
+
+    /**
+     * Ask the backend for the parts of an error that it leaves out at first
+     * @param {number} id The id the backend sent with the error
+     * @return {Promise<Record<string, string>>} The missing parts, see Backend.explainError
+     */
+    public async explainError(id: number): Promise<Record<string, string>> {
+        const backend = await this.backend;
+        return await backend.workerProxy.explainError(id);
+    }
+
+    /**
+     * Fetch frames of the last debug run that the backend did not send in full
+     * @param {number} start Index of the first frame
+     * @param {number} end Index after the last frame
+     * @return {Promise<string | Uint8Array>} List of the frames, see Backend.getFrames
+     */
+    public async getFrames(start: number, end: number): Promise<string | Uint8Array> {
+        const backend = await this.backend;
+        return await backend.workerProxy.getFrames(start, end);
+    }
+
+    /**
+     * Capture the files of the backend, e.g. the initial files of an exercise
+     * @return {Promise<number | undefined>} Id to restore the files with, undefined if the backend can't
+     */
+    public async checkpointWorkspace(): Promise<number | undefined> {
+        const backend = await this.backend;
+        return await backend.workerProxy.checkpointWorkspace();
+    }
+
+    /**
+     * Restore the files of the backend to a checkpoint, the files list follows through a Files event
+     * @param {number} checkpointId Id returned by checkpointWorkspace
+     * @return {Promise<void>} Resolves when the files have been restored
+     */
+    public async restoreWorkspace(checkpointId: number): Promise<void> {
+        const backend = await this.backend;
+        await backend.workerProxy.restoreWorkspace(checkpointId);
+    }
+
+    /**
+     * Forget a checkpoint that is no longer needed, so the backend can free the files only it held
+     * @param {number} checkpointId Id returned by checkpointWorkspace, it can't be restored afterwards
+     * @return {Promise<void>} Resolves when the checkpoint has been discarded
+     */
+    public async discardCheckpoint(checkpointId: number): Promise<void> {
+        const backend = await this.backend;
+        await backend.workerProxy.discardCheckpoint(checkpointId);
+    }
+
+    public upsertFile(name: string, content: string | Uint8Array, binary: boolean): void {
         this.papyros.io.upsertFile(name, content, binary);
         void this.updateFile(name, content, binary);
     }
@@ -348,7 +468,7 @@ export class Runner extends State {
             if (isTextMimeType(contentType)) {
                 this.upsertFile(name, await response.text(), false);
             } else {
-                this.upsertFile(name, arrayBufferToBase64(await response.arrayBuffer()), true);
+                this.upsertFile(name, new Uint8Array(await response.arrayBuffer()), true);
             }
         } catch (err) {
             console.warn("Failed to fetch dropped URL:", rawUrl, err);
@@ -383,7 +503,11 @@ export class Runner extends State {
         });
 
         const backend = await this.backend;
-        await backend.workerProxy.provideFiles(inlinedFiles, hrefFiles);
+        await backend.workerProxy.provideFiles(
+            inlinedFiles,
+            hrefFiles,
+            this.papyros.constants.maxConcurrentFileFetches,
+        );
     }
 
     /**
@@ -405,7 +529,13 @@ export class Runner extends State {
      */
     private onLoad(e: BackendEvent): void {
         const loadingData = parseData(e.data, e.contentType) as LoadingData;
-        if (loadingData.status === "loading") {
+        if (loadingData.status === "progress") {
+            loadingData.modules.forEach((m) => {
+                if (loadingData.total) {
+                    this.loadingProgress.set(m, (loadingData.loaded ?? 0) / loadingData.total);
+                }
+            });
+        } else if (loadingData.status === "loading") {
             loadingData.modules.forEach((m) => {
                 if (!this.loadingPackages.includes(m)) {
                     this.loadingPackages.push(m);
@@ -417,6 +547,7 @@ export class Runner extends State {
                 if (index !== -1) {
                     this.loadingPackages.splice(index, 1);
                 }
+                this.loadingProgress.delete(m);
             });
         } else {
             // failed
@@ -424,11 +555,18 @@ export class Runner extends State {
             // So this does not need to be handled here, as it is often an incomplete package-name
             // that causes micropip to not find the correct wheel
             this.loadingPackages = [];
+            this.loadingProgress.clear();
         }
         if (this.loadingPackages.length > 0) {
             const packageMessage = this.papyros.i18n.t("Papyros.loading", {
                 // limit amount of package names shown
-                packages: this.loadingPackages.slice(0, 3).join(", "),
+                packages: this.loadingPackages
+                    .slice(0, 3)
+                    .map((m) => {
+                        const progress = this.loadingProgress.get(m);
+                        return progress === undefined ? m : `${m} (${Math.floor(progress * 100)}%)`;
+                    })
+                    .join(", "),
             });
             this.setState(RunState.Loading, packageMessage);
         } else {
@@ -13,6 +13,7 @@ export const ENGLISH_TRANSLATION = {
                 "Provide all input required by your code here.\n" + "You can enter multiple lines by pressing enter.",
         },
         output_placeholder: "The output of your code will appear here.",
+        output_truncated: "Output truncated, %{count} characters dropped",
         debug_placeholder: "The debugger output will appear here.",
         stop: "Stop",
         finished: "Code executed in %{time} s",
@@ -46,6 +47,7 @@ export const ENGLISH_TRANSLATION = {
             doctest: "Run doctests",
             debug: "Debug",
             run: "Run",
+            profile: "Profile",
         },
         debugger: {
             title: "Drag the slider to walk through your code.",
@@ -112,6 +114,7 @@ export const DUTCH_TRANSLATION = {
                 "Je kan verschillende lijnen ingeven door op enter te drukken.",
         },
         output_placeholder: "Hier komt de uitvoer van je code.",
+        output_truncated: "Uitvoer ingekort, %{count} tekens weggelaten",
         debug_placeholder: "Hier komt de uitvoer van de debugger.",
         stop: "Stop",
         states: {
@@ -145,6 +148,7 @@ export const DUTCH_TRANSLATION = {
             doctest: "Doctests uitvoeren",
             debug: "Debuggen",
             run: "Uitvoeren",
+            profile: "Profileren",
         },
         debugger: {
             title: "Verken je code stap voor stap",
@@ -19,16 +19,6 @@ export function isTextMimeType(mime: string | null | undefined): boolean {
     return TEXT_MIME_PATTERNS.some((prefix) => base.startsWith(prefix));
 }
 
-export function arrayBufferToBase64(buffer: ArrayBuffer): string {
-    const bytes = new Uint8Array(buffer);
-    const CHUNK = 8192;
-    const chunks: string[] = [];
-    for (let i = 0; i < bytes.length; i += CHUNK) {
-        chunks.push(String.fromCharCode(...bytes.subarray(i, i + CHUNK)));
-    }
-    return btoa(chunks.join(""));
-}
-
 export function debounce<T extends (...args: any[]) => void>(fn: T, delay: number): T {
     let timer: ReturnType<typeof setTimeout> | undefined;
     return ((...args: Parameters<T>) => {
@@ -40,6 +30,7 @@ export function debounce<T extends (...args: any[]) => void>(fn: T, delay: numbe
 /**
  * Parse the data contained within a PapyrosEvent using its contentType
  * Supported content types are: text/plain, text/json, image/png;base64
+ * and image/png or image/svg+xml, whose data are the raw bytes of the image
  * @param {string} data The data to parse
  * @param {string} contentType The content type of the data
  * @return {any} The parsed data
@@ -70,7 +61,9 @@ export function parseData(data: string, contentType?: string): any {
         case "image": {
             switch (specificType) {
                 case "png;base64":
-                case "svg+xml;base64": {
+                case "svg+xml;base64":
+                case "png":
+                case "svg+xml": {
                     return data;
                 }
             }
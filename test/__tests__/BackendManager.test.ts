@@ -33,6 +33,35 @@ describe("BackendManager", () => {
         expect(events.length).toEqual(1);
     });
 
+    it("publishes a batch of frames as the events it holds", () => {
+        const types: Array<BackendEventType> = [];
+        const record = (e: BackendEvent): number => types.push(e.type);
+        for (const type of [BackendEventType.Frame, BackendEventType.Files, BackendEventType.Turtle]) {
+            BackendManager.subscribe(type, record);
+        }
+        BackendManager.publish({ type: BackendEventType.Start, data: "RunCode" });
+        BackendManager.publish({
+            type: BackendEventType.Frames,
+            data: {
+                frames: ["{}", "{}", "{}"],
+                files: [[1, { full: true, files: {} }]],
+                turtle: [
+                    [1, "{}"],
+                    [2, "{}"],
+                ],
+            },
+            contentType: "application/json",
+        });
+        expect(types).toEqual([
+            BackendEventType.Frame,
+            BackendEventType.Files,
+            BackendEventType.Turtle,
+            BackendEventType.Frame,
+            BackendEventType.Turtle,
+            BackendEventType.Frame,
+        ]);
+    });
+
     it("can remove a backend", () => {
         expect(BackendManager.removeBackend(ProgrammingLanguage.JavaScript)).toEqual(true);
     });
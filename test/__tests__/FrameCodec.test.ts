@@ -0,0 +1,40 @@
+import { describe, expect, it } from "vitest";
+import { decodeFrames } from "../../src/communication/FrameCodec";
+
+// Two frames as papyros/frame_codec.py encodes them
+const ENCODED = new Uint8Array([
+    // The table and the frames
+    0x92,
+    // Table: "line", "event", "step_line"
+    0x93, 0xa4, 0x6c, 0x69, 0x6e, 0x65, 0xa5, 0x65, 0x76, 0x65, 0x6e, 0x74, 0xa9, 0x73, 0x74, 0x65, 0x70, 0x5f, 0x6c,
+    0x69, 0x6e, 0x65,
+    // { line: 1, event: "step_line", ok: true }
+    0x92, 0x83, 0xd4, 0x00, 0x00, 0x01, 0xd4, 0x00, 0x01, 0xd4, 0x00, 0x02, 0xa2, 0x6f, 0x6b, 0xc3,
+    // { line: -300, event: "step_line", ok: null }
+    0x83, 0xd4, 0x00, 0x00, 0xd1, 0xfe, 0xd4, 0xd4, 0x00, 0x01, 0xd4, 0x00, 0x02, 0xa2, 0x6f, 0x6b, 0xc0,
+]);
+
+const FRAMES = [
+    { line: 1, event: "step_line", ok: true },
+    { line: -300, event: "step_line", ok: null },
+];
+
+describe("decodeFrames", () => {
+    it("decodes binary frames, resolving the strings in their table", () => {
+        expect(decodeFrames(ENCODED)).toEqual(FRAMES);
+    });
+
+    it("decodes binary frames in a view on part of a buffer", () => {
+        const buffer = new Uint8Array(ENCODED.length + 8);
+        buffer.set(ENCODED, 4);
+        expect(decodeFrames(buffer.subarray(4, 4 + ENCODED.length))).toEqual(FRAMES);
+    });
+
+    it("parses frames sent as JSON", () => {
+        expect(decodeFrames(JSON.stringify(FRAMES))).toEqual(FRAMES);
+    });
+
+    it("rejects a truncated buffer", () => {
+        expect(() => decodeFrames(ENCODED.subarray(0, ENCODED.length - 3))).toThrow();
+    });
+});
@@ -4,7 +4,8 @@ import {Papyros} from "../../../src/frontend/state/Papyros";
 import {RunMode} from "../../../src/backend/Backend";
 import {RunState} from "../../../src/frontend/state/Runner";
 import {NonExceptionFrame} from "@dodona/trace-component/dist/trace_types";
-import {waitForInputReady, waitForOutput, waitForPapyrosReady} from "../../helpers";
+import {isPlaceholderFrame} from "../../../src/frontend/state/DebuggerFrames";
+import {waitForFiles, waitForInputReady, waitForOutput, waitForPapyrosReady} from "../../helpers";
 
 describe.sequential("Debugger", () => {
     it("can run in debug mode", async () => {
@@ -86,6 +87,24 @@ z = 1 + 2`;
         expect(papyros.debugger.debugFiles).toEqual([]);
     });
 
+    it("shows the files that were there before the run from the first frame", async () => {
+        const papyros = new Papyros();
+        await papyros.launch();
+        papyros.runner.programmingLanguage = ProgrammingLanguage.Python;
+        await waitForInputReady();
+        await papyros.runner.provideFiles({ "provided.txt": "provided content" }, {});
+        await waitForFiles(papyros, 1);
+        papyros.runner.code = `x = 1\nwith open('test.txt', 'w') as f:\n    f.write('hello')\ny = 2`;
+        await papyros.runner.start(RunMode.Debug);
+        await waitForPapyrosReady(papyros);
+
+        papyros.debugger.activeFrame = 0;
+        expect(papyros.debugger.debugFiles.map(f => f.name)).toEqual(["provided.txt"]);
+
+        papyros.debugger.activeFrame = papyros.debugger.trace.length - 1;
+        expect(papyros.debugger.debugFiles.map(f => f.name).sort()).toEqual(["provided.txt", "test.txt"]);
+    });
+
     it("batches frame updates but delivers the complete trace", async () => {
         const papyros = new Papyros();
         await papyros.launch();
@@ -129,6 +148,34 @@ for i in range(50):
         expect(papyros.debugger.trace.length).toBe(5);
     });
 
+    it("fetches the frames of a long trace around the active one", async () => {
+        const papyros = new Papyros();
+        await papyros.launch();
+        papyros.runner.programmingLanguage = ProgrammingLanguage.Python;
+        papyros.runner.code = `total = 0
+for i in range(1000):
+    total += i`;
+        await papyros.runner.start(RunMode.Debug);
+        await waitForPapyrosReady(papyros);
+
+        const trace = papyros.debugger.trace;
+        expect(trace.length).toBeGreaterThan(2000);
+        // Only the start of the trace and the frame the run ended on were sent in full
+        expect(isPlaceholderFrame(trace[1500])).toBe(true);
+        expect(isPlaceholderFrame(trace[trace.length - 1])).toBe(false);
+
+        papyros.debugger.activeFrame = 1500;
+        const start = Date.now();
+        while (isPlaceholderFrame(papyros.debugger.trace[1500]) && Date.now() - start < 2000) {
+            await new Promise((r) => setTimeout(r, 10));
+        }
+        const frame = papyros.debugger.trace[1500] as NonExceptionFrame;
+        expect(frame.line).toBe(trace[1500].line);
+        expect(frame.globals.i).toBeGreaterThan(0);
+        // Frames far from the active one are released again
+        expect(isPlaceholderFrame(papyros.debugger.trace[0])).toBe(true);
+    });
+
     it("resets when deactivated", async () => {
         const papyros = new Papyros();
         await papyros.launch();
@@ -1,5 +1,5 @@
 import { describe, it, expect } from "vitest";
-import { materializeFrame } from "../../../src/frontend/state/DebuggerFrames";
+import { isPlaceholderFrame, materializeFrame } from "../../../src/frontend/state/DebuggerFrames";
 import { NonExceptionFrame } from "@dodona/trace-component/dist/trace_types";
 import { PapyrosError } from "../../../src/frontend/state/PapyrosErrors";
 
@@ -161,4 +161,28 @@ describe("materializeFrame", () => {
 
         expect(materialized.exception_msg).toBe("boom");
     });
+
+    it("turns a summary into a placeholder that no delta can be applied to", () => {
+        const summary = { stub: true, line: 7, event: "step_line", func_name: "f" };
+
+        const placeholder = materializeFrame(fullFrame(), summary) as NonExceptionFrame;
+
+        expect(isPlaceholderFrame(placeholder)).toBe(true);
+        expect(placeholder.line).toBe(7);
+        expect(placeholder.globals).toEqual({});
+        expect(isPlaceholderFrame(fullFrame())).toBe(false);
+        const delta = {
+            delta: true,
+            line: 8,
+            event: "step_line",
+            func_name: "f",
+            stack_to_render: [],
+            ordered_globals: [],
+            globals_set: {},
+            globals_del: [],
+            heap_set: {},
+            heap_del: [],
+        };
+        expect(() => materializeFrame(placeholder, delta)).toThrow(PapyrosError);
+    });
 });
@@ -1,8 +1,16 @@
 import { Papyros } from "../../../src/frontend/state/Papyros";
 import { expect, it, describe } from "vitest";
 import { ProgrammingLanguage } from "../../../src/ProgrammingLanguage";
-import { waitForFiles, waitForPapyrosReady, waitForInputReady, waitForOutput, waitForAwaitingInput } from "../../helpers";
+import {
+    runPython,
+    waitForFiles,
+    waitForPapyrosReady,
+    waitForInputReady,
+    waitForOutput,
+    waitForAwaitingInput,
+} from "../../helpers";
 import { isValidFileName } from "../../../src/util/Util";
+import { applyFileChanges } from "../../../src/frontend/state/InputOutput";
 
 describe("isValidFileName", () => {
     it.each(["../escape", "/absolute", "trailing/", "a//b", ".", "a/./b", "a/../b", ""])
@@ -16,6 +24,46 @@ describe("isValidFileName", () => {
         });
 });
 
+describe("applyFileChanges", () => {
+    const a = { name: "a.txt", content: "aaa", binary: false };
+    const b = { name: "b.txt", content: "bbb", binary: false };
+
+    it("replaces everything with a full listing", () => {
+        const files = applyFileChanges([a, b], { full: true, files: { "c.txt": { content: "ccc", binary: false } } });
+        expect(files).toEqual([{ name: "c.txt", content: "ccc", binary: false }]);
+    });
+
+    it("applies added, modified and removed files in place", () => {
+        const files = applyFileChanges([a, b], {
+            full: false,
+            added: { "c.txt": { content: "ccc", binary: false } },
+            modified: { "b.txt": { content: "BBB", binary: false } },
+            removed: ["a.txt"],
+        });
+        expect(files).toEqual([
+            { name: "b.txt", content: "BBB", binary: false },
+            { name: "c.txt", content: "ccc", binary: false },
+        ]);
+    });
+
+    it("keeps the content of large files a full listing marks as unchanged", () => {
+        const files = applyFileChanges([a, b], {
+            full: true,
+            files: { "a.txt": { unchanged: true, binary: false }, "c.txt": { content: "ccc", binary: false } },
+        });
+        expect(files).toEqual([a, { name: "c.txt", content: "ccc", binary: false }]);
+    });
+
+    it("cannot keep the content of a file it does not have", () => {
+        expect(applyFileChanges([b], { full: true, files: { "a.txt": { unchanged: true, binary: false } } }))
+            .toBeUndefined();
+    });
+
+    it("cannot apply a delta without files to apply it to", () => {
+        expect(applyFileChanges(undefined, { full: false, added: {}, modified: {}, removed: [] })).toBeUndefined();
+    });
+});
+
 describe.sequential("Files", () => {
     it("writing a single file emits it", async () => {
         const papyros = new Papyros();
@@ -101,6 +149,30 @@ open("subdir/nested.txt", "w").write("nested content")
         expect(names).toEqual(["a.txt", "b.txt"]);
     });
 
+    it("downloads provided href files a few at a time and reports their progress", async () => {
+        const papyros = new Papyros();
+        await papyros.launch();
+        papyros.runner.programmingLanguage = ProgrammingLanguage.Python;
+        papyros.constants.maxConcurrentFileFetches = 2;
+        await waitForInputReady();
+        // Served by test/fileServer.ts, in slow chunks
+        const names = ["a", "b", "c", "d", "e"].map((n) => `${n}.txt`);
+        const hrefFiles = Object.fromEntries(names.map((n) => [n, `${location.origin}/__files__/${n}`]));
+        const messages: string[] = [];
+        const unsubscribe = papyros.runner.subscribe(() => messages.push(papyros.runner.stateMessage), "stateMessage");
+        await papyros.runner.provideFiles({}, hrefFiles);
+        await waitForFiles(papyros, names.length);
+        unsubscribe();
+
+        expect(papyros.io.files.map((f) => f.name).sort()).toEqual(names);
+        expect(papyros.io.files[0].content).toBe("x".repeat(5 * 1024));
+        const stats = await (await fetch("/__files__/stats")).json();
+        expect(stats.maxInFlight).toBe(2);
+        expect(messages.some((m) => /\(\d+%\)/.test(m))).toBe(true);
+        expect(papyros.runner.loadingPackages).toEqual([]);
+        expect(papyros.runner["loadingProgress"].size).toBe(0);
+    });
+
     it("file written before crash still appears", async () => {
         const papyros = new Papyros();
         await papyros.launch();
@@ -158,6 +230,87 @@ raise ValueError("intentional error")
         expect(papyros.io.files.length).toBe(0);
     });
 
+    it("renames, removals and shutil operations of a run are sent", async () => {
+        const papyros = new Papyros();
+        await papyros.launch();
+        papyros.runner.programmingLanguage = ProgrammingLanguage.Python;
+        await waitForInputReady();
+        await papyros.runner.provideFiles({ "a.txt": "aaa", "b.txt": "bbb", "tree/c.txt": "ccc", "d.txt": "ddd" }, {});
+        await waitForFiles(papyros, 4);
+
+        papyros.runner.code = `
+import os
+import pathlib
+import shutil
+os.rename("a.txt", "renamed.txt")
+pathlib.Path("b.txt").unlink()
+shutil.copyfile("tree/c.txt", "copy.txt")
+shutil.rmtree("tree")
+shutil.move("d.txt", "moved.txt")
+`;
+        await papyros.runner.start();
+        await waitForPapyrosReady(papyros);
+        expect(papyros.io.files.map((f) => f.name).sort()).toEqual(["copy.txt", "moved.txt", "renamed.txt"]);
+        expect(papyros.io.files.find((f) => f.name === "copy.txt")?.content).toBe("ccc");
+    });
+
+    it("restoring a checkpoint undoes modified, removed and created files", async () => {
+        const papyros = new Papyros();
+        await papyros.launch();
+        papyros.runner.programmingLanguage = ProgrammingLanguage.Python;
+        await waitForInputReady();
+        await papyros.runner.provideFiles({ "a.txt": "aaa", "b.txt": "bbb" }, {});
+        await waitForFiles(papyros, 2);
+        const checkpoint = (await papyros.runner.checkpointWorkspace())!;
+
+        papyros.runner.code = `
+import os
+open("a.txt", "w").write("changed")
+os.remove("b.txt")
+os.makedirs("new", exist_ok=True)
+open("new/c.txt", "w").write("ccc")
+`;
+        await papyros.runner.start();
+        await waitForPapyrosReady(papyros);
+        expect(papyros.io.files.map((f) => f.name).sort()).toEqual(["a.txt", "new/c.txt"]);
+
+        await papyros.runner.restoreWorkspace(checkpoint);
+        await expect.poll(() => papyros.io.files.map((f) => `${f.name}: ${f.content}`).sort())
+            .toEqual(["a.txt: aaa", "b.txt: bbb"]);
+
+        papyros.runner.code = `
+import os
+print(sorted(os.listdir()), open("a.txt").read(), open("b.txt").read())
+`;
+        await papyros.runner.start();
+        await waitForOutput(papyros);
+        await waitForPapyrosReady(papyros);
+        expect(papyros.io.output[0].content).toBe("['a.txt', 'b.txt'] aaa bbb\n");
+    });
+
+    it("a checkpoint can be restored more than once, until it is discarded", async () => {
+        const papyros = new Papyros();
+        await papyros.launch();
+        papyros.runner.programmingLanguage = ProgrammingLanguage.Python;
+        await waitForInputReady();
+        await papyros.runner.provideFiles({ "a.txt": "aaa" }, {});
+        await waitForFiles(papyros, 1);
+        const checkpoint = (await papyros.runner.checkpointWorkspace())!;
+
+        for (const content of ["first", "second"]) {
+            papyros.runner.code = `open("a.txt", "w").write("${content}")`;
+            await papyros.runner.start();
+            await waitForPapyrosReady(papyros);
+            await expect.poll(() => papyros.io.files[0].content).toBe(content);
+            await papyros.runner.restoreWorkspace(checkpoint);
+            await expect.poll(() => papyros.io.files[0].content).toBe("aaa");
+        }
+
+        await papyros.runner.discardCheckpoint(checkpoint);
+        await expect(papyros.runner.restoreWorkspace(checkpoint)).rejects.toThrow("Unknown checkpoint");
+        await expect(papyros.runner.discardCheckpoint(checkpoint)).rejects.toThrow("Unknown checkpoint");
+    });
+
     it("updateFileContent updates the in-memory content of an existing file", async () => {
         const papyros = new Papyros();
         await papyros.launch();
@@ -384,3 +537,85 @@ with open("new.txt", "r") as f:
         expect(papyros.io.output[0].content).toBe("renamed content");
     });
 });
+
+describe.sequential("FileCache", () => {
+    it("only caches files that were not modified within the racy window", async () => {
+        const papyros = new Papyros();
+        await papyros.launch();
+        const output = await runPython(papyros, `
+import os
+import time
+from papyros.workspace import FileCache, RACY_WINDOW_NS
+
+cache = FileCache()
+path = os.path.abspath("racy.txt")
+with open(path, "w") as f:
+    f.write("a")
+stat = os.stat(path)
+cache.put(path, stat, "digest", {"content": "a", "binary": False})
+# Written just now, a second write in the same clock tick would go unnoticed
+print(cache.get(path, stat))
+os.utime(path, ns=(stat.st_atime_ns, time.time_ns() - 2 * RACY_WINDOW_NS))
+stat = os.stat(path)
+cache.put(path, stat, "digest", {"content": "a", "binary": False})
+print(cache.get(path, stat))
+with open(path, "a") as f:
+    f.write("b")
+print(cache.get(path, os.stat(path)))
+`);
+        expect(output).toBe("None\n('digest', {'content': 'a', 'binary': False})\nNone\n");
+    });
+});
+
+describe.sequential("FileJournal", () => {
+    it("records the paths that os, pathlib and shutil functions change", async () => {
+        const papyros = new Papyros();
+        await papyros.launch();
+        const output = await runPython(papyros, `
+import os
+import pathlib
+import shutil
+from papyros.workspace import FileJournal
+
+root = os.path.abspath("journal")
+os.makedirs(os.path.join(root, "tree"), exist_ok=True)
+for name in ["a.txt", "b.txt", "tree/c.txt"]:
+    with open(os.path.join(root, name), "w") as f:
+        f.write(name)
+journal = FileJournal(root)
+journal.install()
+journal.recording = True
+
+def show(label):
+    paths, trees = journal.collect()
+    print(label, sorted(paths), sorted(trees))
+    journal.begin()
+
+os.rename(os.path.join(root, "a.txt"), os.path.join(root, "renamed.txt"))
+show("rename")
+os.remove(os.path.join(root, "renamed.txt"))
+show("remove")
+pathlib.Path(root, "b.txt").unlink()
+show("unlink")
+shutil.copyfile(os.path.join(root, "tree/c.txt"), os.path.join(root, "copy.txt"))
+show("copyfile")
+shutil.move(os.path.join(root, "copy.txt"), os.path.join(root, "moved.txt"))
+show("move")
+shutil.rmtree(os.path.join(root, "tree"))
+show("rmtree")
+open("outside.txt", "w").close()
+show("outside")
+journal.recording = False
+`);
+        expect(output.split("\n").slice(0, -1)).toEqual([
+            // Without a dir_fd, the audit events pass -1 for it
+            "rename [] ['a.txt', 'renamed.txt']",
+            "remove ['renamed.txt'] []",
+            "unlink ['b.txt'] []",
+            "copyfile ['copy.txt'] []",
+            "move [] ['copy.txt', 'moved.txt']",
+            "rmtree [] ['tree']",
+            "outside [] []",
+        ]);
+    });
+});
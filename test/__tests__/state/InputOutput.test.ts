@@ -1,8 +1,8 @@
 import {Papyros} from "../../../src/frontend/state/Papyros";
-import {expect, it, describe} from "vitest";
+import {expect, it, describe, vi} from "vitest";
 import {ProgrammingLanguage} from "../../../src/ProgrammingLanguage";
 import {FriendlyError, InputMode, OutputType} from "../../../src/frontend/state/InputOutput";
-import {waitForAwaitingInput, waitForInputReady, waitForOutput} from "../../helpers";
+import {waitForAwaitingInput, waitForInputReady, waitForOutput, waitForPapyrosReady} from "../../helpers";
 
 describe.sequential("InputOutput", () => {
     it("can log output", async () => {
@@ -84,6 +84,40 @@ console.log("world!");
         expect((papyros.io.output[0].content as FriendlyError).what).toBe("test error");
     });
 
+    it("completes python errors with the explanation it asks for", async () => {
+        const papyros = new Papyros();
+        await papyros.launch();
+        papyros.runner.programmingLanguage = ProgrammingLanguage.Python;
+        papyros.runner.code = `x = 1\nprint(y)`;
+        await papyros.runner.start();
+        await waitForOutput(papyros);
+        const error = papyros.io.output[0].content as FriendlyError;
+        expect(error.name).toBe("NameError");
+        expect(error.where).toContain("line 2");
+        await papyros.io.explainError(error);
+        expect((papyros.io.output[0].content as FriendlyError).why).toContain("`y`");
+    });
+
+    it("only asks for the explanation of an error once it is opened", async () => {
+        const papyros = new Papyros();
+        await papyros.launch();
+        const explainError = vi.spyOn(papyros.runner, "explainError");
+        papyros.runner.programmingLanguage = ProgrammingLanguage.Python;
+        papyros.runner.code = `print(y)`;
+        await papyros.runner.start();
+        await waitForPapyrosReady(papyros);
+        const error = papyros.io.output[0].content as FriendlyError;
+        expect(error.why).toBeUndefined();
+        expect(explainError).not.toHaveBeenCalled();
+
+        await Promise.all([papyros.io.explainError(error), papyros.io.explainError(error)]);
+        await papyros.io.explainError(error);
+        const explained = papyros.io.output[0].content as FriendlyError;
+        expect(explained.why).toContain("`y`");
+        await papyros.io.explainError(explained);
+        expect(explainError).toHaveBeenCalledTimes(1);
+    });
+
     it("can read multiple inputs", async () => {
         const papyros = new Papyros();
         await papyros.launch();
@@ -124,4 +158,83 @@ print("world! " + input("input2"))
         expect(papyros.io.output[0].content).toBe("hello foo1");
         expect(papyros.io.output[3].content).toBe("world! foo2");
     });
+
+    it("marks inputs read from the buffer by python as used", async () => {
+        const papyros = new Papyros();
+        await papyros.launch();
+        papyros.runner.programmingLanguage = ProgrammingLanguage.Python;
+        papyros.runner.code = `
+for _ in range(3):
+    print(input())
+`;
+        papyros.io.inputMode = InputMode.batch;
+        papyros.io.inputBuffer = "foo1\nfoo2\nfoo3\n";
+        await waitForInputReady();
+        await papyros.runner.start();
+        await waitForOutput(papyros);
+        expect(papyros.io.inputs).toEqual(["foo1", "foo2", "foo3"]);
+    });
+
+    it("keeps only the tail of runaway output", async () => {
+        const papyros = new Papyros();
+        await papyros.launch();
+        papyros.runner.programmingLanguage = ProgrammingLanguage.Python;
+        papyros.runner.code = `print("x" * 5_000_000)
+print("done")`;
+        await papyros.runner.start();
+        await waitForOutput(papyros);
+        const truncated = papyros.io.output.find((o) => o.type === OutputType.stderr);
+        expect(truncated?.content).toMatch(/^Output truncated, \d+ characters dropped$/);
+        const printed = papyros.io.output
+            .filter((o) => o.type === OutputType.stdout)
+            .map((o) => o.content)
+            .join("");
+        expect(printed.length).toBeLessThan(5_000_000);
+        expect(printed.endsWith("x\ndone\n")).toBe(true);
+    });
+
+    it("lets output through again once a run that printed too fast goes quiet", async () => {
+        const papyros = new Papyros();
+        await papyros.launch();
+        papyros.runner.programmingLanguage = ProgrammingLanguage.Python;
+        // More than the rate allows in a second, but less than the total
+        papyros.runner.code = `import time
+print("x" * 1_500_000)
+time.sleep(1.1)
+print("after quiet")`;
+        await papyros.runner.start();
+        await waitForOutput(papyros);
+        const truncated = papyros.io.output.filter((o) => o.type === OutputType.stderr);
+        expect(truncated.length).toBe(1);
+        expect(truncated[0].content).toMatch(/^Output truncated, \d+ characters dropped$/);
+        const printed = papyros.io.output
+            .filter((o) => o.type === OutputType.stdout)
+            .map((o) => o.content)
+            .join("");
+        expect(printed.length).toBeLessThan(1_500_000);
+        expect(printed.endsWith("x\nafter quiet\n")).toBe(true);
+    });
+
+    it("shows each matplotlib figure once, as SVG when it is simple and PNG otherwise", async () => {
+        const papyros = new Papyros();
+        await papyros.launch();
+        papyros.runner.programmingLanguage = ProgrammingLanguage.Python;
+        papyros.runner.code = `import matplotlib.pyplot as plt
+plt.plot([1, 2, 3])
+plt.show()
+plt.plot([1, 2, 3])
+plt.show()
+plt.plot([3, 2, 1])
+plt.show()
+plt.imshow([[0, 1], [1, 0]])
+plt.show()
+plt.scatter(range(3000), range(3000))
+plt.show()`;
+        await papyros.runner.start();
+        await waitForOutput(papyros);
+        const images = papyros.io.output.filter((o) => o.type === OutputType.img);
+        // The second figure is the same as the first, so it is not sent again
+        expect(images.map((o) => o.contentType)).toEqual(["image/svg+xml", "image/svg+xml", "image/png", "image/png"]);
+        expect(images[0].content).not.toEqual(images[1].content);
+    });
 });
\ No newline at end of file
@@ -3,8 +3,8 @@ import {Papyros} from "../../../src/frontend/state/Papyros";
 import {ProgrammingLanguage} from "../../../src/ProgrammingLanguage";
 import {RunState} from "../../../src/frontend/state/Runner";
 import {RunMode} from "../../../src/backend/Backend";
-import {waitForOutput, waitForPapyrosReady} from "../../helpers";
-import {FriendlyError} from "../../../src/frontend/state/InputOutput";
+import {runPython, waitForOutput, waitForPapyrosReady} from "../../helpers";
+import {FriendlyError, OutputType} from "../../../src/frontend/state/InputOutput";
 
 describe("Runner", () => {
     it("should run code", async () => {
@@ -157,6 +157,46 @@ const c = a + b;`;
         expect(papyros.runner.stateMessage).toMatch(/^Code executed in 2/);
     });
 
+    it("should sleep faster with a clock speed", async () => {
+        const papyros = new Papyros();
+        await papyros.launch();
+        papyros.runner.programmingLanguage = ProgrammingLanguage.Python;
+        papyros.runner.clockSpeed = 10;
+        papyros.runner.code = "import time\nstart = time.time()\ntime.sleep(2)\nprint(round(time.time() - start))";
+        await papyros.runner.start();
+        await waitForPapyrosReady(papyros);
+        expect(papyros.io.output[0].content).toBe("2\n");
+        expect(papyros.runner.stateMessage).toMatch(/^Code executed in 0\./);
+    });
+
+    it("should skip sleeping at an infinite clock speed, in every time function", async () => {
+        const papyros = new Papyros();
+        await papyros.launch();
+        papyros.runner.clockSpeed = Infinity;
+        const start = Date.now();
+        const output = await runPython(papyros, `
+import os
+import time
+from papyros.workspace import FileCache
+
+names = ["time", "monotonic", "perf_counter"]
+before = [getattr(time, name)() for name in names]
+before_ns = [getattr(time, name + "_ns")() for name in names]
+time.sleep(100)
+print([round(getattr(time, name)() - start) for name, start in zip(names, before)])
+print([round((getattr(time, name + "_ns")() - start) / 1e9) for name, start in zip(names, before_ns)])
+# Whether a file is racily clean goes by the real time, not the skipped one
+path = os.path.abspath("clock.txt")
+with open(path, "w") as f:
+    f.write("a")
+cache = FileCache()
+cache.put(path, os.stat(path), "digest", {"content": "a", "binary": False})
+print(cache.get(path, os.stat(path)))
+`);
+        expect(Date.now() - start).toBeLessThan(10000);
+        expect(output).toBe("[100, 100, 100]\n[100, 100, 100]\nNone\n");
+    });
+
     it("should be able to load python packages", async () => {
         const papyros = new Papyros();
         await papyros.launch();
@@ -227,6 +267,72 @@ print
         expect(papyros.io.output[4].content).toBe("ok\n");
     });
 
+    it("should stop python code that exceeds its step limit", async () => {
+        const papyros = new Papyros();
+        await papyros.launch();
+        papyros.runner.programmingLanguage = ProgrammingLanguage.Python;
+        papyros.runner.stepLimit = 1000;
+        papyros.runner.code = `while True:
+    pass`;
+        await papyros.runner.start();
+        await waitForOutput(papyros);
+        await waitForPapyrosReady(papyros);
+        expect(papyros.io.output[0].type).toBe(OutputType.stderr);
+        expect((papyros.io.output[0].content as FriendlyError).name).toBe("ExecutionBudgetExceeded");
+    });
+
+    it("should stop a python loop without new lines that exceeds its time limit", async () => {
+        const papyros = new Papyros();
+        await papyros.launch();
+        papyros.runner.programmingLanguage = ProgrammingLanguage.Python;
+        papyros.runner.timeLimit = 0.5;
+        // Only jumps, no line events, and no output or sleep to interrupt it
+        papyros.runner.code = `while True: pass`;
+        await papyros.runner.start();
+        await waitForOutput(papyros);
+        await waitForPapyrosReady(papyros);
+        const error = papyros.io.output[0].content as FriendlyError;
+        expect(error.name).toBe("ExecutionBudgetExceeded");
+        expect(error.traceback).toMatch(/after running for 0.5 seconds/);
+    });
+
+    it("should profile python code", async () => {
+        const papyros = new Papyros();
+        await papyros.launch();
+        papyros.runner.programmingLanguage = ProgrammingLanguage.Python;
+        papyros.runner.code = `def square(x):
+    return x * x
+
+total = sum(square(i) for i in range(100))
+print(total)`;
+        await papyros.runner.start(RunMode.Profile);
+        await waitForOutput(papyros);
+        await waitForPapyrosReady(papyros);
+        expect(papyros.io.output[0].content).toBe("328350\n");
+        const profile = papyros.runner.profile!;
+        expect(profile.functions[0].name).toBe("<module>");
+        const square = profile.functions.find((f) => f.name === "square");
+        expect(square?.calls).toBe(100);
+        expect(profile.lines.find((l) => l.line === 2)?.hits).toBe(100);
+    });
+
+    it("should profile python code that raises an error", async () => {
+        const papyros = new Papyros();
+        await papyros.launch();
+        papyros.runner.programmingLanguage = ProgrammingLanguage.Python;
+        papyros.runner.code = `def square(x):
+    return x * x
+
+total = sum(square(i) for i in range(100))
+raise ValueError(total)`;
+        await papyros.runner.start(RunMode.Profile);
+        await waitForOutput(papyros);
+        await waitForPapyrosReady(papyros);
+        expect((papyros.io.output[0].content as FriendlyError).name).toBe("ValueError");
+        const square = papyros.runner.profile!.functions.find((f) => f.name === "square");
+        expect(square?.calls).toBe(100);
+    });
+
     it("can work with provided files in python", async () => {
         const papyros = new Papyros();
         await papyros.launch();
@@ -244,4 +350,175 @@ with open("readme.md", "r") as g:
         expect(papyros.io.output[0].content).toBe("Hello from file!\n");
         expect(papyros.io.output[1].content).toBe("# Papyros\n");
     });
+
+    it("remembers the modules a package imports without declaring them", async () => {
+        const papyros = new Papyros();
+        await papyros.launch();
+        const output = await runPython(papyros, `
+import os
+import sys
+import tempfile
+from papyros.analysis import AnalysisCache
+from papyros.imports import ImportResolver
+
+packages = tempfile.mkdtemp()
+os.makedirs(os.path.join(packages, "fakepkg"))
+with open(os.path.join(packages, "fakepkg", "__init__.py"), "w") as f:
+    f.write("import hiddenmod\n")
+sys.path.insert(0, packages)
+
+resolver = ImportResolver(os.getcwd(), "program", AnalysisCache())
+for source in ["import notinstalled", "import fakepkg"]:
+    try:
+        exec(compile(source, "program.py", "exec"), {"__name__": "program"})
+    except ModuleNotFoundError as e:
+        resolver.learn(e)
+    print(resolver.hidden_dependencies)
+print(resolver.resolve("import fakepkg"))
+print(ImportResolver(os.getcwd(), "program", AnalysisCache()).resolve("import fakepkg"))
+`);
+        expect(output.split("\n").slice(0, -1)).toEqual([
+            // A module the program imports itself is no hidden dependency
+            "{}",
+            "{'fakepkg': {'hiddenmod'}}",
+            "['fakepkg', 'hiddenmod']",
+            // What was learned is only kept by the resolver that learned it
+            "['fakepkg']",
+        ]);
+    });
+
+    it("does not try to install a package again that failed for the same imports", async () => {
+        const papyros = new Papyros();
+        await papyros.launch();
+        const output = await runPython(papyros, `
+import sys
+import types
+from pyodide_worker_runner import install_imports
+
+calls = []
+
+
+async def install(packages):
+    calls.append(packages)
+    if "numpyy" in ([packages] if isinstance(packages, str) else packages):
+        raise ValueError("Can't find a pure Python 3 wheel for 'numpyy'")
+
+
+sys.modules["micropip"] = types.SimpleNamespace(install=install)
+try:
+    for imports in [["numpyy"], ["numpyy"], ["numpyy"], ["numpyy", "notinstalled"], ["numpyy", "notinstalled"], ["numpyy"]]:
+        try:
+            await install_imports(imports)
+        except ValueError:
+            pass
+        print(calls)
+        calls.clear()
+finally:
+    del sys.modules["micropip"]
+`);
+        expect(output.split("\n").slice(0, -1)).toEqual([
+            "[['numpyy']]",
+            "[]",
+            "[]",
+            // Other imports try again, one by one to install the packages that can be found
+            "[['numpyy', 'notinstalled'], 'numpyy', 'notinstalled']",
+            "[['notinstalled']]",
+            "[['numpyy']]",
+        ]);
+    });
+
+    it("only looks for a module once it is known to be importable", async () => {
+        const papyros = new Papyros();
+        await papyros.launch();
+        const output = await runPython(papyros, `
+import importlib.util
+import pyodide_worker_runner
+
+calls = []
+find_spec = importlib.util.find_spec
+
+
+def counting_find_spec(name, *args):
+    calls.append(name)
+    return find_spec(name, *args)
+
+
+importlib.util.find_spec = counting_find_spec
+try:
+    pyodide_worker_runner._importable.clear()
+    modules = ["tabnanny", "tabnanny.sub", "tabnanny", "sys", "notamodule", "notamodule"]
+    print([pyodide_worker_runner.is_importable(module) for module in modules])
+    print(calls)
+finally:
+    importlib.util.find_spec = find_spec
+`);
+        expect(output.split("\n").slice(0, -1)).toEqual([
+            "[True, True, True, True, False, False]",
+            // Loaded modules are importable without looking, and a missing one can appear later
+            "['tabnanny', 'notamodule', 'notamodule']",
+        ]);
+    });
+
+    it("compiles a source that runs again only once", async () => {
+        const papyros = new Papyros();
+        await papyros.launch();
+        const output = await runPython(papyros, `
+import builtins
+from papyros.analysis import AnalysisCache, CachedCompileRunner
+
+compiled = []
+real_compile = builtins.compile
+
+
+def counting_compile(source, filename, *args, **kwargs):
+    if filename.endswith("cached.py"):
+        compiled.append(source)
+    return real_compile(source, filename, *args, **kwargs)
+
+
+runner = CachedCompileRunner(filename="cached.py")
+runner.analyses = AnalysisCache()
+builtins.compile = counting_compile
+try:
+    first = runner.pre_run("x = 1")
+    print(runner.pre_run("x = 1") is first, compiled)
+    print(runner.pre_run("x = 2") is first, compiled)
+    print(runner.pre_run("# only a comment", mode="single"), runner.source_code)
+finally:
+    builtins.compile = real_compile
+`);
+        expect(output.split("\n").slice(0, -1)).toEqual([
+            "True ['x = 1']",
+            "False ['x = 1', 'x = 2']",
+            "None # only a comment",
+        ]);
+    });
+
+    it("runs every batch case on its own", async () => {
+        const papyros = new Papyros();
+        await papyros.launch();
+        papyros.runner.programmingLanguage = ProgrammingLanguage.Python;
+        papyros.runner.stepLimit = 1000;
+        papyros.runner.code = `import os
+if os.path.exists("made.txt"):
+    print("leftover")
+name = input()
+if name == "write":
+    open("made.txt", "w").write("from an earlier case")
+elif name == "loop":
+    while True:
+        pass
+print("hello", name)
+input()`;
+        const results = await papyros.runner.runBatch(["write\nx\n", "read\n", "loop\n", "again\nx\n"]);
+        expect(results.map((r) => r.index)).toEqual([0, 1, 2, 3]);
+        // The file the first case wrote is gone in the next ones
+        expect(results.map((r) => r.stdout)).toEqual(["hello write\n", "hello read\n", "", "hello again\n"]);
+        // Reading past the input ends the case, and the step limit applies to every case
+        expect(results.map((r) => r.exception?.name ?? null))
+            .toEqual([null, "EOFError", "ExecutionBudgetExceeded", null]);
+        expect(results[0].steps).toBe(results[3].steps);
+        expect(results[2].steps).toBeGreaterThan(1000);
+        expect(papyros.io.files).toEqual([]);
+    });
 });
\ No newline at end of file
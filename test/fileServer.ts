@@ -0,0 +1,50 @@
+import type { Plugin } from "vite";
+
+const PREFIX = "/__files__/";
+const CHUNK_SIZE = 1024;
+const CHUNKS = 5;
+const CHUNK_DELAY_MS = 60;
+
+/**
+ * Stand-in for the hosts that files are provided from in the tests:
+ * /__files__/<name> streams a file in slow chunks, with a content-length,
+ * /__files__/stats returns the most downloads that were in flight at once and forgets it
+ */
+export function fileServer(): Plugin {
+    let inFlight = 0;
+    let maxInFlight = 0;
+    return {
+        name: "papyros-test-file-server",
+        configureServer(server) {
+            server.middlewares.use((req, res, next) => {
+                if (!req.url?.startsWith(PREFIX)) {
+                    next();
+                    return;
+                }
+                res.setHeader("Access-Control-Allow-Origin", "*");
+                if (req.url === `${PREFIX}stats`) {
+                    res.setHeader("Content-Type", "application/json");
+                    res.end(JSON.stringify({ maxInFlight }));
+                    maxInFlight = 0;
+                    return;
+                }
+                inFlight++;
+                maxInFlight = Math.max(maxInFlight, inFlight);
+                res.setHeader("Content-Type", "text/plain");
+                res.setHeader("Content-Length", String(CHUNK_SIZE * CHUNKS));
+                let sent = 0;
+                const sendChunk = (): void => {
+                    if (sent === CHUNKS) {
+                        inFlight--;
+                        res.end();
+                        return;
+                    }
+                    sent++;
+                    res.write("x".repeat(CHUNK_SIZE));
+                    setTimeout(sendChunk, CHUNK_DELAY_MS);
+                };
+                sendChunk();
+            });
+        },
+    };
+}
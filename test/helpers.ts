@@ -1,5 +1,7 @@
 import { Papyros } from "../src/frontend/state/Papyros";
 import { RunState } from "../src/frontend/state/Runner";
+import { ProgrammingLanguage } from "../src/ProgrammingLanguage";
+import { FriendlyError, OutputType } from "../src/frontend/state/InputOutput";
 
 export async function waitForOutput(papyros: Papyros, count: number = 1, timeout = 2000): Promise<void> {
     const start = Date.now();
@@ -51,3 +53,22 @@ export async function waitForFiles(papyros: Papyros, count: number = 1, timeout
         await new Promise(r => setTimeout(r, 10));
     }
 }
+
+/**
+ * Run Python code in the worker of papyros, e.g. to check parts of Papyros that the frontend does not see
+ * @return {Promise<string>} What the code printed, it fails with the traceback of an exception
+ */
+export async function runPython(papyros: Papyros, code: string, timeout = 10000): Promise<string> {
+    papyros.runner.programmingLanguage = ProgrammingLanguage.Python;
+    papyros.runner.code = code;
+    await papyros.runner.start();
+    await waitForPapyrosReady(papyros, timeout);
+    const error = papyros.io.output.find(o => o.type === OutputType.stderr);
+    if (error !== undefined) {
+        throw new Error((error.content as FriendlyError).traceback ?? String(error.content));
+    }
+    return papyros.io.output
+        .filter(o => o.type === OutputType.stdout)
+        .map(o => o.content)
+        .join("");
+}
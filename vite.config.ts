@@ -1,6 +1,7 @@
 import { defineConfig } from "vite";
 import { playwright } from "@vitest/browser-playwright";
 import browserslistToEsbuild from "browserslist-to-esbuild";
+import { fileServer } from "./test/fileServer";
 
 export default defineConfig({
     oxc: {
@@ -15,6 +16,7 @@ export default defineConfig({
     worker: {
         format: "es",
     },
+    plugins: [fileServer()],
     test: {
         browser: {
             enabled: true,